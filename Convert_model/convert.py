@@ -0,0 +1,285 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from importlib import metadata
+
+# Scripted version of Untitled.ipynb: timm model -> ONNX -> onnxsim -> RKNN, for a list
+# of models across a process pool. Every artifact is stored under its content key
+# (model name, weights hash, opset, input shape, converter versions and the key of the
+# stage it was built from), so anything unchanged is reused instead of re-exported.
+
+
+def _version(dist):
+    try:
+        return metadata.version(dist)
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _digest(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:20]
+
+
+def weights_hash(model):
+    h = hashlib.sha256()
+    for name, tensor in sorted(model.state_dict().items()):
+        h.update(name.encode())
+        h.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return h.hexdigest()[:20]
+
+
+class Stage:
+    # One conversion step. key() names its output from its input's key and everything
+    # that affects the result; run() writes the artifact to dst.
+    name = ""
+    suffix = ""
+
+    def version(self):
+        return ""
+
+    def params(self):
+        return {}
+
+    def key(self, src_key):
+        return _digest(self.name, src_key, self.params(), self.version())
+
+    def run(self, src, dst, spec):
+        raise NotImplementedError
+
+
+class OnnxExport(Stage):
+    name = "onnx"
+    suffix = ".onnx"
+
+    def __init__(self, opset=13):
+        self.opset = opset
+
+    def version(self):
+        return f"torch{_version('torch')}-timm{_version('timm')}"
+
+    def params(self):
+        return {"opset": self.opset}
+
+    def run(self, model, dst, spec):
+        import torch
+
+        dummy_input = torch.randn(*spec["input_shape"])
+        torch.onnx.export(model, dummy_input, dst, opset_version=self.opset, input_names=["input"],
+                          output_names=["output"], do_constant_folding=True, dynamic_axes=None)
+
+
+class OnnxSimplify(Stage):
+    name = "onnxsim"
+    suffix = ".sim.onnx"
+
+    def version(self):
+        return f"onnxsim{_version('onnxsim')}-onnx{_version('onnx')}"
+
+    def run(self, src, dst, spec):
+        try:
+            import onnx
+            from onnxsim import simplify
+        except ImportError:
+            subprocess.run([sys.executable, "-m", "onnxsim", src, dst], check=True, capture_output=True)
+            return
+        model, ok = simplify(onnx.load(src))
+        if not ok:
+            raise RuntimeError("onnxsim could not validate the simplified model")
+        onnx.save(model, dst)
+
+
+class RknnBuild(Stage):
+    # Optional: needs rknn-toolkit2, which only exists for some host platforms
+    name = "rknn"
+    suffix = ".rknn"
+
+    def __init__(self, target="rk3588", quantize=True, dataset="dataset.txt"):
+        self.target = target
+        self.quantize = quantize
+        self.dataset = dataset
+
+    def version(self):
+        return f"rknn-toolkit2{_version('rknn-toolkit2')}"
+
+    def dataset_hash(self):
+        # The calibration list and every image it names; an image is looked up as listed
+        # (relative to the working directory, as RKNN reads it) and missing ones count by name
+        h = hashlib.sha256()
+        with open(self.dataset, "rb") as f:
+            listing = f.read()
+        h.update(listing)
+        for line in listing.decode(errors="replace").splitlines():
+            image = line.strip()
+            if not image:
+                continue
+            h.update(image.encode())
+            if os.path.isfile(image):
+                with open(image, "rb") as f:
+                    h.update(hashlib.sha256(f.read()).digest())
+        return h.hexdigest()[:20]
+
+    def params(self):
+        # The calibration data is part of the key when quantizing
+        dataset = None
+        if self.quantize and os.path.isfile(self.dataset):
+            dataset = self.dataset_hash()
+        return {"target": self.target, "quantize": self.quantize, "dataset": dataset}
+
+    def run(self, src, dst, spec):
+        from rknn.api import RKNN
+
+        rknn = RKNN(verbose=False)
+        try:
+            rknn.config(mean_values=[[123.675, 116.28, 103.53]], std_values=[[58.395, 57.12, 57.375]],
+                        target_platform=self.target, quantized_dtype="w8a8")
+            if rknn.load_onnx(model=src) != 0:
+                raise RuntimeError("RKNN could not load the ONNX model")
+            if rknn.build(do_quantization=self.quantize, dataset=self.dataset if self.quantize else None) != 0:
+                raise RuntimeError("RKNN build failed")
+            if rknn.export_rknn(dst) != 0:
+                raise RuntimeError("RKNN export failed")
+        finally:
+            rknn.release()
+
+
+STAGES = {"onnx": OnnxExport, "onnxsim": OnnxSimplify, "rknn": RknnBuild}
+
+
+def build_stages(names, opset=13, target="rk3588", quantize=True, dataset="dataset.txt"):
+    options = {"onnx": {"opset": opset}, "rknn": {"target": target, "quantize": quantize, "dataset": dataset}}
+    if names[0] != "onnx":
+        raise ValueError("the pipeline has to start with the onnx export stage")
+    return [STAGES[name](**options.get(name, {})) for name in names]
+
+
+def _store(cache_dir, key, suffix, build):
+    # Build into a temporary name and move it into place, so a crashed or concurrent
+    # conversion never leaves a partial artifact under a valid key
+    path = os.path.join(cache_dir, key + suffix)
+    if os.path.isfile(path):
+        return path, True
+    tmp = os.path.join(cache_dir, f".{key}.{os.getpid()}{suffix}")
+    try:
+        build(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path, False
+
+
+def _publish(path, out_dir, model_name, suffix):
+    # Friendly name next to the cache: out_dir/<model><suffix>
+    os.makedirs(out_dir, exist_ok=True)
+    dst = os.path.join(out_dir, model_name + suffix)
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(path, dst)
+    except OSError:
+        shutil.copyfile(path, dst)
+    return dst
+
+
+def convert(model_name, stages, cache_dir="convert_cache", out_dir="converted", batch_size=1, image_size=None,
+            threads=None, model=None):
+    # model: an already built torch module to convert under model_name instead of the
+    # pretrained timm one (e.g. a local checkpoint)
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+    os.makedirs(cache_dir, exist_ok=True)
+    report = {"model": model_name, "stages": []}
+
+    t0 = time.perf_counter()
+    if model is None:
+        import timm
+
+        model = timm.create_model(model_name, pretrained=True, num_classes=1000)
+    model = model.eval()
+    cfg = getattr(model, "pretrained_cfg", None) or {}
+    size = image_size or cfg.get("input_size", (3, 224, 224))[-1]
+    spec = {"model": model_name, "input_shape": (batch_size, 3, size, size)}
+    key = _digest(model_name, weights_hash(model), spec["input_shape"])
+    report["stages"].append({"stage": "load", "seconds": time.perf_counter() - t0, "cached": False})
+
+    src = model
+    for stage in stages:
+        t0 = time.perf_counter()
+        key = stage.key(key)
+        src_path = src
+        path, cached = _store(cache_dir, key, stage.suffix, lambda dst: stage.run(src_path, dst, spec))
+        report["stages"].append({
+            "stage": stage.name,
+            "seconds": time.perf_counter() - t0,
+            "cached": cached,
+            "key": key,
+            "path": _publish(path, out_dir, model_name, stage.suffix),
+        })
+        src = path
+    return report
+
+
+def convert_all(model_names, stages, workers=None, **kwargs):
+    workers = workers or min(len(model_names), os.cpu_count() or 1)
+    # Split the cores between workers instead of letting each torch grab all of them
+    kwargs.setdefault("threads", max((os.cpu_count() or 1) // workers, 1))
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+        futures = {pool.submit(convert, name, stages, **kwargs): name for name in model_names}
+        for future in as_completed(futures):
+            try:
+                reports.append(future.result())
+            except Exception as e:
+                reports.append({"model": futures[future], "error": f"{type(e).__name__}: {e}", "stages": []})
+    return sorted(reports, key=lambda r: model_names.index(r["model"]))
+
+
+def print_report(reports):
+    for report in reports:
+        if "error" in report:
+            print(f"{report['model']:>20}: FAILED {report['error']}")
+            continue
+        parts = [f"{s['stage']} {s['seconds']:6.2f}s" + (" (cached)" if s["cached"] else "") for s in report["stages"]]
+        total = sum(s["seconds"] for s in report["stages"])
+        print(f"{report['model']:>20}: " + " | ".join(parts) + f" | total {total:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert timm models to ONNX / RKNN with a content-addressed cache")
+    parser.add_argument("models", nargs="+", help="timm model names")
+    parser.add_argument("--stages", nargs="+", default=["onnx", "onnxsim"], choices=list(STAGES),
+                        help="pipeline stages in order (add rknn where rknn-toolkit2 is installed)")
+    parser.add_argument("--opset", type=int, default=13)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--image-size", type=int, help="defaults to the model's pretrained input size")
+    parser.add_argument("--target", default="rk3588", help="RKNN target platform")
+    parser.add_argument("--no-quantize", action="store_true", help="build the RKNN model without w8a8 quantization")
+    parser.add_argument("--dataset", default="dataset.txt", help="RKNN calibration image list")
+    parser.add_argument("--workers", type=int, help="conversion processes (default: one per model, up to CPU count)")
+    parser.add_argument("--cache-dir", default="convert_cache")
+    parser.add_argument("--out-dir", default="converted")
+    parser.add_argument("--json", help="also write the per-stage timing report here")
+    args = parser.parse_args()
+
+    stages = build_stages(args.stages, args.opset, args.target, not args.no_quantize, args.dataset)
+    reports = convert_all(args.models, stages, args.workers, cache_dir=args.cache_dir, out_dir=args.out_dir,
+                          batch_size=args.batch_size, image_size=args.image_size)
+    print_report(reports)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+    if any("error" in r for r in reports):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,18 @@
+import struct
 import sys
 import time
 import usb.core
 import usb.util
 import threading
+from collections import deque
 import pandas as pd
 import os
-import timm
-import torch
-from tqdm import tqdm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.baseline_cache import BaselineCache
+from common.exporter import TelemetryExporter
+from common.meter import PowerMeter
+from fnb_decode import FNBDecoder
 
 #FNB48
 VID = 0x0483
@@ -24,10 +29,67 @@ VID_FNB48S = 0x2E3C
 PID_FNB48S = 0x0049
 
 
-class FNBTool:
-    def __init__(self,time_interval=0.02,file_path="energy.csv"):
+class FNBTool(PowerMeter):
+    name = "fnb"
+
+    def __init__(self,time_interval=0.02,file_path="energy.csv",baseline_cache=None,power_mode=None,
+                 baseline_duration=20,queue_size=4096,ring_capacity=1 << 20,endpoints=None,trace_store=None,
+                 export_port=None,max_usb_errors=10,usb_backoff=0.05,max_usb_backoff=2.0):
+        super().__init__(ring_capacity=ring_capacity)
+        # time_interval is no longer used: the USB loop drains the endpoint without sleeping
         self._time_interval = time_interval
         self._file_path = file_path
+        self._baseline_cache = baseline_cache
+        self._power_mode = power_mode
+        self._baseline_duration = baseline_duration
+        # Optional common.trace_store.TraceStore that keeps each window's raw trace
+        self._trace_store = trace_store
+        if endpoints is not None:
+            # (ep_in, ep_out) stand-ins, e.g. fnb_decode.FakeEndpoint, instead of a USB device
+            self._dev = None
+            self._is_fnb58_or_fnb48s = True
+            self._ep_in, self._ep_out = endpoints
+        else:
+            self._open_device()
+
+        assert self._ep_in
+        assert self._ep_out
+        self._running=False
+        self._energy_init=0
+        self._power=0
+        self._energy=0
+        self._n_measurements=0
+        self._inference_name=""
+        self._start_time=0
+        self._decoder = FNBDecoder()
+        # USB reader -> consumer hand-off. deque append/popleft are atomic, so neither side
+        # takes a lock; when full the oldest packet is dropped and counted.
+        self._queue = deque(maxlen=queue_size)
+        self._queue_ready = threading.Event()
+        self._n_packets = 0
+        self._n_overflow = 0
+        self._last_arrival_ns = 0
+        self._capture = None
+        # Held by the consumer around each capture write and by capture() around the close
+        self._capture_lock = threading.Lock()
+        # USB error of the current failure streak (None while reads succeed) and the last
+        # one seen; stop_window() raises while the reader is failing or has given up
+        self._usb_error = None
+        self._last_usb_error = None
+        self._reader_error = None
+        self._n_usb_errors = 0
+        self._alive = True
+        self._request_data()
+        self._reader_thread = threading.Thread(target=self._usb_loop, args=(max_usb_errors, usb_backoff, max_usb_backoff),
+                                               daemon=True)
+        self._consumer_thread = threading.Thread(target=self._consume_loop, daemon=True)
+        self._reader_thread.start()
+        self._consumer_thread.start()
+        self._init()
+        # Optional live telemetry: Prometheus text on :export_port/metrics
+        self._exporter = TelemetryExporter(self, http_port=export_port).start() if export_port is not None else None
+
+    def _open_device(self):
         self._find_device()
         assert self._dev, "Device not found"
         self._interface_hid_num = self._find_hid_interface_num()
@@ -46,19 +108,6 @@ class FNBTool:
             custom_match=lambda e: usb.util.endpoint_direction(e.bEndpointAddress) == usb.util.ENDPOINT_IN,
         )
 
-        assert self._ep_in
-        assert self._ep_out
-        self._running=False
-        self._energy_init=0
-        self._power=0
-        self._energy=0
-        self._n_measurements=0
-        self._measure_thread=None
-        self._inference_name=""
-        self._start_time=0
-        self._request_data()
-        self._init()
-
     def _find_device(self):
         self._is_fnb58_or_fnb48s = False
         self._dev = usb.core.find(idVendor=VID, idProduct=PID_FNB48)
@@ -93,52 +142,37 @@ class FNBTool:
         time.sleep(0.1)
         if not self._is_fnb58_or_fnb48s:
             self._ep_out.write(b"\xaa\x83" + b"\x00" * 61 + b"\x9e")
-    def _decode(self, data):
-        packet_type = data[1]
-        if packet_type != 0x04:
-            return None
-
-        for i in range(4):
-            offset = 2 + 15 * i
-            voltage = (
-                              data[offset + 3] * 256 * 256 * 256
-                              + data[offset + 2] * 256 * 256
-                              + data[offset + 1] * 256
-                              + data[offset + 0]
-                      ) / 100000
-            current = (
-                              data[offset + 7] * 256 * 256 * 256
-                              + data[offset + 6] * 256 * 256
-                              + data[offset + 5] * 256
-                              + data[offset + 4]
-                      ) / 100000
-            return  voltage * current
+    def capture(self, path, duration):
+        # Record raw packets with their arrival time for offline decoding (fnb_decode.load_capture)
+        f = open(path, "wb")
+        with self._capture_lock:
+            self._capture = f
+        try:
+            time.sleep(duration)
+        finally:
+            with self._capture_lock:
+                self._capture = None
+                f.close()
 
     def start(self,name):
         self._inference_name=name
-        self._request_data()
         assert not self._running, "Measurement process is running, you have to stop before start"
         self._running = True
         self._power=0
         self._energy=0
         self._n_measurements=0
-        self._measure_thread = threading.Thread(target=self._read_data)
-        self._measure_thread.start()
-        self._start_time=time.time()
+        self._start_time=self.start_window(name)/1e9
 
 
     def stop(self):
         assert self._running, "Measurement process is not running"
         self._running = False
-        self._measure_thread=None
-        data = self._ep_in.read(size_or_buffer=64, timeout=1000)
-        power = self._decode(data)
-        if power is not None:
-            self._power+=power
-            self._n_measurements+=1
-        if self._n_measurements != 0:  self._power=self._power/self._n_measurements-self._power_init
-        duration=time.time()-self._start_time
-        self._energy= self._power*duration/3.6
+        # Trapezoidal integration over exactly [start, stop] of the timestamped trace
+        window = self.stop_window()
+        self._n_measurements = window["samples"]
+        self._power = window["avg_power"] - self._power_init
+        duration = window["duration"]
+        self._energy = window["energy_j"] / 3.6
         data_to_write = [
             {
                 'Start time': self._start_time,
@@ -153,26 +187,99 @@ class FNBTool:
                   mode='a',
                   header=not os.path.isfile(self._file_path),
                   encoding='utf-8-sig')
-    def _read_data(self):
+        if self._trace_store is not None:
+            start_ns, stop_ns = int(window["start_time"] * 1e9), int(window["end_time"] * 1e9)
+            t_ns, power = self.trace(start_ns - 10**9, stop_ns)
+            self._trace_store.add(t_ns, power, start_ns=start_ns, end_ns=stop_ns, baseline=self._power_init,
+                                  model=self._inference_name, mode=self._power_mode, meter=self.name)
+
+    def _usb_loop(self, max_errors=10, backoff=0.05, max_backoff=2.0):
+        # A USB error is retried with exponential backoff; after max_errors in a row the
+        # reader gives up and the error is re-raised from stop_window()
         continue_time = time.time()
-        while self._running:
-            if time.time() >= continue_time:
-                continue_time = time.time() + 1
-                self._ep_out.write(b"\xaa\x83" + b"\x00" * 61 + b"\x9e")
-            data = self._ep_in.read(size_or_buffer=64, timeout=1000)
-            power = self._decode(data)
-            if power is not None:
-                self._power+=power
-                self._n_measurements+=1
-            time.sleep(self._time_interval)
+        errors = 0
+        while self._alive:
+            try:
+                if time.time() >= continue_time:
+                    continue_time = time.time() + 1
+                    self._ep_out.write(b"\xaa\x83" + b"\x00" * 61 + b"\x9e")
+                data = self._ep_in.read(size_or_buffer=64, timeout=1000)
+            except usb.core.USBTimeoutError:
+                continue
+            except usb.core.USBError as e:
+                errors += 1
+                self._n_usb_errors += 1
+                self._usb_error = self._last_usb_error = e
+                if errors >= max_errors:
+                    print(f"{self.name}: USB reader stopped after {errors} errors: {e}", file=sys.stderr)
+                    self._reader_error = e
+                    return
+                if errors == 1:
+                    print(f"{self.name}: USB error, retrying: {e}", file=sys.stderr)
+                time.sleep(min(backoff * 2 ** (errors - 1), max_backoff))
+                continue
+            errors = 0
+            self._usb_error = None
+            if len(self._queue) == self._queue.maxlen:
+                self._n_overflow += 1
+            self._queue.append((time.time_ns(), bytes(data)))
+            self._queue_ready.set()
+
+    def _consume_loop(self):
+        while self._alive or self._queue:
+            self._queue_ready.clear()
+            while self._queue:
+                arrival_ns, data = self._queue.popleft()
+                if self._capture is not None:
+                    with self._capture_lock:
+                        f = self._capture
+                        if f is not None:
+                            f.write(struct.pack("<q", arrival_ns) + data)
+                t_ns, _, _, power = self._decoder.decode(data, arrival_ns)
+                if len(power):
+                    self.ring.extend(t_ns, power)
+                self._n_packets += 1
+                self._last_arrival_ns = arrival_ns
+            self._queue_ready.wait(0.1)
+
+    def stop_window(self, n_inferences=1):
+        # A failing or dead reader would otherwise show up as an empty or truncated window
+        error = self._reader_error or self._usb_error
+        if error is not None:
+            self._window = None
+            state = "stopped" if self._reader_error is not None else "failing"
+            raise RuntimeError(f"FNB USB reader {state}: {error}") from error
+        return super().stop_window(n_inferences)
+
+    def latest_ns(self):
+        # A packet that arrived after until_ns has been decoded, so the trace covers
+        # the window end and its right edge can be interpolated
+        return self._last_arrival_ns
 
     def _init(self):
-        self._running = True
-        self._measure_thread = threading.Thread(target=self._read_data)
-        self._measure_thread.start()
-        time.sleep(20)
-        self._running = False
-        self._power_init=self._power/self._n_measurements
+        key = None
+        if self._baseline_cache is not None:
+            device = f"{self._dev.idVendor:04x}:{self._dev.idProduct:04x}" if self._dev is not None else "fake"
+            key = BaselineCache.key(device, "fnb", self._power_mode)
+        self._power_init = self.baseline(self._baseline_duration, cache=self._baseline_cache, key=key)
+
+    def stats(self):
+        return {
+            "packets": self._n_packets,
+            "dropped_packets": self._decoder.n_dropped,
+            "queue_overflows": self._n_overflow,
+            "queue_depth": len(self._queue),
+            "usb_errors": self._n_usb_errors,
+            "last_usb_error": str(self._last_usb_error) if self._last_usb_error is not None else None,
+            "samples": len(self.ring),
+        }
+
+    def close(self):
+        if self._exporter is not None:
+            self._exporter.stop()
+        self._alive = False
+        self._reader_thread.join(timeout=2)
+        self._consumer_thread.join(timeout=2)
 
     def set_filepath(self,file_path):
         self._file_path = file_path
\ No newline at end of file
@@ -0,0 +1,153 @@
+import time
+
+import numpy as np
+
+# FNB48/FNB58 HID report: 0xaa, packet type, four 15-byte sample records, one
+# unused byte and a CRC-8 over bytes 1..62. Records hold little-endian
+# voltage/current in 1e-5 units, D+/D- in mV and temperature in 0.1 C.
+PACKET_SIZE = 64
+SAMPLES_PER_PACKET = 4
+PACKET_TYPE_DATA = 0x04
+# The meter produces one sample every 10 ms
+SAMPLE_INTERVAL_NS = 10_000_000
+
+RECORD = np.dtype([
+    ("voltage", "<u4"),
+    ("current", "<u4"),
+    ("dp", "<u2"),
+    ("dn", "<u2"),
+    ("unknown", "u1"),
+    ("temperature", "<u2"),
+])
+PACKET = np.dtype([
+    ("head", "u1"),
+    ("type", "u1"),
+    ("records", RECORD, (SAMPLES_PER_PACKET,)),
+    ("unknown", "u1"),
+    ("crc", "u1"),
+])
+assert PACKET.itemsize == PACKET_SIZE
+
+
+def _crc8_table(poly=0x39):
+    table = np.zeros(256, dtype=np.uint8)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table[i] = crc
+    return table
+
+
+_CRC_TABLE = _crc8_table()
+CRC_INIT = 0x42
+
+
+def crc8(raw):
+    # CRC over bytes 1..62 of each packet in a (n, 64) uint8 array, one lane per packet
+    crc = np.full(raw.shape[0], CRC_INIT, dtype=np.uint8)
+    for col in range(1, PACKET_SIZE - 1):
+        crc = _CRC_TABLE[crc ^ raw[:, col]]
+    return crc
+
+
+def decode_packets(buf, check_crc=True):
+    # Decode any number of concatenated 64-byte packets in one pass. Returns
+    # (voltage, current, power) arrays of shape (n_data_packets * 4,) and the
+    # number of packets dropped for a wrong type or a bad CRC.
+    raw = np.frombuffer(buf, dtype=np.uint8)
+    raw = raw[:len(raw) - len(raw) % PACKET_SIZE].reshape(-1, PACKET_SIZE)
+    packets = raw.view(PACKET).reshape(-1)
+    valid = packets["type"] == PACKET_TYPE_DATA
+    if check_crc:
+        valid &= crc8(raw) == packets["crc"]
+    records = packets["records"][valid].reshape(-1)
+    voltage = records["voltage"] / 1e5
+    current = records["current"] / 1e5
+    return voltage, current, voltage * current, int(len(packets) - valid.sum())
+
+
+class FNBDecoder:
+    # Stateful decoder that spreads each packet's four samples over the time since
+    # the previous packet arrived (or the nominal 10 ms spacing after a gap).
+    def __init__(self, check_crc=True, sample_interval_ns=SAMPLE_INTERVAL_NS):
+        self.check_crc = check_crc
+        self.sample_interval_ns = sample_interval_ns
+        self.n_packets = 0
+        self.n_dropped = 0
+        self._last_arrival = None
+
+    def reset(self):
+        self._last_arrival = None
+
+    def timestamps(self, arrival_ns, n_samples):
+        nominal = self.sample_interval_ns
+        last = self._last_arrival
+        self._last_arrival = arrival_ns
+        if last is not None and 0 < arrival_ns - last < 2 * nominal * n_samples:
+            step = (arrival_ns - last) / n_samples
+        else:
+            step = nominal
+        return arrival_ns - np.round(step * np.arange(n_samples - 1, -1, -1)).astype(np.int64)
+
+    def decode(self, data, arrival_ns=None):
+        # -> (t_ns, voltage, current, power) for one packet; empty arrays if it is dropped
+        if arrival_ns is None:
+            arrival_ns = time.time_ns()
+        voltage, current, power, dropped = decode_packets(bytes(data), self.check_crc)
+        self.n_packets += 1
+        self.n_dropped += dropped
+        if not len(power):
+            return np.empty(0, dtype=np.int64), voltage, current, power
+        return self.timestamps(arrival_ns, len(power)), voltage, current, power
+
+
+def load_capture(path):
+    # Raw packet capture as written by FNBTool.capture(): (arrival ns int64 + 64 bytes) per packet
+    raw = np.fromfile(path, dtype=np.dtype([("t_ns", "<i8"), ("packet", "u1", (PACKET_SIZE,))]))
+    return raw["t_ns"], raw["packet"]
+
+
+def encode_packet(voltage, current, temperature=25.0):
+    # Build one valid data packet from four voltage/current sub-samples
+    packet = np.zeros(1, dtype=PACKET)
+    packet["head"] = 0xaa
+    packet["type"] = PACKET_TYPE_DATA
+    records = packet["records"][0]
+    records["voltage"] = np.round(np.asarray(voltage) * 1e5)
+    records["current"] = np.round(np.asarray(current) * 1e5)
+    records["temperature"] = round(temperature * 10)
+    raw = packet.view(np.uint8).reshape(1, PACKET_SIZE)
+    packet["crc"] = crc8(raw)
+    return packet.tobytes()
+
+
+class FakeEndpoint:
+    # Stands in for both HID endpoints: read() returns valid data packets at the
+    # meter's rate (or back to back with realtime=False), write() is accepted and ignored.
+    def __init__(self, power_fn=None, voltage=5.0, realtime=True, sample_interval_ns=SAMPLE_INTERVAL_NS):
+        self.power_fn = power_fn or (lambda t: 2.0 + 0.5 * np.sin(t))
+        self.voltage = voltage
+        self.realtime = realtime
+        self.sample_interval_ns = sample_interval_ns
+        self.n_reads = 0
+        self._t0 = time.perf_counter_ns()
+        self._next = self._t0
+
+    def write(self, data, timeout=None):
+        return len(data)
+
+    def read(self, size_or_buffer=PACKET_SIZE, timeout=None):
+        period = SAMPLES_PER_PACKET * self.sample_interval_ns
+        if self.realtime:
+            self._next += period
+            wait = self._next - time.perf_counter_ns()
+            if wait > 0:
+                time.sleep(wait / 1e9)
+            t_end = self._next
+        else:
+            t_end = time.perf_counter_ns()
+        t = (t_end - self._t0 - self.sample_interval_ns * np.arange(SAMPLES_PER_PACKET - 1, -1, -1)) / 1e9
+        current = np.maximum(self.power_fn(t), 0) / self.voltage
+        self.n_reads += 1
+        return encode_packet(np.full(SAMPLES_PER_PACKET, self.voltage), current)
@@ -0,0 +1,41 @@
+import argparse
+import time
+
+from FNB import FNBTool
+from fnb_decode import FakeEndpoint, PACKET_SIZE, SAMPLES_PER_PACKET
+
+# Drives the FNBTool reader/consumer pipeline from a fake endpoint, either at the
+# meter's real packet rate or flat out, and reports throughput and losses.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress-test the FNBTool USB pipeline without a device")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds to run")
+    parser.add_argument("--flat-out", action="store_true", help="return packets back to back instead of every 40 ms")
+    parser.add_argument("--queue-size", type=int, default=4096, help="reader -> consumer queue bound")
+    args = parser.parse_args()
+
+    endpoint = FakeEndpoint(power_fn=lambda t: 2.0 + 0 * t, realtime=not args.flat_out)
+    tool = FNBTool(file_path="stress_energy.csv", baseline_duration=0.5, queue_size=args.queue_size,
+                   endpoints=(endpoint, endpoint))
+    start = time.perf_counter()
+    before = tool.stats()
+    reads_before = endpoint.n_reads
+    tool.start("stress")
+    time.sleep(args.duration)
+    tool.stop()
+    elapsed = time.perf_counter() - start
+    after = tool.stats()
+    tool.close()
+
+    reads = endpoint.n_reads - reads_before
+    packets = after["packets"] - before["packets"]
+    print(f"endpoint reads:   {reads} ({reads / elapsed:.0f} packets/s, {reads * PACKET_SIZE / elapsed / 1e3:.1f} kB/s)")
+    print(f"decoded packets:  {packets} ({packets * SAMPLES_PER_PACKET / elapsed:.0f} samples/s)")
+    print(f"queue overflows:  {after['queue_overflows']}, depth at stop {after['queue_depth']}")
+    print(f"CRC/type drops:   {after['dropped_packets']}")
+    print(f"window energy:    {tool._energy:.6f} mWh over {tool._n_measurements} samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,187 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+import numpy as np
+try:
+    from jtop import jtop
+except ImportError:
+    # Only needed on the board; JtopMeter(source=...) runs without it
+    jtop = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.power_trace import PowerRing, window_energy
+from common.baseline_cache import BaselineCache
+from common.exporter import TelemetryExporter
+from common.meter import PowerMeter
+from common.overhead import AdaptiveInterval, pin, proc_usage, usage_delta
+from common.regions import print_summary
+
+
+def _power_mode():
+    # Current nvpmodel mode id, part of the baseline cache key
+    try:
+        out = subprocess.run(["nvpmodel", "-q"], capture_output=True, text=True, timeout=5).stdout
+        return out.strip().splitlines()[-1].strip()
+    except (OSError, IndexError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def _print_overhead(overhead):
+    if overhead:
+        print(f"Sampler overhead: CPU {overhead['sampler_cpu_percent']:.2f}% "
+              f"({overhead['sampler_cpu_s']:.3f} s), {overhead['sampler_wakeups_per_s']:.0f} wakeups/s, "
+              f"{overhead['sampler_memory_mb']:.1f} MB")
+
+
+def _sample_loop(ring, read, measuring, shutdown, interval, max_interval=None):
+    # With max_interval the poll period backs off while readings repeat
+    pacer = AdaptiveInterval(interval, max_interval) if max_interval else None
+    last = None
+    while not shutdown.is_set():
+        if not measuring.wait(timeout=0.5):
+            continue
+        value = read()
+        ring.append(time.time_ns(), value)
+        if pacer is not None:
+            time.sleep(pacer.next(value != last))
+            last = value
+        else:
+            time.sleep(interval)
+
+
+def _sampler_process(shm_name, capacity, measuring, shutdown, ready, interval=0.005, source=None,
+                     max_interval=None, cpu=None):
+    # Long-lived sampler: keeps jtop open and writes straight into the shared ring
+    # while `measuring` is set, and sleeps on the event (no polling) while it is clear.
+    # `source`, a picklable callable of seconds since start -> W, replaces jtop off-board.
+    pin(cpu)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = PowerRing(capacity, buffer=shm.buf)
+    try:
+        if source is not None:
+            t0 = time.perf_counter()
+            ready.set()
+            _sample_loop(ring, lambda: source(time.perf_counter() - t0), measuring, shutdown, interval, max_interval)
+        else:
+            with jtop(interval=interval) as jetson:
+                ready.set()
+                _sample_loop(ring, lambda: jetson.stats.get("Power TOT", 0) / 1000, measuring, shutdown, interval,
+                             max_interval)
+    except Exception as e:
+        print(f"\nError during measurement: {e}")
+    finally:
+        ready.set()
+        del ring
+        shm.close()
+
+
+class JtopMeter(PowerMeter):
+    # jtop adapter for the common meter API. The ring lives in shared memory and is
+    # filled by a sampler process that outlives windows. With gated=True the sampler
+    # only runs while a window or baseline is open, keeping it off the CPU in between.
+    # max_interval enables adaptive polling and cpu pins the sampler to one core.
+    name = "jtop"
+
+    def __init__(self, interval=0.005, ring_capacity=1 << 18, source=None, gated=False, max_interval=None,
+                 cpu=None):
+        self.interval = interval
+        self.ring_capacity = ring_capacity
+        self.source = source
+        self.gated = gated
+        self.max_interval = max_interval
+        self.cpu = cpu
+        self._shm = shared_memory.SharedMemory(create=True, size=PowerRing.nbytes(ring_capacity))
+        super().__init__(ring=PowerRing(ring_capacity, buffer=self._shm.buf))
+        self.measuring = mp.Event()
+        self._shutdown = mp.Event()
+        self._process = None
+
+    def open(self):
+        if self._process is not None and self._process.is_alive():
+            return self
+        ready = mp.Event()
+        self._shutdown.clear()
+        self._process = mp.Process(target=_sampler_process,
+                                   args=(self._shm.name, self.ring_capacity, self.measuring, self._shutdown, ready,
+                                         self.interval, self.source, self.max_interval, self.cpu),
+                                   daemon=True)
+        self._process.start()
+        ready.wait(timeout=10)
+        if not self.gated:
+            self.measuring.set()
+        return self
+
+    def close(self):
+        self.measuring.clear()
+        self._shutdown.set()
+        if self._process is not None:
+            self._process.join(timeout=2)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process = None
+        if self._shm is not None:
+            self.ring = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def usage(self):
+        return proc_usage(self._process.pid) if self._process is not None else None
+
+    @property
+    def cpu_time(self):
+        # user + system CPU of the sampler process
+        usage = self.usage()
+        return usage["cpu_time"] if usage else 0.0
+
+    def _release(self):
+        if self.gated and self._window is None:
+            self.measuring.clear()
+
+    def baseline_samples(self, duration):
+        self.measuring.set()
+        try:
+            return super().baseline_samples(duration)
+        finally:
+            self._release()
+
+    def baseline(self, duration=20, cache=None, key=None):
+        self.measuring.set()
+        try:
+            return super().baseline(duration, cache, key)
+        finally:
+            self._release()
+
+    def start_window(self, name=""):
+        self.measuring.set()
+        return super().start_window(name)
+
+    def region(self, name):
+        # Regions are only attributed afterwards, so a gated sampler becomes always-on
+        if self.gated:
+            self.gated = False
+            self.measuring.set()
+        return super().region(name)
+
+    def stop_window(self, n_inferences=1):
+        try:
+            return super().stop_window(n_inferences)
+        finally:
+            self._release()
+
+
 class JtopMonitor:
     
-    def __init__(self, baseline_duration: int = 20, sample_interval: float = 0.01,filename="energy.csv",logs=True):
+    def __init__(self, baseline_duration: int = 20, sample_interval: float = 0.01,filename="energy.csv",logs=True,
+                 ring_capacity: int = 1 << 18, baseline_cache: Optional[BaselineCache] = None,
+                 max_interval: Optional[float] = None, cpu: Optional[int] = None, trace_store=None,
+                 export_port: Optional[int] = None):
         self.baseline_duration = baseline_duration
         self.sample_interval = sample_interval
         self.jetson = None
@@ -9,6 +190,7 @@ class JtopMonitor:
         self.baseline_power: List[float] = []
         self.measurement_power: List[float] = []
         self.baseline_avg: Optional[float] = None
+        self.baseline_cache = baseline_cache
 
         self.is_measuring = False
         self.measurement_thread = None
@@ -17,60 +199,69 @@ class JtopMonitor:
         self.filename = filename
         self.inference_name=None
         self.results=None
+
+        # Shared-memory trace written by a sampler process that outlives start/stop cycles;
+        # spawned now so start() only has to flip an event
+        self.ring_capacity = ring_capacity
+        # sample_interval is the sampler's period (at least that long between reads).
+        # Low-overhead options: max_interval backs polling off while jtop's readings repeat,
+        # cpu pins the sampler to one (ideally isolated) core
+        self.meter = JtopMeter(interval=sample_interval, ring_capacity=ring_capacity, gated=True,
+                               max_interval=max_interval, cpu=cpu).open()
+        self._trace = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        # Sampler CPU, wakeups and memory during the baseline and the last window
+        self.baseline_overhead: Dict = {}
+        self.overhead: Dict = {}
+        # Optional common.trace_store.TraceStore that keeps each window's raw trace
+        self.trace_store = trace_store
+        # Optional live telemetry (Prometheus text on :export_port/metrics); the sampler
+        # then runs continuously instead of only inside windows
+        self.exporter = None
+        if export_port is not None:
+            self.meter.gated = False
+            self.meter.measuring.set()
+            self.exporter = TelemetryExporter(self.meter, http_port=export_port,
+                                              labels={"device": socket.gethostname()}).start()
         
         print(f"Initialize Energy Monitor with baseline {baseline_duration}s and interval {sample_interval}s")
 
         self._measure_baseline()
     
+    def _sample_baseline(self, duration):
+        # mW, as the rest of the monitor reports
+        return [p * 1000 for p in self.meter.baseline_samples(duration)]
+
     def _measure_baseline(self):
 
-        print(f"Start measuring baseline in {self.baseline_duration} s")
-        print("Please make sure no tasks are running!")
-        
+        cached = False
+        usage0, t0 = self.meter.usage(), time.perf_counter()
         try:
-            with jtop(interval=0.005) as jetson:
-                start_baseline = time.time()
-                samples_count = 0
-                
-                while time.time() - start_baseline < self.baseline_duration:
-                        stats = jetson.stats
-                        power_total = stats.get("Power TOT", 0)
-                        self.baseline_power.append(power_total)
-                        samples_count += 1
-                        
-                        # Hiển thị tiến trình
-                        elapsed = time.time() - start_baseline
-                        remaining = self.baseline_duration - elapsed
-                        print(f"\rMeasuring baseline: {elapsed:.1f}s/{self.baseline_duration}s - "
-                              f"Power: {power_total:.2f}mW - remaining: {remaining:.1f}s", end="")
-                        time.sleep(0.005)
-
-                
-                # Tính toán baseline trung bình
+            if self.baseline_cache is None:
+                print(f"Start measuring baseline in {self.baseline_duration} s")
+                print("Please make sure no tasks are running!")
+                self.baseline_power = self._sample_baseline(self.baseline_duration)
                 if self.baseline_power:
                     self.baseline_avg = sum(self.baseline_power) / len(self.baseline_power)
-                    print(f"\nComplete baseline measurement!")
-                    print(f"Baseline sample number: {samples_count}")
-                    print(f"Average baseline energy: {self.baseline_avg:.2f}mW")
-                    print(f"Min: {min(self.baseline_power):.2f}mW, Max: {max(self.baseline_power):.2f}mW")
-                else:
-                    print("\nError: Unable to measure baseline!")
-                    
+            else:
+                print("Checking cached baseline, please make sure no tasks are running!")
+                key = BaselineCache.key(socket.gethostname(), "jtop", _power_mode())
+                self.baseline_avg, self.baseline_power, cached = self.baseline_cache.baseline(
+                    key, self._sample_baseline, self.baseline_duration)
+
+            # Tính toán baseline trung bình
+            if self.baseline_power:
+                print(f"\nComplete baseline measurement!" + (" (cached, probe agrees)" if cached else ""))
+                print(f"Baseline sample number: {len(self.baseline_power)}")
+                print(f"Average baseline energy: {self.baseline_avg:.2f}mW")
+                print(f"Min: {min(self.baseline_power):.2f}mW, Max: {max(self.baseline_power):.2f}mW")
+                self.baseline_overhead = usage_delta(usage0, self.meter.usage(), time.perf_counter() - t0)
+                _print_overhead(self.baseline_overhead)
+            else:
+                print("\nError: Unable to measure baseline!")
+
         except Exception as e:
             print(f"\nError when measuring baseline: {e}")
     
-    def _measurement_worker(self,shared_list):
-        try:
-            with jtop(interval=0.005) as jetson:
-                while self.is_measuring:
-                    stats = jetson.stats
-                    power_total = stats.get("Power TOT", 0)
-                    shared_list.append(power_total)
-                    time.sleep(0.005)
-                    
-        except Exception as e:
-            print(f"\nError during measurement: {e}")
-    
     def start(self,inference_name):
         if self.baseline_avg is None:
             print("Error: No baseline data yet. Please re-initialize!")
@@ -81,13 +272,12 @@ class JtopMonitor:
             return False
         
         if self.logs: print("\nStart measuring energy consumption...")
+        self.meter.open()
         self.inference_name=inference_name
-        self.measurement_power=mp.Manager().list()
         self.results = None
         self.is_measuring = True
-        self.start_time = time.time()
-        self.measurement_thread = mp.Process(target=self._measurement_worker,args=(self.measurement_power,))
-        self.measurement_thread.start()
+        self.meter.baseline_power = self.baseline_avg / 1000
+        self.start_time = self.meter.start_window(inference_name) / 1e9
 
         
         return True
@@ -98,23 +288,49 @@ class JtopMonitor:
             return {}
 
         if self.logs: print("\nStop measuring energy...")
+        window = self.meter.stop_window()
+        self.overhead = {k: v for k, v in window.items() if k.startswith("sampler_")}
+        self.end_time = window["end_time"]
         self.is_measuring = False
-        self.end_time = time.time()
 
-        if self.measurement_thread:
-            self.measurement_thread.terminate()
-            self.measurement_thread.join()
+        t_ns, power = self.meter.trace(int(self.start_time * 1e9), int(self.end_time * 1e9))
+        self._trace = (t_ns.copy(), power * 1000)
+        self.measurement_power = self._trace[1]
+        if self.trace_store is not None:
+            self.trace_store.add(t_ns, power, start_ns=int(self.start_time * 1e9), end_ns=int(self.end_time * 1e9),
+                                 baseline=self.baseline_avg / 1000, model=self.inference_name, mode=_power_mode(),
+                                 meter=self.meter.name, device=socket.gethostname(), **self.overhead)
         
         return self._analyze_results()
+
+    def region(self, name):
+        # Marks a region on the running sampler: with monitor.region("preprocess"): ...
+        return self.meter.region(name)
+
+    def region_report(self, split=False):
+        # Energy of every region marked so far, with the monitor's baseline removed
+        baseline = self.baseline_avg / 1000 if self.baseline_avg is not None else 0.0
+        regions, rows = self.meter.region_energy(baseline=baseline, split=split)
+        if self.logs:
+            print_summary(rows)
+        return rows
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.stop()
+        self.meter.close()
     
     def _analyze_results(self) -> Dict:
-        if not self.measurement_power or self.baseline_avg is None:
+        if not len(self.measurement_power) or self.baseline_avg is None:
             return {}
 
         duration = self.end_time - self.start_time if self.start_time and self.end_time else 0
-        avg_power = sum(self.measurement_power) / len(self.measurement_power)
-        min_power = min(self.measurement_power)
-        max_power = max(self.measurement_power)
+        t_ns, power = self._trace
+        # Time-weighted over the exact window rather than a plain sample mean
+        window = window_energy(t_ns, power, int(self.start_time * 1e9), int(self.end_time * 1e9))
+        avg_power = window["avg_power"] if window["samples"] else float(power.mean())
+        min_power = float(power.min())
+        max_power = float(power.max())
 
         power_increase = avg_power - self.baseline_avg
         power_increase_percent = (power_increase / self.baseline_avg) * 100 if self.baseline_avg > 0 else 0
@@ -135,7 +351,8 @@ class JtopMonitor:
             'total_energy_baseline': total_energy_baseline,
             'total_energy_measurement': total_energy_measurement,
             'extra_energy_consumed': extra_energy,
-            'samples_count': len(self.measurement_power)
+            'samples_count': len(self.measurement_power),
+            **self.overhead,
         }
 
         if self.logs:
@@ -152,6 +369,7 @@ class JtopMonitor:
             print(f"Total baseline energy: {total_energy_baseline:.4f} mWh")
             print(f"Total energy measured:     {total_energy_measurement:.4f} mWh")
             print(f"Additional energy consumption: {extra_energy:.4f} mWh")
+            _print_overhead(self.overhead)
             print("="*60)
         
         return self.results
@@ -179,6 +397,8 @@ class JtopMonitor:
                     'Inference name': self.inference_name,
                     'Duration': self.results['duration'],
                     'Energy consumption (mWh)': self.results['extra_energy_consumed'],
+                    'Sampler CPU (%)': self.results.get('sampler_cpu_percent', ''),
+                    'Sampler wakeups/s': self.results.get('sampler_wakeups_per_s', ''),
                 },
             ]
             df = pd.DataFrame(data_to_write)
@@ -0,0 +1,101 @@
+import argparse
+import os
+import sys
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.power_trace import PowerRing
+
+# Compares the old per-start Manager().list() + Process transport with the
+# persistent shared-memory ring, using synthetic samples so it runs without jtop.
+
+
+def _manager_worker(shared_list, n_samples):
+    for i in range(n_samples):
+        shared_list.append(1000.0 + i % 7)
+
+
+def _ring_worker(shm_name, capacity, n_samples, measuring, done):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = PowerRing(capacity, buffer=shm.buf)
+    measuring.wait()
+    for i in range(n_samples):
+        ring.append(time.time_ns(), 1000.0 + i % 7)
+    done.set()
+    del ring
+    shm.close()
+
+
+def bench_manager(n_samples, repeats):
+    start_latency = []
+    per_sample = []
+    cpu = []
+    for _ in range(repeats):
+        c0 = time.process_time()
+        t0 = time.perf_counter()
+        manager = mp.Manager()
+        shared_list = manager.list()
+        proc = mp.Process(target=_manager_worker, args=(shared_list, n_samples))
+        proc.start()
+        start_latency.append(time.perf_counter() - t0)
+        t1 = time.perf_counter()
+        proc.join()
+        per_sample.append((time.perf_counter() - t1) / n_samples)
+        assert len(shared_list) == n_samples
+        cpu.append(time.process_time() - c0)
+        manager.shutdown()
+    return start_latency, per_sample, cpu
+
+
+def bench_ring(n_samples, repeats):
+    capacity = max(n_samples, 1024)
+    shm = shared_memory.SharedMemory(create=True, size=PowerRing.nbytes(capacity))
+    ring = PowerRing(capacity, buffer=shm.buf)
+    start_latency = []
+    per_sample = []
+    cpu = []
+    try:
+        for _ in range(repeats):
+            # The ring transport pays the process spawn once, outside the timed start
+            measuring = mp.Event()
+            done = mp.Event()
+            proc = mp.Process(target=_ring_worker, args=(shm.name, capacity, n_samples, measuring, done))
+            proc.start()
+            c0 = time.process_time()
+            t0 = time.perf_counter()
+            window_start = ring.count
+            measuring.set()
+            start_latency.append(time.perf_counter() - t0)
+            t1 = time.perf_counter()
+            done.wait()
+            per_sample.append((time.perf_counter() - t1) / n_samples)
+            assert ring.count - window_start == n_samples
+            cpu.append(time.process_time() - c0)
+            proc.join()
+    finally:
+        del ring
+        shm.close()
+        shm.unlink()
+    return start_latency, per_sample, cpu
+
+
+def _report(name, start_latency, per_sample, cpu):
+    print(f"{name:>8}: start {1e3 * min(start_latency):8.3f} ms | "
+          f"append {1e6 * min(per_sample):8.3f} us/sample | "
+          f"controller CPU {1e3 * min(cpu):8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JtopMonitor sample transports")
+    parser.add_argument("--samples", type=int, default=20000, help="samples written per window")
+    parser.add_argument("--repeats", type=int, default=5, help="start/stop cycles per transport")
+    args = parser.parse_args()
+
+    _report("manager", *bench_manager(args.samples, args.repeats))
+    _report("shm ring", *bench_ring(args.samples, args.repeats))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
 import csv
+import json
 import minimalmodbus
 import serial
 import time
 import re
-import threading
 import os
-from itertools import product
+import sys
+from ssh_session import LocalSession, get_session, close_sessions
+from pzem_sampler import REG_START, REG_COUNT, ModbusTransport, PZEMMeter, decode_registers
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.baseline_cache import BaselineCache
+from common.clock_sync import ClockSync
+from common.exporter import TelemetryExporter
+from common.steady_state import detect
+from common.trace_store import TraceStore
+from common.sweep import Sweep
+from inference_server import send_request
 DEVICE_ADDRESS = 0x01
 BAUD_RATE = 9600
 TIMEOUT = 1
@@ -13,197 +23,408 @@ PORT = 'COM3'
 IP="192.168.137.220"
 PASSWORD="123456"
 USERNAME="jetson"
+# Extra run_model.py options; adaptive stops once latency has converged
+RUN_OPTIONS={"adaptive": True, "max_time": 60}
+# Port of the resident `run_model.py --serve` daemon on the board; None starts a fresh process per combo
+DAEMON_PORT=8765
+REMOTE_DIR="Energy_consumption"
+ACTIVATE="source venv/bin/activate"
+# Raw traces kept per run (with this much context either side) for later re-analysis
+TRACE_STORE="trace_store"
+TRACE_MARGIN=1.0
+# Board timestamps are mapped onto the host clock from round trips bracketing every run
+CLOCK_SYNC=True
+CLOCK_PROBES=16
+# Completed combos are checkpointed here and skipped on restart; failures retry with backoff
+SWEEP_CHECKPOINT="sweep_checkpoint.json"
+SWEEP_RETRIES=2
+BASELINE_DURATION=20
+# Idle time between combos so the board cools down
+COOLDOWN=10
 
 
 def cmd_ssh(host, username, password=None, key_filepath=None, command="echo hello", port=22, timeout=10, use_sudo=False):
-    try:
-        import paramiko
-        import sys
-    except ImportError:
-        raise RuntimeError("paramiko is required: run `pip install paramiko`")
-
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    try:
-        if key_filepath:
-            pkey = paramiko.RSAKey.from_private_key_file(key_filepath)
-            client.connect(hostname=host, port=port, username=username, pkey=pkey, timeout=timeout)
-        else:
-            client.connect(hostname=host, port=port, username=username, password=password, timeout=timeout)
-
-        exec_cmd = command
-        get_pty = False
-        if use_sudo:
-            exec_cmd = "sudo -S -p '' " + command
-            get_pty = True
-
-        stdin, stdout, stderr = client.exec_command(exec_cmd, get_pty=get_pty)
-
-        # If using sudo and a password is provided, send it via stdin (note: security risk)
-        if use_sudo and password:
-            try:
-                stdin.write(password + "\n")
-                stdin.flush()
-            except Exception:
-                pass
-
-        channel = stdout.channel
-
-        out_parts = []
-        err_parts = []
-
-        # Stream and collect output
-        while True:
-            if channel.recv_ready():
-                data = stdout.read(channel.recv_ready()).decode("utf-8", errors="ignore")
-                if data:
-                    out_parts.append(data)
-            if channel.recv_stderr_ready():
-                edata = stderr.read(channel.recv_stderr_ready()).decode("utf-8", errors="ignore")
-                if edata:
-                    err_parts.append(edata)
-            if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
-                break
-            time.sleep(0.1)
-
-        exit_code = channel.recv_exit_status()
-        out = "".join(out_parts)
-        err = "".join(err_parts)
-        return out, err, exit_code
-    finally:
-        client.close()
+    # Reuses one pooled SSH transport per host instead of reconnecting for every command
+    session = get_session(host, username, password=password, key_filepath=key_filepath, port=port, timeout=timeout)
+    return session.run(command, use_sudo=use_sudo)
 
 def read_pzem_data(instrument):
     try:
-        voltage = instrument.read_register(0x0000, number_of_decimals=2, functioncode=4)
-        current = instrument.read_register(0x0001, number_of_decimals=2, functioncode=4)
-        power_low = instrument.read_register(0x0002, functioncode=4)
-        power_high = instrument.read_register(0x0003, functioncode=4)
-        power = (power_high << 16) + power_low
-
-        return voltage, current, power*0.1
+        # One block read instead of four single-register transactions
+        regs = instrument.read_registers(REG_START, REG_COUNT, functioncode=4)
+        return decode_registers(regs)
 
     except minimalmodbus.ModbusException as e:
         print(f"Modbus error: {e}")
     except Exception as e:
         print(f"General error: {e}")
 
-def measure_baseline(instrument):
-    start_time=time.time()
-    powers=[]
-    while time.time()-start_time<=20:
-        _, _, power = read_pzem_data(instrument)
-        time.sleep(0.001)
-        powers.append(power)
-    avg_power=sum(powers)/len(powers)
-    return avg_power
-def measure_running(instrument, stop_event, output_list):
-    while not stop_event.is_set():
-        _, _, power = read_pzem_data(instrument)
-        time.sleep(0.0001)
-        output_list.append((time.time(), power))
+def _flags(options):
+    return " ".join(f"--{k.replace('_', '-')}" if v is True else f"--{k.replace('_', '-')} {v}"
+                    for k, v in options.items() if v is not False and v is not None)
 
 
-def main():
-    instrument = minimalmodbus.Instrument(PORT, DEVICE_ADDRESS)
+def start_daemon(session, port=DAEMON_PORT, timeout=300):
+    # Launch the resident inference server (if it is not already up) and wait until it answers
+    try:
+        return daemon_request(session, {"cmd": "ping"}, port)
+    except Exception:
+        pass
+    session.run(f"{ACTIVATE} && cd {REMOTE_DIR} && "
+                f"nohup python3 run_model.py --serve --port {port} > serve.log 2>&1 < /dev/null &")
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return daemon_request(session, {"cmd": "ping"}, port)
+        except Exception:
+            if time.time() > deadline:
+                raise
+            time.sleep(1)
+
+
+def daemon_request(session, payload, port=DAEMON_PORT):
+    # Tunnel to the daemon's localhost port over the existing SSH transport
+    channel = session.open_channel("direct-tcpip", ("127.0.0.1", port))
+    try:
+        return send_request(channel, payload)
+    finally:
+        channel.close()
+
+
+def run_model_remote(session, model, bs, backend="eager", daemon_port=DAEMON_PORT, on_output=None):
+    if daemon_port:
+        reply = daemon_request(session, dict(RUN_OPTIONS, model=model, batch_size=bs, backend=backend), daemon_port)
+        if not reply.get("ok"):
+            return {"error": "daemon_failed", "stdout": "", "stderr": reply.get("error", "")}
+        reply["exit_code"] = 0
+        # The daemon has no stdout to stream; its reply stands in for the script's result line
+        if on_output is not None:
+            on_output("result: " + json.dumps(reply))
+        return reply
+
+    cmd_run_model = f"{ACTIVATE} && cd {REMOTE_DIR} && python3 run_model.py --model {model} --batch-size {bs} --backend {backend} {_flags(RUN_OPTIONS)}"
+    out, err, exit_code = session.run(cmd_run_model, on_stdout=on_output)
+
+    # The script ends with its result as one JSON line, the same dict the daemon replies with
+    m_result = re.search(r"^result:\s*(\{.*\})\s*$", out, re.M)
+    if m_result:
+        reply = json.loads(m_result.group(1))
+        reply["exit_code"] = exit_code
+        return reply
+    # Older scripts: parse start and end times robustly
+    m_start = re.search(r"start time:\s*([\d.]+)", out)
+    m_end = re.search(r"end time:\s*([\d.]+)", out)
+    if not m_start or not m_end:
+        return {"error": "parse_failed", "stdout": out, "stderr": err}
+    # Adaptive runs choose their own length; older scripts always ran 500
+    m_iter = re.search(r"^iterations:\s*(\d+)", out, re.M)
+    return {
+        "start_time": float(m_start.group(1)),
+        "end_time": float(m_end.group(1)),
+        "iterations": int(m_iter.group(1)) if m_iter else 500,
+        "exit_code": exit_code,
+    }
+
+
+class Recorder:
+    # Single writer for measured combos: raw trace into the results store (flushed, so
+    # it is durable before the combo counts as done) and a summary row into the CSV
+    def __init__(self, store, csv_file="results.csv", board_column=False):
+        self.store = store
+        self.csv_file = csv_file
+        self.board_column = board_column
+
+    def __call__(self, result):
+        result = dict(result)
+        t_ns, power = result.pop("t_ns"), result.pop("power")
+        # Every other field (run parameters, steady-state split, clock alignment, anything
+        # a run engine adds) is kept with the trace
+        meta = {k: v for k, v in result.items() if k not in ("start_ns", "end_ns", "baseline", "iterations")}
+        self.store.add(t_ns, power, start_ns=result["start_ns"], end_ns=result["end_ns"], baseline=result["baseline"],
+                       n_inferences=result["iterations"], **meta)
+        self.store.flush()
+
+        row = {
+            "Model": result["model"],
+            "Energy (mJ)": result["energy_j"] * 10**3,
+            "Latency (s)": result["latency"],
+            "error": "",
+            "exit_code": result["exit_code"],
+            "Batch_size": result["batch_size"],
+            "Mode": result["mode"],
+            "Backend": result["backend"],
+        }
+        if self.board_column:
+            row["Board"] = result["board"]
+        row["Alignment uncertainty (ms)"] = result.get("clock_uncertainty_ms", "")
+        # Appending to an existing file keeps its columns, so older result files stay readable
+        header = None
+        if os.path.exists(self.csv_file):
+            with open(self.csv_file, newline="") as f:
+                header = next(csv.reader(f), None)
+        with open(self.csv_file, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=header or list(row), extrasaction="ignore")
+            if header is None:
+                writer.writeheader()
+            writer.writerow(row)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class RemoteClock:
+    # Board timestamps for ClockSync, from round trips on one persistent channel: the
+    # daemon's ping, or a small stdin/stdout echo loop over SSH when there is no daemon
+    ECHO = "import sys,time;[print(time.time_ns(),flush=True) for _ in iter(sys.stdin.readline, str())]"
+
+    def __init__(self, session, daemon_port=DAEMON_PORT):
+        self.session = session
+        self.daemon_port = daemon_port
+        self._channel = None
+
+    def _open(self):
+        if self.daemon_port:
+            self._channel = self.session.open_channel("direct-tcpip", ("127.0.0.1", self.daemon_port))
+        else:
+            self._channel = self.session.open_channel()
+            self._channel.exec_command(f'python3 -u -c "{self.ECHO}"')
+            self._reader = self._channel.makefile("r")
+
+    def stamp(self):
+        if self._channel is None:
+            self._open()
+        if self.daemon_port:
+            return int(send_request(self._channel, {"cmd": "ping"})["time_ns"])
+        self._channel.sendall(b"\n")
+        return int(self._reader.readline())
+
+    def close(self):
+        if self._channel is not None:
+            self._channel.close()
+            self._channel = None
+
+
+def steady_fields(t_ns, power, start_ns, end_ns, baseline, n_inferences):
+    # Net energy per inference over the steady state only, with warmup and tail split off
+    try:
+        stats = detect(t_ns, power, start_ns, end_ns, baseline, n_inferences)
+    except ValueError as e:
+        print(f"No steady state: {e}")
+        return {}
+    print(f"Steady state {stats['steady_s']:.2f} s after {stats['warmup_s']:.2f} s warmup: "
+          f"{stats['energy_j']:.6f} J per inference, tail {stats['tail_energy_j']:.3f} J over {stats['tail_s']:.2f} s")
+    return {"steady_energy_j": stats["energy_j"], "steady_s": stats["steady_s"], "warmup_s": stats["warmup_s"],
+            "tail_energy_j": stats["tail_energy_j"], "tail_s": stats["tail_s"]}
+
+
+def open_instrument(port):
+    instrument = minimalmodbus.Instrument(port, DEVICE_ADDRESS)
     instrument.serial.baudrate = 9600
     instrument.serial.bytesize = 8
     instrument.serial.parity = serial.PARITY_NONE
     instrument.serial.stopbits = 2
     instrument.serial.timeout = 1
+    return instrument
+
+
+def open_meter(port):
+    # Samples continuously into one preallocated trace reused for every combo
+    # (~25 MB, hours of samples at the meter's rate)
+    return PZEMMeter(ModbusTransport(open_instrument(port))).open()
+
+
+def board_session(board):
+    if board.get("local"):
+        return LocalSession()
+    return get_session(board["ip"], board["username"], password=board.get("password"))
+
+
+class BoardSweep:
+    # One board with its own meter, kept open across any number of sweeps: the meter,
+    # SSH session, daemon, exporter and clock sync are set up once, and the current power
+    # mode and its baseline carry over from one run() to the next.
+    # board: name, ip, username, password, port (meter serial port) and optionally
+    # local (a LocalSession stand-in), daemon_port, baseline_cache, baseline_duration, cooldown,
+    # export_port, export_udp, clock_sync.
+    def __init__(self, board):
+        self.board = board
+        self.name = board.get("name", board["ip"])
+        self.meter = open_meter(board["port"])
+        # Live power/energy for dashboards while the sweep runs: Prometheus text over HTTP
+        # (export_port) and/or UDP datagrams (export_udp = [host, port])
+        self.exporter = None
+        if board.get("export_port") is not None or board.get("export_udp"):
+            udp = tuple(board["export_udp"]) if board.get("export_udp") else None
+            self.exporter = TelemetryExporter(self.meter, http_port=board.get("export_port"), udp=udp,
+                                              labels={"board": self.name}).start()
+        self.baseline_cache = BaselineCache(board.get("baseline_cache", "baseline_cache.json"))
+        self.session = board_session(board)
+        self.daemon_port = board.get("daemon_port", DAEMON_PORT)
+        if self.daemon_port:
+            print(f"[{self.name}] Starting inference daemon on the board...")
+            start_daemon(self.session, self.daemon_port)
+
+        self.baseline = None
+        # Parameter values already applied on the board (Sweep.run's on_change state)
+        self.state = {}
+        self.clock = ClockSync()
+        self.remote_clock = RemoteClock(self.session, self.daemon_port) if board.get("clock_sync", CLOCK_SYNC) else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.stop()
+            self.exporter = None
+        if self.remote_clock is not None:
+            self.remote_clock.close()
+        self.meter.close()
+
+    def sync_clock(self):
+        # A failed burst only widens the reported uncertainty; the channel is reopened next time
+        if self.remote_clock is None:
+            return
+        try:
+            self.clock.burst(self.remote_clock.stamp, CLOCK_PROBES)
+        except Exception as e:
+            print(f"[{self.name}] Clock sync failed: {e}")
+            self.remote_clock.close()
+
+    def set_mode(self, mode, combo):
+        # Runs once per power mode: the board re-settles its clocks after nvpmodel
+        board, name = self.board, self.name
+        cmd_run_model = f" nvpmodel -m {mode}"
+        __, _, _ = self.session.run(cmd_run_model, use_sudo=True)
+        print(f"[{name}] Measuring baseline power consumption...")
+        self.baseline = self.meter.baseline(board.get("baseline_duration", BASELINE_DURATION), cache=self.baseline_cache,
+                                            key=BaselineCache.key(board["ip"], f"pzem:{board['port']}", mode))
+        print(f"[{name}] Baseline power consumption: {self.baseline} W")
+
+    def run_remote(self, combo, on_output=None):
+        # One run on the board, bracketed by clock-sync bursts
+        self.meter.sampler.reset_stats()
+        self.sync_clock()
+        run = run_model_remote(self.session, combo["model"], combo["batch_size"], combo["backend"], self.daemon_port,
+                               on_output)
+        self.sync_clock()
+
+        if "error" in run:
+            print(f"Could not get start/end times for model {combo['model']}. stdout:\n{run['stdout']}\n"
+                  f"stderr:\n{run['stderr']}")
+            raise RuntimeError(run["error"])
+        print("Start:", run["start_time"])
+        print("End:", run["end_time"])
+        return run
+
+    def window(self, combo, run):
+        # -> (start_ns, end_ns, energy stats, alignment fields) of a run on the host clock
+        meter, clock = self.meter, self.clock
+        # Board clock -> host clock, with the alignment uncertainty of this window
+        start_ns, end_ns = int(run["start_time"] * 1e9), int(run["end_time"] * 1e9)
+        alignment = {}
+        if clock.fit is not None:
+            start_ns, end_ns = clock.to_host(start_ns), clock.to_host(end_ns)
+            alignment = clock.summary(end_ns)
+            alignment.pop("clock_bursts")
+            print(f"Clock offset {alignment['clock_offset_ms']:.3f} ms "
+                  f"(+/- {alignment['clock_uncertainty_ms']:.3f} ms, drift {alignment['clock_drift_ppm']:.2f} ppm)")
+
+        # Window selection, trapezoidal integration, baseline removal and per-inference
+        # normalisation in one vectorised pass over the ring
+        stats = meter.energy(start_ns, end_ns, n_inferences=run["iterations"])
+
+        print("Collected samples (within interval):", stats["samples"])
+        print(f"Sample rate: {meter.sampler.sample_rate():.1f} Hz")
+        if stats["samples"] < 2:
+            raise RuntimeError(f"only {stats['samples']} samples in the measurement window")
+
+        energy_j = stats["energy_j"]
+        print(f"[{self.name}] Model {combo['model']}: {energy_j:.6f} J ({energy_j / 3600.0:.6f} Wh)")
+        return start_ns, end_ns, stats, alignment
+
+    def finish(self, combo, run, window, tail_s, record, **extra):
+        # Stores the run with its trace; the cooldown just waited (tail_s) is the trailing
+        # context of the stored trace, so the tail is in it
+        board, meter = self.board, self.meter
+        start_ns, end_ns, stats, alignment = window
+        n_iter = run["iterations"]
+        margin_ns = int(TRACE_MARGIN * 1e9)
+        tail_ns = max(margin_ns, int(tail_s * 1e9))
+        meter.flush(end_ns + tail_ns, timeout=TRACE_MARGIN + 0.5)
+        t_ns, power = meter.trace(start_ns - margin_ns, end_ns + tail_ns)
+        steady = steady_fields(t_ns, power, start_ns, end_ns, self.baseline, n_iter)
+
+        record({
+            "board": self.name,
+            "device": board["ip"],
+            "meter": f"{meter.name}:{board['port']}",
+            "model": combo["model"],
+            "batch_size": combo["batch_size"],
+            "mode": combo["mode"],
+            "backend": combo["backend"],
+            "energy_j": stats["energy_j"],
+            "samples": stats["samples"],
+            "exit_code": run["exit_code"],
+            "latency": (run["end_time"] - run["start_time"])/n_iter,
+            "iterations": n_iter,
+            "baseline": self.baseline,
+            "start_ns": start_ns,
+            "end_ns": end_ns,
+            "t_ns": t_ns.copy(),
+            "power": power.copy(),
+            **extra,
+            **steady,
+            **alignment,
+        })
+
+    def measure(self, combo, record):
+        model, bs, mode, backend = combo["model"], combo["batch_size"], combo["mode"], combo["backend"]
+        print(f"\n[{self.name}] Measuring model: {model} ({backend}, batch {bs}, mode {mode})")
+        run = self.run_remote(combo)
+        window = self.window(combo, run)
+        print("Sleep.....")
+        cooldown = self.board.get("cooldown", COOLDOWN)
+        time.sleep(cooldown)
+        self.finish(combo, run, window, cooldown, record)
+
+    def run(self, combos, record, checkpoint=None, is_done=None, measure=None):
+        # Measures `combos` (an ordered Sweep grid or list) with measure(combo, record),
+        # self.measure by default; the power mode is only switched (and its baseline
+        # probed) when it differs from the last one applied
+        measure = measure or self.measure
+        sweep = Sweep(combos, checkpoint=checkpoint, is_done=is_done, retries=SWEEP_RETRIES)
+        return sweep.run(lambda combo: measure(combo, record), on_change={"mode": self.set_mode}, state=self.state)
 
 
+def sweep_board(board, combos, record, checkpoint=None, is_done=None):
+    # Measures `combos` on one board with its own meter (see BoardSweep for the board keys)
+    with BoardSweep(board) as runner:
+        runner.run(combos, record, checkpoint=checkpoint, is_done=is_done)
+
+
+def sweep_params():
     # List of models to measure
     models = ["resnet18", "resnet50", "efficientnet_b1","efficientnet_b2","mobilenetv2_100"]
     batch_size=[1,2,4,8,16]
     mode_power=[0,1,2]
+    # Inference backends / precision variants (see backends.BACKENDS on the board)
+    backends=["eager"]
+    # Power mode outermost, then model/backend (a model load on the daemon), then batch size
+    return {"mode": mode_power, "model": models, "backend": backends, "batch_size": batch_size}
 
-    combos = product(models, batch_size, mode_power)
-    results={}
 
-    for model, bs, mode in combos:
-        cmd_run_model = f" nvpmodel -m {mode}"
-        __, _, _ = cmd_ssh(host=IP, username=USERNAME, password=PASSWORD, command=cmd_run_model,use_sudo=True)
-        print("Measuring baseline power consumption...")
-        baseline_power=measure_baseline(instrument)
-        print(f"Baseline power consumption: {baseline_power} W")
-        print(f"\nMeasuring model: {model}")
-        # Start measuring in a separate thread
-        running_powers = []
-        stop_event = threading.Event()
-        t = threading.Thread(target=measure_running, args=(instrument, stop_event, running_powers), daemon=True)
-        t.start()
-
-        cmd_run_model = f"source venv/bin/activate && cd Energy_consumption && python3 run_model.py --model {model} --batch-size {bs}"
-        out, err, exit_code = cmd_ssh(host=IP, username=USERNAME, password=PASSWORD, command=cmd_run_model)
-
-        # Parse start and end times robustly
-        m_start = re.search(r"start time:\s*([\d.]+)", out)
-        m_end = re.search(r"end time:\s*([\d.]+)", out)
-        if not m_start or not m_end:
-            print(f"Could not parse start/end times for model {model}. stdout:\n{out}\nstderr:\n{err}")
-            stop_event.set()
-            t.join(timeout=2)
-            results[model] = {"error": "parse_failed", "stdout": out, "stderr": err}
-            continue
-
-        start_time = float(m_start.group(1))
-        end_time = float(m_end.group(1))
-
-        # Stop the measuring thread and wait for it to finish
-        stop_event.set()
-        t.join(timeout=2)
-
-        print("Start:", start_time)
-        print("End:", end_time)
-
-        samples = [s for s in running_powers if start_time < s[0] <=end_time]
-        samples.sort(key=lambda x: x[0])
-
-        print("Collected samples (within interval):", len(samples))
-
-        # Integrate power (W) over time (s) using the trapezoidal rule to get energy in Joules
-        energy_j = 0.0
-        if len(samples) >= 2:
-            for (t0, p0), (t1, p1) in zip(samples, samples[1:]):
-                dt = t1 - t0
-                energy_j += 0.5 * (p0+ p1) * dt
-
-            energy_j -= baseline_power * (end_time - start_time)
-            energy_j /=500
-            energy_wh = energy_j / 3600.0
-            print(f"Model {model}: {energy_j:.6f} J ({energy_wh:.6f} Wh)")
-
-            results[model] = {
-                "energy_j": energy_j,
-                "energy_wh": energy_wh,
-                "samples": len(samples),
-                "exit_code": exit_code,
-                "batch_size": bs,
-                "mode": mode,
-                "latency": (end_time - start_time)/500
-            }
-
-            csv_file = "results.csv"
-            file_exists = os.path.exists(csv_file)
-            with open(csv_file, "a", newline="") as f:
-                writer = csv.writer(f)
-                if not file_exists:
-                    writer.writerow(["Model", "Energy (mJ)", "Latency (s)",  "error", "exit_code", "Batch_size", "Mode"])
-                writer.writerow([
-                    model,
-                    (results.get(model, {}).get("energy_j") or 0) * 10**3,
-                    results.get(model, {}).get("latency", 0),
-                    results.get(model, {}).get("error", ""),
-                    results.get(model, {}).get("exit_code", ""),
-                    results.get(model, {}).get("batch_size", bs),
-                    results.get(model, {}).get("mode", mode)
-                ])
-                f.flush()
-                os.fsync(f.fileno())
-
-        print("Sleep.....")
-        time.sleep(10)
+def main():
+    store = TraceStore(TRACE_STORE)
+    board = {"name": IP, "ip": IP, "username": USERNAME, "password": PASSWORD, "port": PORT}
+    try:
+        sweep_board(board, sweep_params(), Recorder(store), checkpoint=SWEEP_CHECKPOINT,
+                    is_done=lambda combo: bool(store.query(**combo)))
+    finally:
+        store.close()
+        close_sessions()
 
 if __name__ == "__main__":
     main()
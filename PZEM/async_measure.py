@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from Auto_measure import (COOLDOWN, IP, PASSWORD, PORT, SWEEP_CHECKPOINT, SWEEP_RETRIES, TRACE_STORE, USERNAME,
+                          BoardSweep, Recorder, close_sessions, sweep_params)
+from multi_measure import load_inventory, shard
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.sweep import Sweep
+from common.trace_store import TraceStore
+
+# asyncio version of the Auto_measure sweep. The board, its PZEMMeter (sampling on its
+# own thread) and the combo order, retries and checkpoints are Auto_measure's BoardSweep
+# and common.sweep.Sweep, but the combo loop is a coroutine: every blocking step (SSH/
+# daemon calls, nvpmodel and baseline probes, serial flushes, fsyncing writes) is
+# awaited on a worker thread. The remote command's output is streamed as it arrives,
+# the next combo starts as soon as the board's power is back at baseline instead of
+# after a fixed sleep, and several boards (--inventory) are swept concurrently from
+# one event loop.
+
+
+def recent_power(meter, seconds):
+    now = time.time_ns()
+    _, power = meter.trace(now - int(seconds * 1e9), now)
+    return power
+
+
+async def cooldown(meter, baseline, tolerance=0.05, window=1.0, max_time=3 * COOLDOWN, poll=0.25, fixed=COOLDOWN):
+    # Returns once the mean power over the last `window` seconds is within `tolerance`
+    # (relative) of the baseline, or after max_time; the elapsed time is returned.
+    # Without a baseline there is nothing to compare against, so it sleeps `fixed`.
+    if baseline is None:
+        await asyncio.sleep(fixed)
+        return fixed
+    t0 = time.monotonic()
+    while True:
+        elapsed = time.monotonic() - t0
+        if elapsed >= max_time:
+            return elapsed
+        if elapsed >= window:
+            power = recent_power(meter, window)
+            if len(power) >= 2 and abs(float(power.mean()) - baseline) <= tolerance * abs(baseline):
+                return elapsed
+        await asyncio.sleep(poll)
+
+
+async def stream_printer(queue, prefix):
+    # Remote stdout as it arrives, rather than after the command has finished
+    while True:
+        data = await queue.get()
+        if data is None:
+            return
+        for line in data.splitlines():
+            if line.strip():
+                print(f"{prefix} {line}")
+
+
+async def run_board(board, params, record, checkpoint=None, is_done=None, tolerance=0.05, max_cooldown=3 * COOLDOWN):
+    loop = asyncio.get_running_loop()
+    runner = await asyncio.to_thread(BoardSweep, board)
+    name = runner.name
+    output = asyncio.Queue()
+    printer = asyncio.create_task(stream_printer(output, f"[{name}]"))
+
+    def on_output(data):
+        loop.call_soon_threadsafe(output.put_nowait, data)
+
+    async def set_mode(mode, combo):
+        await asyncio.to_thread(runner.set_mode, mode, combo)
+
+    async def measure(combo):
+        print(f"\n[{name}] Measuring {combo}")
+        run = await asyncio.to_thread(runner.run_remote, combo, on_output)
+        window = await asyncio.to_thread(runner.window, combo, run)
+        waited = await cooldown(runner.meter, runner.baseline, tolerance, max_time=max_cooldown,
+                                fixed=board.get("cooldown", COOLDOWN))
+        print(f"[{name}] Back at baseline after {waited:.1f} s")
+        await asyncio.to_thread(runner.finish, combo, run, window, waited, record, cooldown_s=waited)
+
+    sweep = Sweep(params, checkpoint=checkpoint, is_done=is_done, retries=SWEEP_RETRIES)
+    try:
+        return await sweep.run_async(measure, on_change={"mode": set_mode}, state=runner.state)
+    finally:
+        await output.put(None)
+        await printer
+        await asyncio.to_thread(runner.close)
+
+
+async def run_boards(boards, params, record, checkpoint=None, is_done=None, **options):
+    # One shard of the pending combos per board, all boards on this event loop. The
+    # recorder is shared, so its writes are serialised.
+    if len(boards) == 1:
+        return await run_board(boards[0], params, record, checkpoint, is_done, **options)
+    lock = threading.Lock()
+
+    def locked_record(result):
+        with lock:
+            record(result)
+
+    # Completed combos are found through is_done up front, as with multi_measure's shards
+    pending = Sweep(params, checkpoint=None, is_done=is_done).pending()
+    for board in boards:
+        board.setdefault("baseline_cache", f"baseline_cache-{board['name']}.json")
+    return await asyncio.gather(*(run_board(board, combos, locked_record, **options)
+                                  for board, combos in zip(boards, shard(pending, len(boards))) if combos))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep boards with the asyncio run engine")
+    parser.add_argument("--inventory", help="JSON list of boards (see multi_measure); default: the Auto_measure board")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="cooldown ends within this fraction of baseline")
+    parser.add_argument("--max-cooldown", type=float, default=3 * COOLDOWN, help="upper bound on a cooldown (s)")
+    args = parser.parse_args()
+
+    store = TraceStore(TRACE_STORE)
+    if args.inventory:
+        boards = load_inventory(args.inventory)
+    else:
+        boards = [{"name": IP, "ip": IP, "username": USERNAME, "password": PASSWORD, "port": PORT}]
+    try:
+        asyncio.run(run_boards(boards, sweep_params(), Recorder(store, board_column=len(boards) > 1),
+                               checkpoint=SWEEP_CHECKPOINT, is_done=lambda combo: bool(store.query(**combo)),
+                               tolerance=args.tolerance, max_cooldown=args.max_cooldown))
+    finally:
+        store.close()
+        close_sessions()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import sys
+import time
+from queue import Empty
+from Auto_measure import Recorder, TRACE_STORE, sweep_board, sweep_params
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.sweep import Sweep
+from common.trace_store import TraceStore
+
+# Runs one sweep across several (board, meter) pairs. The pending combos are split into
+# contiguous shards of the mode-major order, so each board still switches power mode
+# rarely, and every pair gets its own worker process for its serial port and SSH
+# session. Workers send measurements back; this process is the only writer of the
+# merged results store and CSV, which tag every row with its board.
+#
+# Inventory: a JSON list of boards, e.g.
+#   [{"name": "jetson-a", "ip": "192.168.137.220", "username": "jetson", "password": "...", "port": "COM3"},
+#    {"name": "jetson-b", "ip": "192.168.137.221", "username": "jetson", "password": "...", "port": "COM4"}]
+# Optional per-board keys are those of Auto_measure.sweep_board.
+
+
+def load_inventory(path):
+    with open(path) as f:
+        boards = json.load(f)
+    for board in boards:
+        board.setdefault("name", board["ip"])
+    return boards
+
+
+def shard(combos, n):
+    size = math.ceil(len(combos) / n) if combos else 0
+    return [combos[i * size:(i + 1) * size] for i in range(n)]
+
+
+def _worker(board, combos, queue):
+    error = None
+    try:
+        sweep_board(board, combos, lambda result: queue.put(("result", result)))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    queue.put(("done", board["name"], error))
+
+
+def run_lab(boards, params, store_path=TRACE_STORE, csv_file="results_lab.csv", worker=_worker, poll=5.0):
+    store = TraceStore(store_path)
+    try:
+        pending = Sweep(params, checkpoint=None, is_done=lambda combo: bool(store.query(**combo))).pending()
+        print(f"{len(pending)} combos over {len(boards)} boards")
+        record = Recorder(store, csv_file, board_column=True)
+        ctx = mp.get_context("spawn")
+        queue = ctx.Queue()
+        workers = {}
+        for board, combos in zip(boards, shard(pending, len(boards))):
+            if not combos:
+                continue
+            # Separate cache files: the workers would otherwise overwrite each other's entries
+            board.setdefault("baseline_cache", f"baseline_cache-{board['name']}.json")
+            proc = ctx.Process(target=worker, args=(board, combos, queue), name=board["name"])
+            proc.start()
+            workers[board["name"]] = proc
+
+        t0 = time.time()
+        counts = {}
+        errors = {}
+
+        def handle(item):
+            if item[0] == "result":
+                record(item[1])
+                counts[item[1]["board"]] = counts.get(item[1]["board"], 0) + 1
+            elif item[1] not in errors:
+                _, name, error = item
+                errors[name] = error
+                print(f"[{name}] finished: {counts.get(name, 0)} combos" + (f", stopped by {error}" if error else ""))
+
+        while len(errors) < len(workers):
+            try:
+                handle(queue.get(timeout=poll))
+                continue
+            except Empty:
+                pass
+            # A worker killed outright (segfault, OOM killer) never posts "done"
+            dead = [name for name, proc in workers.items() if name not in errors and proc.exitcode is not None]
+            if not dead:
+                continue
+            # Anything it queued before exiting is already in the pipe
+            try:
+                while True:
+                    handle(queue.get_nowait())
+            except Empty:
+                pass
+            for name in dead:
+                handle(("done", name, f"worker exited with code {workers[name].exitcode}"))
+        for proc in workers.values():
+            proc.join(timeout=poll)
+        print(f"Sweep finished in {time.time() - t0:.1f} s")
+        return counts
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one measurement sweep across several boards in parallel")
+    parser.add_argument("--inventory", required=True, help="JSON list of (board, meter) entries")
+    parser.add_argument("--store", default=TRACE_STORE, help="merged results store")
+    parser.add_argument("--csv", default="results_lab.csv", help="merged summary CSV")
+    args = parser.parse_args()
+    run_lab(load_inventory(args.inventory), sweep_params(), args.store, args.csv)
+
+
+if __name__ == "__main__":
+    main()
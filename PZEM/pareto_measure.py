@@ -0,0 +1,182 @@
+import argparse
+import json
+import math
+import os
+import sys
+import zlib
+import numpy as np
+from Auto_measure import (IP, PASSWORD, PORT, TRACE_STORE, USERNAME, BoardSweep, Recorder, close_sessions,
+                          sweep_params)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.pareto import ParetoSearch, pareto_front
+from common.power_trace import window_energy
+from common.trace_store import TraceStore
+
+# Measures only what the energy/latency Pareto front of each model needs instead of the
+# whole sweep grid (common/pareto.py picks the points). Objectives are energy per image
+# and latency per batch. Every round the search proposes one point per unfinished model;
+# the rounds run on one BoardSweep (meter, session and clock sync opened once), so
+# baselines, retries, the results store and the CSV work as in Auto_measure. Runs
+# already in the store count as measured.
+#
+# --simulate and --replay STORE evaluate points without hardware (an analytic board
+# model, or the runs of a complete sweep in a store) and compare the front found with
+# the true front of the full grid.
+
+
+def objectives(energy_j, latency, batch_size):
+    return energy_j / batch_size, latency
+
+
+def stored_objectives(store, combo):
+    # Net energy per iteration (baseline removed) of the newest stored run of a combo, as
+    # Auto_measure reports it, or None
+    runs = store.query(**combo)
+    if not runs:
+        return None
+    run = runs[-1]
+    t_ns, power = store.trace(run, run["start_ns"], run["end_ns"])
+    stats = window_energy(t_ns, power, run["start_ns"], run["end_ns"], baseline=run["baseline"],
+                          n_inferences=run["n_inferences"])
+    return objectives(stats["energy_j"], stats["duration"] / run["n_inferences"], combo["batch_size"])
+
+
+def simulated_board(noise=0.02, seed=0):
+    # Analytic stand-in for a Jetson: higher power modes run faster but burn more, and
+    # bigger batches amortise the fixed per-call cost until the GPU saturates
+    modes = {0: (1.0, 9.0), 1: (1.4, 3.5), 2: (1.2, 6.0)}
+    backends = {"eager": 1.0, "fp16": 0.6, "trt": 0.45}
+    rng = np.random.default_rng(seed)
+
+    def evaluate(combo):
+        size = 1.0 + (zlib.crc32(combo["model"].encode()) % 100) / 25
+        slowdown, load = modes.get(combo["mode"], (1.0, 8.0))
+        speed = backends.get(combo["backend"], 1.0)
+        bs = combo["batch_size"]
+        latency = slowdown * speed * (0.004 * size + 0.003 * size * bs ** 0.85 + 0.0004 * max(bs - 8, 0) ** 2)
+        power = 3.0 + load * min(1.0, 0.35 + 0.12 * math.log2(bs)) * (0.9 + 0.1 * speed)
+        scale = 1 + noise * rng.standard_normal(2)
+        return power * latency / bs * scale[0], latency * scale[1]
+    return evaluate
+
+
+def search_offline(params, evaluate, **options):
+    search = ParetoSearch(params, **options)
+    while not search.finished:
+        batch = search.suggest()
+        for combo in batch:
+            result = evaluate(combo)
+            if result is None:
+                search.observe_failure(combo)
+            else:
+                search.observe(combo, *result)
+    return search
+
+
+def search_board(board, params, store, record, **options):
+    search = ParetoSearch(params, **options)
+    for combos in search.candidates.values():
+        for combo in combos:
+            known = stored_objectives(store, combo)
+            if known is not None:
+                search.observe(combo, *known)
+    if search.evaluations():
+        print(f"{search.evaluations()} points already in the store")
+
+    measured = {}
+
+    def observe(result):
+        record(result)
+        combo = {name: result[name] for name in params}
+        measured[ParetoSearch.key(combo)] = combo
+        search.observe(combo, *objectives(result["energy_j"], result["latency"], result["batch_size"]))
+
+    rounds = 0
+    with BoardSweep(board) as runner:
+        while not search.finished:
+            # Power mode outermost within a round, as in the full sweep
+            batch = sorted(search.suggest(), key=lambda c: [str(c[name]) for name in params])
+            if not batch:
+                break
+            rounds += 1
+            print(f"\nRound {rounds}: {len(batch)} points, {search.evaluations()}/{search.grid_size()} measured so far")
+            runner.run(batch, observe)
+            for combo in batch:
+                if ParetoSearch.key(combo) not in measured:
+                    search.observe_failure(combo)
+    return search
+
+
+def print_fronts(search, truth=None):
+    for g in search.candidates:
+        front = search.front(g)
+        print(f"\n{g}: {len(search.observed[g])}/{len(search.candidates[g])} points measured, "
+              f"{len(front)} on the front")
+        for combo, energy, latency in front:
+            point = ", ".join(f"{name}={combo[name]}" for name in search.space)
+            print(f"  {point:<40} {1e3 * energy:10.3f} mJ/image {1e3 * latency:9.2f} ms")
+        if truth is not None:
+            true_front = {ParetoSearch.key(c) for c in truth[g]}
+            found = {ParetoSearch.key(c) for c, _, _ in front}
+            print(f"  recovered {len(true_front & found)}/{len(true_front)} of the full-grid front"
+                  + (f", {len(found - true_front)} extra" if found - true_front else ""))
+    print(f"\n{search.evaluations()} of {search.grid_size()} grid points measured "
+          f"({100 * search.evaluations() / search.grid_size():.0f}%)")
+
+
+def true_fronts(params, evaluate, group="model"):
+    search = ParetoSearch(params, group=group)
+    fronts = {}
+    for g, combos in search.candidates.items():
+        values = [(c, evaluate(c)) for c in combos]
+        values = [(c, v) for c, v in values if v is not None]
+        fronts[g] = [values[i][0] for i in pareto_front([v for _, v in values])]
+    return fronts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adaptive energy/latency Pareto-front search")
+    parser.add_argument("--seeds", type=int, default=4, help="spread-out points measured first for every model")
+    parser.add_argument("--patience", type=int, default=3, help="measurements without a front change before stopping")
+    parser.add_argument("--min-improvement", type=float, default=0.01,
+                        help="stop once no point is expected to add this fraction of hypervolume")
+    parser.add_argument("--max-evals", type=int, help="upper bound on points per model")
+    parser.add_argument("--simulate", action="store_true", help="evaluate points on an analytic board model")
+    parser.add_argument("--replay", help="evaluate points from the runs of a complete sweep in this store")
+    parser.add_argument("--backends", nargs="+", help="override the backends of the sweep grid")
+    parser.add_argument("--json", help="also write the fronts here")
+    args = parser.parse_args()
+
+    params = sweep_params()
+    if args.backends:
+        params["backend"] = args.backends
+    options = {"seeds": args.seeds, "patience": args.patience, "min_improvement": args.min_improvement,
+               "max_evals": args.max_evals}
+
+    store = TraceStore(args.replay or TRACE_STORE) if not args.simulate else None
+    try:
+        if args.simulate or args.replay:
+            if args.replay:
+                evaluate = lambda combo: stored_objectives(store, combo)
+            else:
+                evaluate = simulated_board()
+            truth = true_fronts(params, simulated_board(noise=0.0) if args.simulate else evaluate)
+            search = search_offline(params, evaluate, **options)
+            print_fronts(search, truth)
+        else:
+            board = {"name": IP, "ip": IP, "username": USERNAME, "password": PASSWORD, "port": PORT}
+            search = search_board(board, params, store, Recorder(store), **options)
+            print_fronts(search)
+    finally:
+        if store is not None:
+            store.close()
+        close_sessions()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({g: [{**c, "energy_j": e, "latency": l} for c, e, l in search.front(g)]
+                       for g in search.candidates}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
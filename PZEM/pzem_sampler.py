@@ -0,0 +1,189 @@
+import math
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.meter import ThreadedMeter
+
+# PZEM DC meter input registers (function code 4). One block read covers
+# voltage, current, power and energy, so each sample is a single Modbus transaction.
+REG_START = 0x0000
+REG_COUNT = 8
+REG_VOLTAGE = 0
+REG_CURRENT = 1
+REG_POWER_LOW = 2
+REG_POWER_HIGH = 3
+REG_ENERGY_LOW = 4
+REG_ENERGY_HIGH = 5
+
+
+def decode_registers(regs):
+    voltage = regs[REG_VOLTAGE] / 100
+    current = regs[REG_CURRENT] / 100
+    power = ((regs[REG_POWER_HIGH] << 16) + regs[REG_POWER_LOW]) * 0.1
+    return voltage, current, power
+
+
+class ModbusTransport:
+    # Wraps a configured minimalmodbus.Instrument
+    def __init__(self, instrument):
+        self.instrument = instrument
+
+    def read_registers(self, start, count):
+        return self.instrument.read_registers(start, count, functioncode=4)
+
+
+class SimulatedPZEM:
+    # Register-level stand-in for the meter. power_fn maps seconds since creation to watts.
+    # With realtime=True each read blocks for the time the frames would take on the wire.
+    def __init__(self, power_fn=None, voltage=19.0, baudrate=9600, realtime=True):
+        self.power_fn = power_fn or (lambda t: 5.0 + 0.5 * math.sin(t))
+        self.voltage = voltage
+        self.baudrate = baudrate
+        self.realtime = realtime
+        self.energy_wh = 0.0
+        self._t0 = time.perf_counter()
+        self._last = self._t0
+
+    def registers(self, start=REG_START, count=REG_COUNT):
+        now = time.perf_counter()
+        power = max(self.power_fn(now - self._t0), 0.0)
+        self.energy_wh += power * (now - self._last) / 3600
+        self._last = now
+        current = power / self.voltage
+        raw_power = int(round(power * 10))
+        raw_energy = int(self.energy_wh)
+        regs = [0] * 8
+        regs[REG_VOLTAGE] = int(round(self.voltage * 100)) & 0xFFFF
+        regs[REG_CURRENT] = int(round(current * 100)) & 0xFFFF
+        regs[REG_POWER_LOW] = raw_power & 0xFFFF
+        regs[REG_POWER_HIGH] = (raw_power >> 16) & 0xFFFF
+        regs[REG_ENERGY_LOW] = raw_energy & 0xFFFF
+        regs[REG_ENERGY_HIGH] = (raw_energy >> 16) & 0xFFFF
+        return (regs + [0] * (start + count))[start:start + count]
+
+    def read_registers(self, start, count):
+        if self.realtime:
+            # 8-byte request + (5 + 2 * count)-byte response, 11 bits per byte with 2 stop bits
+            time.sleep((8 + 5 + 2 * count) * 11 / self.baudrate)
+        return self.registers(start, count)
+
+
+def modbus_crc(frame):
+    crc = 0xFFFF
+    for byte in frame:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return bytes((crc & 0xFF, crc >> 8))
+
+
+class PtyPZEM:
+    # Serves a SimulatedPZEM as Modbus RTU on a pseudo-terminal so the real
+    # minimalmodbus/pyserial path can be exercised without hardware: open
+    # `PtyPZEM(...).port` exactly as you would COM3 or /dev/ttyUSB0.
+    def __init__(self, device=None, address=0x01):
+        import tty
+
+        self.device = device or SimulatedPZEM(realtime=False)
+        self.address = address
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._master)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        buf = b""
+        while self._running:
+            try:
+                buf += os.read(self._master, 256)
+            except OSError:
+                break
+            while len(buf) >= 8:
+                frame, buf = buf[:8], buf[8:]
+                if modbus_crc(frame[:6]) != frame[6:] or frame[0] != self.address or frame[1] != 0x04:
+                    buf = b""
+                    break
+                start = (frame[2] << 8) | frame[3]
+                count = (frame[4] << 8) | frame[5]
+                regs = self.device.registers(start, count)
+                body = bytes((self.address, 0x04, 2 * count)) + b"".join(r.to_bytes(2, "big") for r in regs)
+                os.write(self._master, body + modbus_crc(body))
+
+    def close(self):
+        self._running = False
+        os.close(self._slave)
+        os.close(self._master)
+
+
+class PZEMSampler:
+    def __init__(self, transport, start=REG_START, count=REG_COUNT, anchor_interval=10.0):
+        self.transport = transport
+        self.start = start
+        self.count = count
+        # perf_counter_ns is monotonic; this offset maps it back onto the wall clock
+        # the remote board reports its start/end times in. The two clocks drift apart
+        # (NTP slews the wall clock), so it is re-anchored every anchor_interval seconds.
+        self.anchor_interval = anchor_interval
+        self.anchor()
+        self.n_samples = 0
+        self._t_first = None
+        self._t_last = None
+        self._last_wall_ns = 0
+
+    def anchor(self):
+        self.wall_offset_ns = time.time_ns() - time.perf_counter_ns()
+        self._next_anchor = time.perf_counter_ns() + int(self.anchor_interval * 1e9)
+
+    def read(self):
+        regs = self.transport.read_registers(self.start, self.count)
+        t_ns = time.perf_counter_ns()
+        if t_ns >= self._next_anchor:
+            self.anchor()
+        voltage, current, power = decode_registers(regs)
+        if self._t_first is None:
+            self._t_first = t_ns
+        self._t_last = t_ns
+        self.n_samples += 1
+        return t_ns, voltage, current, power
+
+    def wall_ns(self, t_ns):
+        # Wall-clock ns of a sample; kept strictly increasing across a re-anchor that
+        # steps the offset back
+        wall = max(t_ns + self.wall_offset_ns, self._last_wall_ns + 1)
+        self._last_wall_ns = wall
+        return wall
+
+    def to_wall(self, t_ns):
+        return (t_ns + self.wall_offset_ns) / 1e9
+
+    def sample_rate(self):
+        if self.n_samples < 2:
+            return 0.0
+        return (self.n_samples - 1) / ((self._t_last - self._t_first) / 1e9)
+
+    def reset_stats(self):
+        self.n_samples = 0
+        self._t_first = None
+        self._t_last = None
+
+
+class PZEMMeter(ThreadedMeter):
+    # PZEM adapter for the common meter API: ThreadedMeter's loop polls the sampler back to
+    # back (the Modbus round trip paces it) and backs off after read errors
+    name = "pzem"
+
+    def __init__(self, transport, ring=None, ring_capacity=1 << 20, cpu=None):
+        super().__init__(ring, ring_capacity, cpu)
+        self.sampler = PZEMSampler(transport)
+
+    def read(self):
+        t_ns, _, _, power = self.sampler.read()
+        return self.sampler.wall_ns(t_ns), power
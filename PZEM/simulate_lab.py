@@ -0,0 +1,93 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from argparse import Namespace
+from types import SimpleNamespace
+from multi_measure import run_lab
+from pzem_sampler import PtyPZEM, SimulatedPZEM
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from inference_server import InferenceServer, ModelCache
+
+# Stands up N simulated (board, meter) pairs on this machine and runs the parallel
+# sweep controller against them: each "board" is a localhost inference daemon whose
+# fake runs raise the power a pty-served PZEM reports, so the whole path (Modbus over
+# a serial port, daemon requests, sharding, merged results) runs without hardware.
+
+
+class _SkewedServer(InferenceServer):
+    # Reports time from a clock that is offset from (and drifts against) the host's
+    def handle_request_payload(self, payload):
+        reply = super().handle_request_payload(payload)
+        if "time_ns" in reply:
+            reply["time_ns"] = self.board_clock_ns(reply["time_ns"])
+        return reply
+
+
+class SimulatedBoard:
+    def __init__(self, name, idle=3.0, load=8.0, seconds_per_image=0.05, clock_offset=0.0, clock_drift_ppm=0.0):
+        self.name = name
+        self.busy = False
+        self.seconds_per_image = seconds_per_image
+        self.clock_offset = clock_offset
+        self.clock_drift_ppm = clock_drift_ppm
+        self._t0 = time.time_ns()
+        self.meter = PtyPZEM(SimulatedPZEM(lambda t: load if self.busy else idle, realtime=False))
+        cache = ModelCache(lambda args: SimpleNamespace(nbytes=0), max_bytes=1 << 30)
+        self.server = _SkewedServer(("127.0.0.1", 0), cache, lambda args: None, self._run,
+                                    Namespace(model=None, batch_size=1, backend="eager"))
+        self.server.board_clock_ns = self.board_clock_ns
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _run(self, model, inputs, args):
+        iterations = 20
+        self.busy = True
+        start = time.time()
+        time.sleep(iterations * args.batch_size * self.seconds_per_image / 4)
+        end = time.time()
+        self.busy = False
+        return {"start_time": self.board_clock_ns(int(start * 1e9)) / 1e9,
+                "end_time": self.board_clock_ns(int(end * 1e9)) / 1e9, "iterations": iterations}
+
+    def board_clock_ns(self, host_ns):
+        return host_ns + int(self.clock_offset * 1e9) + int((host_ns - self._t0) * self.clock_drift_ppm / 1e6)
+
+    def inventory_entry(self):
+        return {"name": self.name, "ip": "127.0.0.1", "username": "", "port": self.meter.port, "local": True,
+                "daemon_port": self.port, "baseline_duration": 1, "cooldown": 0.2}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.meter.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the parallel sweep against simulated boards")
+    parser.add_argument("--boards", type=int, default=2)
+    parser.add_argument("--compare", action="store_true", help="also run with one board to show the speed-up")
+    parser.add_argument("--clock-offset", type=float, default=0.0, help="board clock offset from the host (s)")
+    parser.add_argument("--clock-drift", type=float, default=0.0, help="board clock drift (ppm)")
+    args = parser.parse_args()
+
+    params = {"mode": [0, 1], "model": ["resnet18", "mobilenetv2_100"], "backend": ["eager"], "batch_size": [1, 2, 4]}
+    for n in ([1] if args.compare else []) + [args.boards]:
+        boards = [SimulatedBoard(f"sim{i}", clock_offset=args.clock_offset, clock_drift_ppm=args.clock_drift)
+                  for i in range(n)]
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            t0 = time.time()
+            counts = run_lab([b.inventory_entry() for b in boards], params, os.path.join(tmp, "store"),
+                             os.path.join(tmp, "results.csv"))
+            print(f"{n} board(s): {sum(counts.values())} combos in {time.time() - t0:.1f} s {counts}\n")
+            os.chdir(cwd)
+        for b in boards:
+            b.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import select
+import socket
+import subprocess
+import threading
+import time
+
+
+class SSHSession:
+    # One long-lived transport per host; every command gets its own channel on it.
+    def __init__(self, host, username, password=None, key_filepath=None, port=22, timeout=10,
+                 keepalive=30, retries=2, sock_factory=None):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.key_filepath = key_filepath
+        self.port = port
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.retries = retries
+        # Callable returning a new connected socket for every (re)connect, e.g. to an
+        # in-process paramiko server for testing; None lets paramiko dial host:port
+        self.sock_factory = sock_factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        try:
+            import paramiko
+        except ImportError:
+            raise RuntimeError("paramiko is required: run `pip install paramiko`")
+
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            sock = self.sock_factory() if self.sock_factory is not None else None
+            kwargs = dict(hostname=self.host, port=self.port, username=self.username, timeout=self.timeout, sock=sock)
+            if self.key_filepath:
+                kwargs["pkey"] = paramiko.RSAKey.from_private_key_file(self.key_filepath)
+            else:
+                kwargs["password"] = self.password
+            client.connect(**kwargs)
+            transport = client.get_transport()
+            if self.keepalive:
+                transport.set_keepalive(self.keepalive)
+            self._client = client
+        return self
+
+    def transport(self):
+        transport = self._client.get_transport() if self._client is not None else None
+        if transport is None or not transport.is_active():
+            self.connect()
+            transport = self._client.get_transport()
+        return transport
+
+    def open_channel(self, kind="session", dest_addr=None, src_addr=("127.0.0.1", 0)):
+        # Open a channel, re-establishing the transport once per retry if it has died
+        last_error = None
+        for attempt in range(self.retries + 1):
+            try:
+                transport = self.transport()
+                if kind == "session":
+                    return transport.open_session(timeout=self.timeout)
+                return transport.open_channel(kind, dest_addr=dest_addr, src_addr=src_addr, timeout=self.timeout)
+            except Exception as e:
+                # A refused channel on a healthy transport (e.g. nothing listening on a
+                # forwarded port) is not a connection problem; only rebuild dead transports
+                transport = self._client.get_transport() if self._client is not None else None
+                if transport is not None and transport.is_active():
+                    raise
+                last_error = e
+                self.close()
+                time.sleep(min(0.5 * 2 ** attempt, 5))
+        raise ConnectionError(f"Could not open SSH channel to {self.host}: {last_error}")
+
+    def run(self, command, use_sudo=False, on_stdout=None, on_stderr=None, timeout=None):
+        exec_cmd = command
+        get_pty = False
+        if use_sudo:
+            exec_cmd = "sudo -S -p '' " + command
+            get_pty = True
+
+        channel = self.open_channel()
+        try:
+            if get_pty:
+                channel.get_pty()
+            channel.exec_command(exec_cmd)
+
+            # If using sudo and a password is provided, send it via stdin (note: security risk)
+            if use_sudo and self.password:
+                try:
+                    channel.sendall((self.password + "\n").encode())
+                except Exception:
+                    pass
+
+            out_parts, err_parts = self._stream(channel, on_stdout, on_stderr, timeout)
+            exit_code = channel.recv_exit_status()
+        finally:
+            channel.close()
+        return "".join(out_parts), "".join(err_parts), exit_code
+
+    @staticmethod
+    def _stream(channel, on_stdout, on_stderr, timeout):
+        # The channel exposes a pipe that becomes readable on new data or close,
+        # so select() wakes as soon as output arrives instead of polling.
+        out_parts = []
+        err_parts = []
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            while channel.recv_ready():
+                data = channel.recv(32768).decode("utf-8", errors="ignore")
+                out_parts.append(data)
+                if on_stdout:
+                    on_stdout(data)
+            while channel.recv_stderr_ready():
+                edata = channel.recv_stderr(32768).decode("utf-8", errors="ignore")
+                err_parts.append(edata)
+                if on_stderr:
+                    on_stderr(edata)
+            if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                break
+            if channel.closed and channel.eof_received:
+                break
+            wait = 1.0
+            if deadline is not None:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    raise TimeoutError("SSH command timed out")
+                wait = min(wait, 1.0)
+            select.select([channel], [], [], wait)
+        return out_parts, err_parts
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class LocalSession:
+    # Same interface as SSHSession but runs on this machine, so a localhost "board"
+    # can stand in for a Jetson when testing the sweep controllers
+    def __init__(self, cwd=None):
+        self.host = "localhost"
+        self.cwd = cwd
+
+    def run(self, command, use_sudo=False, on_stdout=None, on_stderr=None, timeout=None):
+        # use_sudo is ignored: stand-in boards have no nvpmodel to switch
+        try:
+            proc = subprocess.run(["bash", "-c", command], cwd=self.cwd, capture_output=True, text=True,
+                                  timeout=timeout)
+        except subprocess.TimeoutExpired as e:
+            # The same exception as SSHSession.run, so callers handle both alike
+            raise TimeoutError("Local command timed out") from e
+        if on_stdout and proc.stdout:
+            on_stdout(proc.stdout)
+        if on_stderr and proc.stderr:
+            on_stderr(proc.stderr)
+        return proc.stdout, proc.stderr, proc.returncode
+
+    def open_channel(self, kind="session", dest_addr=None, src_addr=None):
+        if kind != "direct-tcpip":
+            raise ValueError("LocalSession only opens direct-tcpip channels")
+        return socket.create_connection(dest_addr)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(host, username, password=None, key_filepath=None, port=22, timeout=10):
+    key = (host, port, username)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = SSHSession(host, username, password=password, key_filepath=key_filepath, port=port, timeout=timeout)
+            _sessions[key] = session
+    return session
+
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
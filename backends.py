@@ -0,0 +1,133 @@
+import hashlib
+import os
+
+import numpy as np
+import torch
+
+# Inference backends selectable with --backend. Compiled artifacts are cached under
+# --cache-dir so later runs (and the resident server) load instead of rebuilding.
+BACKENDS = ["eager", "channels_last", "fp16", "channels_last_fp16", "torchscript", "compile", "onnxruntime"]
+# Backends whose artifact is specialised to the input shape
+SHAPE_SPECIALISED = {"torchscript", "onnxruntime"}
+
+
+def _is_fp16(backend):
+    return backend in ("fp16", "channels_last_fp16")
+
+
+def _is_channels_last(backend):
+    return backend in ("channels_last", "channels_last_fp16")
+
+
+def convert_inputs(inputs, backend):
+    if _is_channels_last(backend):
+        inputs = inputs.contiguous(memory_format=torch.channels_last)
+    if _is_fp16(backend):
+        inputs = inputs.half()
+    return inputs
+
+
+def artifact_key(model_name, backend, batch_size, device):
+    tag = f"{model_name}-{backend}-b{batch_size}-{device}-torch{torch.__version__}"
+    return f"{model_name}-{backend}-b{batch_size}-{hashlib.sha1(tag.encode()).hexdigest()[:10]}"
+
+
+class OrtModel:
+    # ONNX Runtime session behind the same call interface as an nn.Module
+    def __init__(self, path, device):
+        import onnxruntime as ort
+
+        available = ort.get_available_providers()
+        providers = []
+        if device == "cuda":
+            cache_dir = os.path.dirname(path)
+            if "TensorrtExecutionProvider" in available:
+                providers.append(("TensorrtExecutionProvider", {
+                    "trt_engine_cache_enable": True,
+                    "trt_engine_cache_path": cache_dir,
+                }))
+            if "CUDAExecutionProvider" in available:
+                providers.append("CUDAExecutionProvider")
+        providers.append("CPUExecutionProvider")
+        self.session = ort.InferenceSession(path, providers=providers)
+        self.providers = self.session.get_providers()
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_name = self.session.get_outputs()[0].name
+        self.on_gpu = self.providers[0] != "CPUExecutionProvider"
+        self.nbytes = os.path.getsize(path)
+        self._binding = None
+        self._bound_ptr = None
+
+    def eval(self):
+        return self
+
+    def __call__(self, inputs):
+        if not self.on_gpu:
+            return self.session.run([self.output_name], {self.input_name: inputs.cpu().numpy()})[0]
+        # Bind the CUDA tensor in place so timing excludes host<->device copies
+        if self._bound_ptr != inputs.data_ptr():
+            self._binding = self.session.io_binding()
+            self._binding.bind_input(self.input_name, "cuda", 0, np.float32, tuple(inputs.shape), inputs.data_ptr())
+            self._binding.bind_output(self.output_name, "cuda")
+            self._bound_ptr = inputs.data_ptr()
+        self.session.run_with_iobinding(self._binding)
+        return self._binding
+
+
+def _store(cache_dir, key, suffix, build):
+    # Build into a temporary name and move it into place, so an interrupted export
+    # never leaves a truncated artifact that later runs would load as a cache hit
+    path = os.path.join(cache_dir, key + suffix)
+    if os.path.isfile(path):
+        return path
+    tmp = os.path.join(cache_dir, f".{key}.{os.getpid()}{suffix}")
+    try:
+        build(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+def prepare(model, backend, example_inputs, device, cache_dir, key):
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}, expected one of {BACKENDS}")
+    if _is_fp16(backend) and device == "cpu":
+        # Many CPU kernels have no half-precision version or run far slower in it
+        raise ValueError(f"backend {backend!r} needs a GPU; use an fp32 backend on cpu")
+    os.makedirs(cache_dir, exist_ok=True)
+    model = model.eval()
+
+    if _is_channels_last(backend):
+        model = model.to(memory_format=torch.channels_last)
+    if _is_fp16(backend):
+        model = model.half()
+    if backend in ("eager", "channels_last", "fp16", "channels_last_fp16"):
+        return model
+
+    if backend == "torchscript":
+        def build(tmp):
+            with torch.no_grad():
+                scripted = torch.jit.freeze(torch.jit.trace(model, example_inputs))
+            torch.jit.save(scripted, tmp)
+        path = _store(cache_dir, key, ".pt", build)
+        return torch.jit.load(path, map_location=device).eval()
+
+    if backend == "compile":
+        # Inductor keeps its compiled kernels and FX graphs in an on-disk cache. Its
+        # config reads TORCHINDUCTOR_* once at import (torch is already imported here),
+        # so the FX graph cache is switched on through the config; the cache directory
+        # is only looked up when the first kernel is written.
+        import torch._inductor.config as inductor_config
+
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(cache_dir, "inductor"))
+        if hasattr(inductor_config, "fx_graph_cache"):
+            inductor_config.fx_graph_cache = True
+        return torch.compile(model)
+
+    def build(tmp):
+        torch.onnx.export(model, example_inputs, tmp, opset_version=17, input_names=["input"],
+                          output_names=["output"], do_constant_folding=True)
+    path = _store(cache_dir, key, ".onnx", build)
+    return OrtModel(path, device)
@@ -0,0 +1,79 @@
+import json
+import math
+import os
+import time
+
+
+def _stats(samples):
+    n = len(samples)
+    mean = sum(samples) / n
+    var = sum((x - mean) ** 2 for x in samples) / (n - 1) if n > 1 else 0.0
+    return mean, math.sqrt(var), n
+
+
+class BaselineCache:
+    # Idle-power baselines on disk, keyed by (device, meter, power mode).
+    # A cached entry is trusted after a short probe agrees with it; otherwise,
+    # or once the entry is older than `ttl` seconds, the full baseline is re-measured.
+    def __init__(self, path="baseline_cache.json", ttl=6 * 3600, probe_duration=1.5, z_threshold=3.0, rel_tol=0.02):
+        self.path = path
+        self.ttl = ttl
+        self.probe_duration = probe_duration
+        self.z_threshold = z_threshold
+        self.rel_tol = rel_tol
+        self._entries = {}
+        if os.path.isfile(path):
+            try:
+                with open(path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable baseline cache {path}: {e}")
+
+    @staticmethod
+    def key(device, meter, mode):
+        return f"{device}|{meter}|{mode}"
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry["timestamp"] > self.ttl:
+            return None
+        return entry
+
+    def put(self, key, samples):
+        mean, std, n = _stats(samples)
+        self._entries[key] = {"mean": mean, "std": std, "n": n, "timestamp": time.time()}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp, self.path)
+        return self._entries[key]
+
+    def drifted(self, entry, probe):
+        # Two-sample z-test between the probe and the cached baseline. Power samples
+        # are autocorrelated, so a significant but tiny shift is also required to
+        # exceed rel_tol before the baseline is considered stale.
+        mean, std, n = _stats(probe)
+        diff = abs(mean - entry["mean"])
+        if diff <= self.rel_tol * abs(entry["mean"]):
+            return False
+        se = math.sqrt(std ** 2 / n + entry["std"] ** 2 / entry["n"])
+        return se == 0 or diff / se > self.z_threshold
+
+    def baseline(self, key, sample_fn, duration=20):
+        # sample_fn(seconds) -> list of idle power samples.
+        # Returns (baseline mean, samples measured now, whether the cache was used); the
+        # mean is None when the meter returned no samples.
+        entry = self.get(key)
+        if entry is not None:
+            probe = sample_fn(self.probe_duration)
+            if not len(probe):
+                # A dead or disconnected meter: do not hand out a stale baseline unchecked
+                print("Baseline probe returned no samples")
+                return None, probe, False
+            if not self.drifted(entry, probe):
+                return entry["mean"], probe, True
+            print("Baseline drift detected, re-measuring")
+        samples = sample_fn(duration)
+        if not len(samples):
+            return None, samples, False
+        return self.put(key, samples)["mean"], samples, False
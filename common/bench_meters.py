@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import sys
+import time
+from urllib.request import urlopen
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from common.exporter import TelemetryExporter
+from common.meter import ReplayMeter, SquareWave, synthetic_trace
+
+# Benchmarks every meter adapter behind the common API against simulated devices
+# (register-level PZEM, fake FNB endpoint, synthetic jtop source, replayed trace),
+# so it runs in CI without hardware. --check fails on regressions against a saved run.
+# --exporter repeats every meter with the telemetry exporter attached and scraped.
+
+REGION_MARKS = 10000
+EXPORT_INTERVAL = 0.25
+
+
+def _import_from(subdir):
+    path = os.path.join(ROOT, subdir)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def make_pzem():
+    _import_from("PZEM")
+    from pzem_sampler import PZEMMeter, SimulatedPZEM
+    return PZEMMeter(SimulatedPZEM())
+
+
+def make_fnb():
+    _import_from("FNB")
+    from fnb_decode import FakeEndpoint
+    from FNB import FNBTool
+    return FNBTool(file_path=os.devnull, baseline_duration=0.2, endpoints=(FakeEndpoint(), FakeEndpoint()))
+
+
+def make_jtop():
+    _import_from("On_chip_Jetson")
+    from Jtop import JtopMeter
+    return JtopMeter(source=SquareWave())
+
+
+def make_replay():
+    return ReplayMeter(*synthetic_trace(duration=5.0, rate=1000.0))
+
+
+METERS = {"pzem": make_pzem, "fnb": make_fnb, "jtop": make_jtop, "replay": make_replay}
+
+
+def _out_of_process_cpu(meter):
+    # Meters that sample in a child process report its CPU themselves
+    return meter.cpu_time if meter.name == "jtop" else 0.0
+
+
+def _scrape(url, duration, period):
+    # Scrape like a Prometheus server would for `duration` seconds -> latencies (ms)
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        with urlopen(url, timeout=2) as response:
+            response.read()
+        latencies.append(1e3 * (time.perf_counter() - t0))
+        time.sleep(max(min(period, deadline - time.perf_counter()), 0))
+    return latencies
+
+
+def bench(meter, duration, exporter=False):
+    meter.open()
+    telemetry = None
+    try:
+        if exporter:
+            telemetry = TelemetryExporter(meter, interval=EXPORT_INTERVAL, http_port=0, http_host="127.0.0.1").start()
+        time.sleep(0.3)
+        cpu0 = time.process_time() + _out_of_process_cpu(meter)
+        t0 = time.perf_counter()
+        start_ns = meter.start_window("bench")
+        start_latency = time.perf_counter() - t0
+        scrapes = []
+        if telemetry is not None:
+            scrapes = _scrape(f"http://127.0.0.1:{telemetry.http_port}/metrics", duration, EXPORT_INTERVAL)
+        else:
+            time.sleep(duration)
+        t0 = time.perf_counter()
+        window = meter.stop_window()
+        stop_latency = time.perf_counter() - t0
+        cpu = time.process_time() + _out_of_process_cpu(meter) - cpu0
+        t_ns, _ = meter.trace(start_ns, int(window["end_time"] * 1e9))
+        dt = np.diff(t_ns) / 1e6
+        # Cost of marking one region (enter + exit) on the running sampler
+        region = meter.region("bench")
+        t0 = time.perf_counter()
+        for _ in range(REGION_MARKS):
+            with region:
+                pass
+        region_us = 1e6 * (time.perf_counter() - t0) / REGION_MARKS
+        export_cpu = telemetry.tick_seconds if telemetry is not None else 0.0
+    finally:
+        if telemetry is not None:
+            telemetry.stop()
+        meter.close()
+    span = window["end_time"] - start_ns / 1e9
+    return {
+        "samples": int(len(t_ns)),
+        "sample_rate": float((len(t_ns) - 1) / span) if len(t_ns) > 1 else 0.0,
+        "interval_ms": float(np.median(dt)) if len(dt) else 0.0,
+        "jitter_std_ms": float(dt.std()) if len(dt) else 0.0,
+        "jitter_p99_ms": float(np.percentile(np.abs(dt - np.median(dt)), 99)) if len(dt) else 0.0,
+        "cpu_percent": 100 * cpu / span,
+        "wakeups_per_s": float(window.get("sampler_wakeups_per_s", 0.0)),
+        "start_latency_ms": 1e3 * start_latency,
+        "stop_latency_ms": 1e3 * stop_latency,
+        "region_us": region_us,
+        "scrape_ms": float(np.median(scrapes)) if scrapes else 0.0,
+        "scrape_p99_ms": float(np.percentile(scrapes, 99)) if scrapes else 0.0,
+        "exporter_cpu_percent": 100 * export_cpu / span,
+    }
+
+
+# metric -> True if higher is better
+CHECKS = {"sample_rate": True, "cpu_percent": False, "start_latency_ms": False, "stop_latency_ms": False,
+          "region_us": False}
+
+
+def regressions(results, baseline, tolerance):
+    failed = []
+    for name, metrics in results.items():
+        ref = baseline.get(name)
+        if ref is None:
+            continue
+        for metric, higher_is_better in CHECKS.items():
+            if metric not in ref:
+                continue
+            value, expected = metrics[metric], ref[metric]
+            # Absolute slack so near-zero costs don't fail on noise; stop waits for the
+            # next sample, so its latency varies by up to one sample interval
+            slack = 0.5 + (ref["interval_ms"] if metric == "stop_latency_ms" else 0.0)
+            if higher_is_better and value < expected * (1 - tolerance):
+                failed.append(f"{name}.{metric}: {value:.3f} < {expected:.3f}")
+            elif not higher_is_better and value > expected * (1 + tolerance) + slack:
+                failed.append(f"{name}.{metric}: {value:.3f} > {expected:.3f}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark power meter adapters without devices")
+    parser.add_argument("--meters", nargs="+", default=list(METERS), choices=list(METERS))
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per measurement window")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--check", help="results file from a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--exporter", action="store_true", help="also run every meter with the exporter attached")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.meters:
+        for exporter in [False, True] if args.exporter else [False]:
+            try:
+                meter = METERS[name]()
+            except ImportError as e:
+                print(f"{name:>7}: skipped ({e})")
+                break
+            r = bench(meter, args.duration, exporter)
+            label = name + ("+exp" if exporter else "")
+            results[label] = r
+            print(f"{label:>10}: {r['sample_rate']:8.1f} Hz | interval {r['interval_ms']:7.3f} ms "
+                  f"(std {r['jitter_std_ms']:6.3f}, p99 dev {r['jitter_p99_ms']:6.3f}) | "
+                  f"CPU {r['cpu_percent']:5.1f}% ({r['wakeups_per_s']:6.0f} wakeups/s) | "
+                  f"start {r['start_latency_ms']:7.3f} ms | stop {r['stop_latency_ms']:7.3f} ms | "
+                  f"region {r['region_us']:5.2f} us"
+                  + (f" | scrape {r['scrape_ms']:6.3f} ms (p99 {r['scrape_p99_ms']:6.3f}), "
+                     f"exporter CPU {r['exporter_cpu_percent']:5.2f}%" if exporter else ""))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.check:
+        with open(args.check) as f:
+            failed = regressions(results, json.load(f), args.tolerance)
+        for line in failed:
+            print(f"REGRESSION {line}")
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import math
+import time
+
+import numpy as np
+
+# Host <-> board clock alignment. Remote timestamps (the board's time.time() around a
+# run) are compared with host-stamped power samples, so any offset between the two
+# wall clocks shifts the energy window. Each sync is a burst of timestamped round
+# trips: host t0, remote stamp, host t1. As in NTP's clock filter only the round trip
+# with the smallest delay is trusted; its offset (remote - midpoint) is wrong by at
+# most half that delay. Bursts taken over a sweep give offset and drift by weighted
+# least squares, and every correction carries its uncertainty.
+
+
+class ClockSync:
+    def __init__(self, min_span=10.0, max_drift_ppm=50.0, window=600.0):
+        # Drift is only fitted once the bursts span min_span seconds; until then the
+        # latest burst is used and drift is assumed to be within max_drift_ppm (a typical
+        # crystal). Only bursts from the last `window` seconds are fitted, so a drift
+        # that changes with temperature over a long sweep is followed.
+        self.min_span = min_span
+        self.max_drift_ppm = max_drift_ppm
+        self.window = window
+        self.bursts = []
+        self.fit = None
+
+    def burst(self, stamp, n=32):
+        # stamp() -> remote time in ns, taken while the host measures the round trip
+        best = None
+        for _ in range(n):
+            t0 = time.time_ns()
+            remote = stamp()
+            t1 = time.time_ns()
+            rtt = t1 - t0
+            if best is None or rtt < best[2]:
+                best = ((t0 + t1) // 2, remote - (t0 + t1) // 2, rtt)
+        self.add(*best)
+        return best
+
+    def add(self, host_ns, offset_ns, rtt_ns):
+        self.bursts.append((host_ns, offset_ns, rtt_ns))
+        self._fit()
+
+    def _fit(self):
+        latest = self.bursts[-1][0]
+        self.bursts = [b for b in self.bursts if latest - b[0] <= self.window * 1e9]
+        host = np.array([b[0] for b in self.bursts], dtype=np.float64)
+        offset = np.array([b[1] for b in self.bursts], dtype=np.float64)
+        half_rtt = np.array([b[2] for b in self.bursts], dtype=np.float64) / 2
+        ref = host[-1]
+        dt = (host - ref) / 1e9
+        # Each burst's offset is known to within half its round trip
+        w = 1.0 / np.maximum(half_rtt, 1e3) ** 2
+        if len(self.bursts) >= 3 and dt[-1] - dt[0] >= self.min_span:
+            a = np.stack([np.ones_like(dt), dt], 1)
+            cov = np.linalg.inv(a.T @ (a * w[:, None]))
+            intercept, slope = cov @ (a.T @ (w * offset))
+            residual = offset - (intercept + slope * dt)
+            # Scale by the scatter when it exceeds what the round trips explain
+            chi2 = float(np.sum(w * residual ** 2) / (len(dt) - 2))
+            cov = cov * max(chi2, 1.0)
+        else:
+            intercept = float(offset[-1])
+            slope = 0.0
+            cov = np.array([[half_rtt[-1] ** 2, 0.0], [0.0, (1e3 * self.max_drift_ppm) ** 2]])
+        self.fit = {"ref_ns": ref, "offset_ns": float(intercept), "drift": float(slope), "cov": cov,
+                    "min_half_rtt_ns": float(half_rtt.min())}
+
+    def offset_at(self, host_ns):
+        # Estimated (remote - host) in ns at a host time, and its uncertainty
+        if self.fit is None:
+            return 0.0, math.inf
+        fit = self.fit
+        dt = (host_ns - fit["ref_ns"]) / 1e9
+        offset = fit["offset_ns"] + fit["drift"] * dt
+        var = fit["cov"][0, 0] + 2 * dt * fit["cov"][0, 1] + dt * dt * fit["cov"][1, 1]
+        # Never claim better than the best round trip allows
+        return offset, max(math.sqrt(max(var, 0.0)), fit["min_half_rtt_ns"])
+
+    def to_host(self, remote_ns):
+        # Remote timestamp -> host clock; the drift term makes the difference between
+        # evaluating at remote or host time negligible
+        offset, _ = self.offset_at(remote_ns)
+        return int(remote_ns - offset)
+
+    def summary(self, host_ns=None):
+        offset, uncertainty = self.offset_at(time.time_ns() if host_ns is None else host_ns)
+        return {
+            "clock_offset_ms": float(offset / 1e6),
+            "clock_drift_ppm": 1e6 * self.fit["drift"] / 1e9 if self.fit else 0.0,
+            "clock_uncertainty_ms": float(uncertainty / 1e6),
+            "clock_bursts": len(self.bursts),
+        }
@@ -0,0 +1,90 @@
+import math
+from statistics import NormalDist
+
+
+class RunningStats:
+    # Welford's online mean/variance
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else float("inf")
+
+    def rel_half_width(self, confidence=0.95):
+        # Half-width of the confidence interval of the mean, relative to the mean
+        if self.n < 2 or self.mean == 0:
+            return float("inf")
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        return z * self.std / math.sqrt(self.n) / abs(self.mean)
+
+
+class WarmupDetector:
+    # Warmup is over once the mean latency of consecutive windows stops moving
+    def __init__(self, window=5, tolerance=0.05, min_iterations=3, max_iterations=100):
+        self.window = window
+        self.tolerance = tolerance
+        self.min_iterations = min_iterations
+        self.max_iterations = max_iterations
+        self._latencies = []
+
+    def add(self, latency):
+        self._latencies.append(latency)
+        return self.stable()
+
+    def stable(self):
+        n = len(self._latencies)
+        if n >= self.max_iterations:
+            return True
+        if n < max(self.min_iterations, 2 * self.window):
+            return False
+        prev = sum(self._latencies[-2 * self.window:-self.window]) / self.window
+        last = sum(self._latencies[-self.window:]) / self.window
+        return abs(last - prev) <= self.tolerance * prev
+
+    @property
+    def iterations(self):
+        return len(self._latencies)
+
+
+class ConvergenceMonitor:
+    # Stops a timed loop once every tracked quantity has a CI below rel_error,
+    # or when the iteration/time cap is hit.
+    def __init__(self, rel_error=0.01, confidence=0.95, min_iterations=20, max_iterations=500, max_time=None):
+        self.rel_error = rel_error
+        self.confidence = confidence
+        self.min_iterations = min_iterations
+        self.max_iterations = max_iterations
+        self.max_time = max_time
+        self.stats = {}
+
+    def add(self, **values):
+        for name, value in values.items():
+            self.stats.setdefault(name, RunningStats()).add(value)
+
+    def done(self, elapsed=None, iterations=None, required=()):
+        # iterations: timed iterations so far, when some quantities (e.g. energy per batch
+        # of iterations) get fewer samples than there are iterations. required: quantities
+        # that must have converged too, even before their first samples arrive; only the
+        # caps end the loop without them.
+        n = iterations if iterations is not None else min((s.n for s in self.stats.values()), default=0)
+        if n >= self.max_iterations:
+            return True
+        if self.max_time is not None and elapsed is not None and elapsed >= self.max_time:
+            return True
+        if n < self.min_iterations:
+            return False
+        if any(name not in self.stats or self.stats[name].n < 2 for name in required):
+            return False
+        return all(s.rel_half_width(self.confidence) <= self.rel_error for s in self.stats.values())
+
+    def summary(self):
+        return {name: (s.mean, s.rel_half_width(self.confidence)) for name, s in self.stats.items()}
@@ -0,0 +1,214 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from common.power_trace import energy_intervals
+
+# Live telemetry for a running meter: every `interval` one thread folds the samples the
+# ring gained since the last tick into min/max/mean, the cumulative energy counter and
+# per-region counters, and keeps the last `history` intervals in fixed arrays. Nothing
+# grows with run length and the sampler itself is untouched. Published as Prometheus
+# text on http://host:port/metrics (plus /history as JSON) and/or one UDP datagram of
+# the same lines per interval.
+
+
+class TelemetryExporter:
+    def __init__(self, meter, interval=1.0, history=300, http_port=None, http_host="0.0.0.0", udp=None, labels=None,
+                 baseline=None):
+        self.meter = meter
+        self.interval = interval
+        self.http_port = http_port
+        self.http_host = http_host
+        # udp: (host, port) that receives one datagram per interval
+        self.udp = udp
+        self.labels = {"meter": meter.name, **(labels or {})}
+        # Region energy is reported above this power; defaults to the meter's baseline
+        self.baseline = baseline
+        self.t = np.zeros(history, dtype=np.float64)
+        self.min = np.zeros(history, dtype=np.float32)
+        self.max = np.zeros(history, dtype=np.float32)
+        self.mean = np.zeros(history, dtype=np.float32)
+        self.n = np.zeros(history, dtype=np.int64)
+        self.ticks = 0
+        self.energy_j = 0.0
+        self.samples = 0
+        self.regions = {}
+        self.tick_seconds = 0.0
+        self._since = None
+        self._last = None
+        self._region_cutoff = time.time_ns()
+        self._server = None
+        self._sock = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._since = self.meter.ring.count
+        if self.http_port is not None:
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.startswith("/metrics"):
+                        body, kind = exporter.render().encode(), "text/plain; version=0.0.4"
+                    elif self.path.startswith("/history"):
+                        body, kind = json.dumps(exporter.history(), allow_nan=False).encode(), "application/json"
+                    else:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", kind)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer((self.http_host, self.http_port), Handler)
+            self._server.daemon_threads = True
+            self.http_port = self._server.server_address[1]
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        if self.udp is not None:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            t0 = time.thread_time()
+            try:
+                self.tick()
+                if self._sock is not None:
+                    self._sock.sendto(self.render(help=False).encode(), self.udp)
+            except Exception as e:
+                print(f"telemetry: {e}")
+            self.tick_seconds += time.thread_time() - t0
+
+    def tick(self):
+        ring = self.meter.ring
+        count = ring.count
+        t_ns, power = ring.view(since=self._since)
+        self._since = count
+        slot = self.ticks % len(self.t)
+        with self._lock:
+            self.t[slot] = time.time()
+            self.n[slot] = len(power)
+            if len(power):
+                self.min[slot] = power.min()
+                self.max[slot] = power.max()
+                self.mean[slot] = power.mean()
+                # Trapezoids within the new samples plus the one bridging from the last tick
+                energy = float(0.5 * np.dot(np.diff(t_ns), power[:-1] + power[1:])) / 1e9 if len(power) > 1 else 0.0
+                if self._last is not None:
+                    energy += 0.5 * (self._last[1] + float(power[0])) * (int(t_ns[0]) - self._last[0]) / 1e9
+                self._last = (int(t_ns[-1]), float(power[-1]))
+                self.energy_j += energy
+                self.samples += len(power)
+            else:
+                self.min[slot] = self.max[slot] = self.mean[slot] = np.nan
+            self.ticks += 1
+        self._tick_regions()
+
+    def _tick_regions(self):
+        # Regions that ended since the last tick and are covered by the trace
+        recorder = getattr(self.meter, "regions", None)
+        if recorder is None or not recorder.names:
+            return
+        cutoff = self.meter.latest_ns()
+        ended = (recorder.seq >= 0) & (recorder.end_ns > self._region_cutoff) & (recorder.end_ns <= cutoff)
+        idx = np.flatnonzero(ended & (recorder.end_ns >= recorder.start_ns))
+        self._region_cutoff = cutoff
+        if not len(idx):
+            return
+        start, end, ids = recorder.start_ns[idx], recorder.end_ns[idx], recorder.name_id[idx]
+        t_ns, power = self.meter.ring.window(int(start.min()) - 10 ** 9, cutoff)
+        baseline = self.baseline if self.baseline is not None else (self.meter.baseline_power or 0.0)
+        energy = energy_intervals(t_ns, power, start, end, baseline)
+        n_names = len(recorder.names)
+        count = np.bincount(ids, minlength=n_names)
+        seconds = np.bincount(ids, weights=(end - start) / 1e9, minlength=n_names)
+        joules = np.bincount(ids, weights=energy, minlength=n_names)
+        with self._lock:
+            for i in np.flatnonzero(count):
+                totals = self.regions.setdefault(recorder.names[i], [0, 0.0, 0.0])
+                totals[0] += int(count[i])
+                totals[1] += float(seconds[i])
+                totals[2] += float(joules[i])
+
+    def _labels(self, **extra):
+        labels = {**self.labels, **extra}
+        return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+    def render(self, help=True):
+        lines = []
+
+        def metric(name, kind, text, values):
+            if help:
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+            for labels, value in values:
+                lines.append(f"{name}{self._labels(**labels)} {value}")
+
+        with self._lock:
+            slot = (self.ticks - 1) % len(self.t)
+            last = self.ticks > 0 and self.n[slot] > 0
+            if last:
+                metric("power_watts", "gauge", "Power over the last interval",
+                       [({"stat": "min"}, float(self.min[slot])), ({"stat": "max"}, float(self.max[slot])),
+                        ({"stat": "mean"}, float(self.mean[slot]))])
+            metric("energy_joules_total", "counter", "Energy since the exporter started", [({}, self.energy_j)])
+            metric("power_samples_total", "counter", "Power samples aggregated", [({}, self.samples)])
+            if self.regions:
+                metric("region_count_total", "counter", "Finished regions",
+                       [({"region": name}, v[0]) for name, v in self.regions.items()])
+                metric("region_seconds_total", "counter", "Time spent in regions",
+                       [({"region": name}, v[1]) for name, v in self.regions.items()])
+                metric("region_energy_joules_total", "counter", "Energy above baseline in regions",
+                       [({"region": name}, v[2]) for name, v in self.regions.items()])
+        usage = self.meter.usage()
+        if usage:
+            metric("sampler_cpu_seconds_total", "counter", "CPU time of the meter's sampler",
+                   [({}, usage["cpu_time"])])
+        metric("exporter_cpu_seconds_total", "counter", "CPU time of the aggregation thread",
+               [({}, self.tick_seconds)])
+        return "\n".join(lines) + "\n"
+
+    def history(self):
+        # Downsampled trace: the last `history` intervals, oldest first. Intervals without
+        # samples have null min/max/mean (NaN is not valid JSON).
+        with self._lock:
+            n = min(self.ticks, len(self.t))
+            order = (np.arange(self.ticks - n, self.ticks)) % len(self.t)
+            empty = self.n[order] == 0
+
+            def values(a):
+                return [None if e else v for e, v in zip(empty, a[order].tolist())]
+            return {"time": self.t[order].tolist(), "min": values(self.min), "max": values(self.max),
+                    "mean": values(self.mean), "samples": self.n[order].tolist()}
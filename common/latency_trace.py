@@ -0,0 +1,102 @@
+import struct
+import time
+
+import numpy as np
+
+# Binary trace layout: header then (iterations + 1) little-endian int64 wall-clock ns
+# timestamps. Entry 0 is the start of the timed loop and entry i the completion of
+# iteration i, so they can be laid directly over a power trace on the same clock.
+TRACE_MAGIC = b"LTRC"
+TRACE_VERSION = 1
+_HEADER = struct.Struct("<4sHHII")  # magic, version, reserved, iterations, batch size
+
+
+class IterationTracer:
+    # Synchronised per-iteration completion times in a preallocated array: CUDA events
+    # on the GPU (resolved after the loop, so no sync inside it), perf_counter_ns on CPU.
+    def __init__(self, max_iterations, device="cpu"):
+        self.max_iterations = max_iterations
+        self.device = device
+        self.t_ns = np.zeros(max_iterations + 1, dtype=np.int64)
+        self.n = 0
+        self._anchor_ns = 0
+        self._start_ns = 0
+        self._events = None
+        if device == "cuda":
+            import torch
+            self._torch = torch
+            self._events = [torch.cuda.Event(enable_timing=True) for _ in range(max_iterations + 1)]
+
+    def start(self):
+        self.n = 0
+        if self._events is not None:
+            self._torch.cuda.synchronize()
+            self._events[0].record()
+            # The GPU is idle, so the start event completes as soon as it is recorded
+            self._torch.cuda.synchronize()
+            self._anchor_ns = time.time_ns()
+            self._start_ns = self._anchor_ns
+        else:
+            self._anchor_ns = time.time_ns() - time.perf_counter_ns()
+            self.t_ns[0] = time.perf_counter_ns()
+            self._start_ns = self._anchor_ns + int(self.t_ns[0])
+        return self.start_time
+
+    def mark(self):
+        self.n += 1
+        if self._events is not None:
+            self._events[self.n].record()
+        else:
+            self.t_ns[self.n] = time.perf_counter_ns()
+
+    def finish(self):
+        if self._events is not None:
+            self._torch.cuda.synchronize()
+            self.t_ns[0] = self._anchor_ns
+            start = self._events[0]
+            for i in range(1, self.n + 1):
+                self.t_ns[i] = self._anchor_ns + int(start.elapsed_time(self._events[i]) * 1e6)
+        else:
+            self.t_ns[:self.n + 1] += self._anchor_ns
+        return self.timestamps()
+
+    def timestamps(self):
+        return self.t_ns[:self.n + 1]
+
+    @property
+    def start_time(self):
+        return self._start_ns / 1e9
+
+    @property
+    def end_time(self):
+        return self.t_ns[self.n] / 1e9
+
+
+def latency_stats(t_ns, batch_size=1):
+    lat = np.diff(t_ns) / 1e9
+    if not len(lat):
+        return {}
+    p50, p90, p99 = np.percentile(lat, [50, 90, 99])
+    total = (t_ns[-1] - t_ns[0]) / 1e9
+    return {
+        "latency_mean": float(lat.mean()),
+        "latency_p50": float(p50),
+        "latency_p90": float(p90),
+        "latency_p99": float(p99),
+        "throughput": float(batch_size * len(lat) / total) if total > 0 else 0.0,
+    }
+
+
+def save_trace(path, t_ns, batch_size=1):
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, 0, len(t_ns) - 1, batch_size))
+        np.asarray(t_ns, dtype="<i8").tofile(f)
+
+
+def load_trace(path):
+    with open(path, "rb") as f:
+        magic, version, _, n, batch_size = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            raise ValueError(f"{path} is not a latency trace (v{TRACE_VERSION})")
+        t_ns = np.fromfile(f, dtype="<i8", count=n + 1)
+    return t_ns, batch_size
@@ -0,0 +1,230 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.power_trace import energy_intervals
+
+# Per-layer latency and energy. Forward pre/post hooks on the selected modules write
+# entry/exit times into a preallocated (iterations, layers, 2) buffer: perf_counter_ns
+# on CPU, CUDA events on the GPU (resolved after the run, so hooks never synchronise).
+# Both are mapped onto the wall clock, so the intervals can be laid over a power trace
+# and each layer's share of it averaged over many iterations.
+
+
+def select_modules(model, depth=None, leaf=False, types=None):
+    # depth: modules exactly that many levels below the root (e.g. 2 -> resnet "layer1.0",
+    # efficientnet "blocks.0"); leaf: modules without children; types: class names.
+    # A selected module that contains another selected one is dropped, so no time or
+    # energy is counted twice and the shares add up.
+    selected = []
+    for name, module in model.named_modules():
+        if not name:
+            continue
+        if types and type(module).__name__ not in types:
+            continue
+        if leaf and next(module.children(), None) is not None:
+            continue
+        if depth is not None and name.count(".") + 1 != depth:
+            continue
+        selected.append((name, module))
+    names = [name for name, _ in selected]
+    return [(name, module) for name, module in selected
+            if not any(other.startswith(name + ".") for other in names)]
+
+
+class LayerProfiler:
+    def __init__(self, modules, max_iterations, device="cpu"):
+        self.names = [name for name, _ in modules]
+        self.types = [type(module).__name__ for _, module in modules]
+        self.modules = [module for _, module in modules]
+        self.max_iterations = max_iterations
+        self.device = device
+        self.t_ns = np.zeros((max_iterations, len(modules), 2), dtype=np.int64)
+        self.n = 0
+        self._it = -1
+        self._handles = []
+        self._anchor_ns = 0
+        self._events = None
+        if device == "cuda":
+            import torch
+            self._torch = torch
+            self._events = [[[torch.cuda.Event(enable_timing=True) for _ in range(2)] for _ in modules]
+                            for _ in range(max_iterations)]
+            self._start_event = torch.cuda.Event(enable_timing=True)
+
+    def _hooks(self, i):
+        # Forward passes outside next_iteration() (warmup before the first call, or past
+        # max_iterations) are not recorded
+        t_ns = self.t_ns
+        events = self._events
+        clock = time.perf_counter_ns
+
+        if events is not None:
+            def pre(module, inputs):
+                if 0 <= self._it < self.max_iterations:
+                    events[self._it][i][0].record()
+
+            def post(module, inputs, output):
+                if 0 <= self._it < self.max_iterations:
+                    events[self._it][i][1].record()
+        else:
+            def pre(module, inputs):
+                if 0 <= self._it < self.max_iterations:
+                    t_ns[self._it, i, 0] = clock()
+
+            def post(module, inputs, output):
+                if 0 <= self._it < self.max_iterations:
+                    t_ns[self._it, i, 1] = clock()
+        return pre, post
+
+    def attach(self):
+        for i, module in enumerate(self.modules):
+            pre, post = self._hooks(i)
+            self._handles.append(module.register_forward_pre_hook(pre))
+            self._handles.append(module.register_forward_hook(post))
+        return self
+
+    def detach(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def start(self):
+        self.n = 0
+        self._it = -1
+        if self._events is not None:
+            self._torch.cuda.synchronize()
+            self._start_event.record()
+            self._torch.cuda.synchronize()
+            self._anchor_ns = time.time_ns()
+        else:
+            self._anchor_ns = time.time_ns() - time.perf_counter_ns()
+
+    def next_iteration(self):
+        # Call before each forward pass
+        self._it += 1
+        self.n = min(self._it + 1, self.max_iterations)
+
+    def finish(self):
+        # -> (iterations, layers, 2) wall-clock ns entry/exit times
+        t_ns = self.t_ns[:self.n]
+        if self._events is not None:
+            self._torch.cuda.synchronize()
+            start = self._start_event
+            for it in range(self.n):
+                for i in range(len(self.modules)):
+                    for k in range(2):
+                        t_ns[it, i, k] = self._anchor_ns + int(start.elapsed_time(self._events[it][i][k]) * 1e6)
+        else:
+            t_ns += self._anchor_ns
+        return t_ns
+
+
+def hook_overhead(model, inputs, profiler, iterations, sync):
+    # Mean per-iteration latency without and with the hooks attached
+    def timed(step):
+        sync()
+        t0 = time.perf_counter()
+        for _ in range(iterations):
+            step()
+            model(inputs)
+        sync()
+        return (time.perf_counter() - t0) / iterations
+
+    timed(lambda: None)
+    plain = timed(lambda: None)
+    profiler.attach()
+    profiler.start()
+    try:
+        hooked = timed(profiler.next_iteration)
+    finally:
+        profiler.detach()
+    calls = 2 * len(profiler.modules)
+    return {
+        "latency_plain_s": plain,
+        "latency_hooked_s": hooked,
+        "overhead_s": hooked - plain,
+        "overhead_percent": 100 * (hooked - plain) / plain if plain > 0 else 0.0,
+        "per_hook_us": 1e6 * (hooked - plain) / calls if calls else 0.0,
+    }
+
+
+def attribute(layer_ns, names, types=None, t_ns=None, power=None, baseline=0.0, skip=0):
+    # Per-layer table averaged over iterations[skip:]. With a power trace on the same
+    # clock, each layer gets the energy integrated over its own intervals.
+    layer_ns = layer_ns[skip:]
+    duration = (layer_ns[:, :, 1] - layer_ns[:, :, 0]) / 1e9
+    iteration = (layer_ns[:, :, 1].max(axis=1) - layer_ns[:, :, 0].min(axis=1)) / 1e9
+    rows = []
+    energy = None
+    if t_ns is not None and len(t_ns) > 1:
+        energy = energy_intervals(t_ns, power, layer_ns[:, :, 0], layer_ns[:, :, 1], baseline)
+    total_latency = float(duration.mean(axis=0).sum())
+    total_energy = float(energy.mean(axis=0).sum()) if energy is not None else 0.0
+    for i, name in enumerate(names):
+        row = {
+            "layer": name,
+            "type": types[i] if types else "",
+            "latency_ms": 1e3 * float(duration[:, i].mean()),
+            "latency_std_ms": 1e3 * float(duration[:, i].std()),
+            "latency_share": float(duration[:, i].mean()) / total_latency if total_latency > 0 else 0.0,
+        }
+        if energy is not None:
+            mean_energy = float(energy[:, i].mean())
+            row.update(energy_mj=1e3 * mean_energy,
+                       energy_share=mean_energy / total_energy if total_energy else 0.0,
+                       avg_power_w=mean_energy / row["latency_ms"] * 1e3 if row["latency_ms"] > 0 else 0.0)
+        rows.append(row)
+    return rows, {"iterations": len(layer_ns), "iteration_ms": 1e3 * float(iteration.mean()) if len(iteration) else 0.0,
+                  "layers_ms": 1e3 * total_latency, "layers_mj": 1e3 * total_energy}
+
+
+def print_table(rows, summary, top=None):
+    rows = sorted(rows, key=lambda r: r.get("energy_mj", r["latency_ms"]), reverse=True)[:top]
+    has_energy = rows and "energy_mj" in rows[0]
+    print(f"{'layer':<32} {'type':<20} {'ms':>9} {'%':>6}" + (f" {'mJ':>9} {'%':>6} {'W':>7}" if has_energy else ""))
+    for r in rows:
+        line = f"{r['layer'][:32]:<32} {r['type'][:20]:<20} {r['latency_ms']:9.4f} {100 * r['latency_share']:6.1f}"
+        if has_energy:
+            line += f" {r['energy_mj']:9.4f} {100 * r['energy_share']:6.1f} {r['avg_power_w']:7.2f}"
+        print(line)
+    print(f"{summary['iterations']} iterations, {summary['iteration_ms']:.3f} ms/iteration, "
+          f"{summary['layers_ms']:.3f} ms in profiled layers" +
+          (f", {summary['layers_mj']:.3f} mJ" if has_energy else ""))
+
+
+def save_profile(path, layer_ns, names, types, overhead=None):
+    np.savez_compressed(path, layer_ns=layer_ns, names=np.array(names), types=np.array(types),
+                        overhead=np.array(repr(overhead or {})))
+
+
+def load_profile(path):
+    with np.load(path) as data:
+        return data["layer_ns"], list(data["names"]), list(data["types"])
+
+
+def main():
+    # Offline attribution: a saved profile against a power recording from another meter
+    # (e.g. PowerMeter.save() on the host), both on the wall clock
+    from common.meter import load_recording
+
+    parser = argparse.ArgumentParser(description="Attribute a power recording to a saved layer profile")
+    parser.add_argument("profile", help="npz written by run_model_example.py --profile-layers --profile-out")
+    parser.add_argument("recording", help="power recording (npz, common.meter.save_recording)")
+    parser.add_argument("--baseline", type=float, default=0.0, help="idle power (W) to subtract")
+    parser.add_argument("--skip", type=int, default=0, help="ignore the first N iterations")
+    parser.add_argument("--top", type=int, default=None, help="only show the N most expensive layers")
+    args = parser.parse_args()
+
+    layer_ns, names, types = load_profile(args.profile)
+    t_ns, power = load_recording(args.recording)
+    rows, summary = attribute(layer_ns, names, types, t_ns, power, args.baseline, args.skip)
+    print_table(rows, summary, args.top)
+
+
+if __name__ == "__main__":
+    main()
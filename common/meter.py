@@ -0,0 +1,258 @@
+import threading
+import time
+
+import numpy as np
+
+from common.overhead import pin, usage_delta
+from common.power_trace import PowerRing
+from common.regions import RegionRecorder, summarize
+
+
+class PowerMeter:
+    # Common meter API: open() starts sampling into a PowerRing (ns timestamps on the
+    # time.time_ns clock, power in W), baseline() measures idle power, start_window()/
+    # stop_window() bracket a measurement and trace() returns the raw samples.
+    # Subclasses only have to get samples into self.ring, and may report the sampler's
+    # own cost through usage() so each window carries its observer overhead.
+    # region(name) marks nestable, thread-safe regions that region_energy() attributes
+    # from the trace afterwards, without starting or stopping anything.
+    name = "meter"
+
+    def __init__(self, ring=None, ring_capacity=1 << 20, region_capacity=1 << 16):
+        self.ring = ring if ring is not None else PowerRing(ring_capacity)
+        self.baseline_power = None
+        self.baseline_overhead = {}
+        self._window = None
+        self.regions = RegionRecorder(region_capacity)
+
+    def open(self):
+        return self
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def latest_ns(self):
+        count = self.ring.count
+        if count == 0:
+            return 0
+        t_ns, _ = self.ring.view(since=count - 1)
+        return int(t_ns[-1])
+
+    def usage(self):
+        # Cumulative sampler cpu_time / wakeups / memory_bytes, or None if not tracked
+        return None
+
+    def flush(self, until_ns, timeout=0.5):
+        # Wait until the trace extends past until_ns, so a window ending there is fully covered
+        deadline = time.monotonic() + timeout
+        while self.latest_ns() < until_ns and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def baseline_samples(self, duration):
+        start_ns = time.time_ns()
+        time.sleep(duration)
+        stop_ns = time.time_ns()
+        self.flush(stop_ns)
+        _, power = self.ring.window(start_ns, stop_ns)
+        return power.tolist()
+
+    def baseline(self, duration=20, cache=None, key=None):
+        # Mean of the idle samples, the same statistic the cache stores, so a board gets
+        # the same baseline with or without one. No samples at all (a dead or unplugged
+        # meter) is an error rather than a zero or stale baseline.
+        usage0, t0 = self.usage(), time.perf_counter()
+        if cache is not None:
+            power, _, _ = cache.baseline(key, self.baseline_samples, duration)
+        else:
+            samples = self.baseline_samples(duration)
+            power = float(np.mean(samples)) if len(samples) else None
+        if power is None:
+            raise RuntimeError(f"{self.name}: no samples while measuring the baseline")
+        self.baseline_power = power
+        self.baseline_overhead = usage_delta(usage0, self.usage(), time.perf_counter() - t0)
+        return self.baseline_power
+
+    def start_window(self, name=""):
+        self._window = (name, time.time_ns(), self.usage(), time.perf_counter())
+        return self._window[1]
+
+    def stop_window(self, n_inferences=1):
+        stop_ns = time.time_ns()
+        usage1, t1 = self.usage(), time.perf_counter()
+        name, start_ns, usage0, t0 = self._window
+        self._window = None
+        result = self.energy(start_ns, stop_ns, n_inferences=n_inferences)
+        result.update(name=name, start_time=start_ns / 1e9, end_time=stop_ns / 1e9)
+        result.update(usage_delta(usage0, usage1, t1 - t0))
+        return result
+
+    def region(self, name):
+        # with meter.region("preprocess"): ...   or   @meter.region("request")
+        return self.regions.region(name)
+
+    def region_energy(self, baseline=None, split=False):
+        # -> (per-region arrays, per-name summary rows) for every finished region the
+        # ring still covers
+        self.flush(time.time_ns())
+        if baseline is None:
+            baseline = self.baseline_power or 0.0
+        t_ns, power = self.trace()
+        regions = self.regions.attribute(t_ns, power, baseline=baseline, split=split)
+        return regions, summarize(regions, self.regions.names)
+
+    def energy(self, start_ns, stop_ns, n_inferences=1, baseline=None, rule="trapezoid"):
+        self.flush(stop_ns)
+        if baseline is None:
+            baseline = self.baseline_power or 0.0
+        return self.ring.energy(start_ns, stop_ns, baseline=baseline, n_inferences=n_inferences, rule=rule)
+
+    def trace(self, start_ns=None, stop_ns=None):
+        if start_ns is None:
+            return self.ring.view()
+        return self.ring.window(start_ns, stop_ns if stop_ns is not None else time.time_ns())
+
+    def save(self, path, start_ns=None, stop_ns=None, **meta):
+        t_ns, power = self.trace(start_ns, stop_ns)
+        save_recording(path, t_ns, power, meter=self.name, **meta)
+
+
+class ThreadedMeter(PowerMeter):
+    # Meter whose samples come from a blocking read() polled on a background thread.
+    # read() returns (t_ns, watts) as scalars or as equal-length arrays. cpu pins the
+    # sampler thread to one core (Linux). A failing read() is retried after an
+    # exponential backoff from error_backoff up to max_error_backoff seconds.
+    def __init__(self, ring=None, ring_capacity=1 << 20, cpu=None, error_backoff=0.01, max_error_backoff=1.0):
+        super().__init__(ring, ring_capacity)
+        self.cpu = cpu
+        self.error_backoff = error_backoff
+        self.max_error_backoff = max_error_backoff
+        self.n_errors = 0
+        self.last_error = None
+        self.n_reads = 0
+        self.cpu_time = 0.0
+        self._alive = False
+        self._thread = None
+
+    def read(self):
+        raise NotImplementedError
+
+    def open(self):
+        if self._thread is None:
+            self._alive = True
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._alive = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def usage(self):
+        # Every read() is one wakeup of the sampler thread; its memory is the ring
+        return {"cpu_time": self.cpu_time, "wakeups": self.n_reads, "memory_bytes": self.ring.nbytes(self.ring.capacity),
+                "errors": self.n_errors}
+
+    def _loop(self):
+        pin(self.cpu, threading.get_native_id())
+        cpu0 = time.thread_time()
+        streak = 0
+        while self._alive:
+            self.n_reads += 1
+            try:
+                t_ns, power = self.read()
+            except Exception as e:
+                self.n_errors += 1
+                self.last_error = e
+                streak += 1
+                if self.n_errors <= 10:
+                    print(f"{self.name}: sampling error: {e}")
+                # A dead device must not spin the sampler thread
+                time.sleep(min(self.error_backoff * 2 ** min(streak - 1, 30), self.max_error_backoff))
+                self.cpu_time = time.thread_time() - cpu0
+                continue
+            streak = 0
+            if np.ndim(t_ns):
+                if len(t_ns):
+                    self.ring.extend(t_ns, power)
+            else:
+                self.ring.append(t_ns, power)
+            # Sampler thread's own CPU, for overhead reporting
+            self.cpu_time = time.thread_time() - cpu0
+
+
+def save_recording(path, t_ns, power, **meta):
+    np.savez_compressed(path, t_ns=np.asarray(t_ns, dtype=np.int64), power=np.asarray(power, dtype=np.float32),
+                        meta=np.array(repr(meta)))
+
+
+def load_recording(path):
+    with np.load(path) as data:
+        return data["t_ns"], data["power"]
+
+
+class ReplayMeter(ThreadedMeter):
+    # Plays a recorded trace back as a live meter. Sample spacing is kept (divided by
+    # `speed`; speed=0 emits as fast as possible) and timestamps are rebased to now,
+    # so windows and baselines behave exactly as against the original device.
+    name = "replay"
+
+    def __init__(self, t_ns, power=None, speed=1.0, loop=True, ring=None, ring_capacity=1 << 20):
+        super().__init__(ring, ring_capacity)
+        if power is None:
+            t_ns, power = load_recording(t_ns)
+        self.src_t = np.asarray(t_ns, dtype=np.int64) - int(t_ns[0])
+        self.src_p = np.asarray(power, dtype=np.float32)
+        self.speed = speed
+        self.loop = loop
+        self._i = 0
+        self._offset = 0
+        self._t0 = None
+
+    def read(self):
+        if self._t0 is None:
+            self._t0 = time.time_ns()
+        if self._i >= len(self.src_t):
+            if not self.loop:
+                self._alive = False
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            # Continue one mean sample period after the last sample
+            period = self.src_t[-1] // max(len(self.src_t) - 1, 1)
+            self._offset += int(self.src_t[-1]) + int(period)
+            self._i = 0
+        src = self._offset + int(self.src_t[self._i])
+        power = float(self.src_p[self._i])
+        self._i += 1
+        if self.speed:
+            due = self._t0 + int(src / self.speed)
+            wait = due - time.time_ns()
+            if wait > 0:
+                time.sleep(wait / 1e9)
+            return due, power
+        return time.time_ns(), power
+
+
+def synthetic_trace(duration=10.0, rate=100.0, idle=2.0, load=6.0, period=1.0, noise=0.05, seed=0):
+    # Square-wave load with noise, for exercising meters and analyses without a device
+    rng = np.random.default_rng(seed)
+    t = np.arange(0, duration, 1 / rate)
+    power = np.where((t % period) < period / 2, load, idle) + rng.normal(0, noise, len(t))
+    return (t * 1e9).astype(np.int64), power.astype(np.float32)
+
+
+class SquareWave:
+    # Picklable power source (seconds -> W) for meters that sample in another process
+    def __init__(self, idle=2.0, load=6.0, period=1.0):
+        self.idle = idle
+        self.load = load
+        self.period = period
+
+    def __call__(self, t):
+        return self.load if (t % self.period) < self.period / 2 else self.idle
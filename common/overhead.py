@@ -0,0 +1,73 @@
+import os
+
+# Observer-overhead accounting for samplers running on the device under test: their
+# CPU time, wakeups and memory are part of the measured power, so every result
+# carries the sampler's own cost over the same window.
+
+
+def proc_usage(pid, tid=None):
+    # Cumulative CPU seconds, context switches (wakeups) and RSS of a process, or of
+    # one of its threads, from /proc. None where /proc is unavailable.
+    base = f"/proc/{pid}" if tid is None else f"/proc/{pid}/task/{tid}"
+    try:
+        with open(f"{base}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"{base}/status") as f:
+            status = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None
+    wakeups = int(status.get("voluntary_ctxt_switches", 0)) + int(status.get("nonvoluntary_ctxt_switches", 0))
+    rss_kb = int(status.get("VmRSS", "0 kB").split()[0])
+    return {
+        "cpu_time": (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"),
+        "wakeups": wakeups,
+        "memory_bytes": rss_kb * 1024,
+    }
+
+
+def usage_delta(before, after, elapsed):
+    if before is None or after is None or elapsed <= 0:
+        return {}
+    cpu = after["cpu_time"] - before["cpu_time"]
+    wakeups = after["wakeups"] - before["wakeups"]
+    delta = {
+        "sampler_cpu_s": cpu,
+        "sampler_cpu_percent": 100 * cpu / elapsed,
+        "sampler_wakeups": wakeups,
+        "sampler_wakeups_per_s": wakeups / elapsed,
+        "sampler_memory_mb": after["memory_bytes"] / 2**20,
+    }
+    if "errors" in before and "errors" in after:
+        # Failed reads in the window: its samples may have gaps
+        delta["sampler_errors"] = after["errors"] - before["errors"]
+    return delta
+
+
+def pin(cpu, tid=0):
+    # Pin a process (tid=0: the caller) or Linux thread to one core, ideally one
+    # isolated from the workload (isolcpus). Returns False where unsupported.
+    if cpu is None or not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(tid, {cpu})
+    except OSError as e:
+        print(f"Could not pin sampler to CPU {cpu}: {e}")
+        return False
+    return True
+
+
+class AdaptiveInterval:
+    # Polling interval that backs off while the source returns the same value (jtop
+    # only refreshes its stats at its own rate) and tightens again when it changes.
+    def __init__(self, min_interval, max_interval, backoff=1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+
+    def next(self, changed):
+        if changed:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        return self.interval
@@ -0,0 +1,229 @@
+import json
+import math
+from itertools import product
+
+import numpy as np
+
+# Adaptive search for the energy/latency Pareto front of every model over the other
+# parameters (batch size, power mode, backend). Each model starts from a few spread-out
+# seed points; after that a small Gaussian-process surrogate per objective (log energy,
+# log latency) predicts the unmeasured points and the one with the largest expected
+# hypervolume improvement of the current front is measured next. A model is finished
+# once its front has not changed for `patience` measurements and no point is expected
+# to improve it by more than `min_improvement` of its hypervolume.
+
+
+def pareto_front(points):
+    # Indices of the non-dominated (minimise, minimise) points, by the first objective
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    order = np.lexsort((points[:, 1], points[:, 0]))
+    front = []
+    best = math.inf
+    for i in order:
+        if points[i, 1] < best:
+            front.append(int(i))
+            best = points[i, 1]
+    return front
+
+
+def hypervolume(front, ref):
+    # Area dominated by a front (sorted by the first objective) up to the reference point
+    area = 0.0
+    prev_y = ref[1]
+    for x, y in front:
+        if x < ref[0] and y < prev_y:
+            area += (ref[0] - x) * (prev_y - y)
+            prev_y = y
+    return area
+
+
+def hv_improvement(front, ref, samples):
+    # Hypervolume each sample point (S, 2) would add to a sorted front, all at once: the
+    # front is a staircase, so the gain is a sum over its steps of width x height
+    front = np.asarray(front, dtype=np.float64).reshape(-1, 2)
+    lefts = np.concatenate(([-np.inf], front[:, 0]))
+    rights = np.concatenate((front[:, 0], [ref[0]]))
+    levels = np.concatenate(([ref[1]], front[:, 1]))
+    x = samples[:, :1]
+    y = samples[:, 1:]
+    width = np.clip(np.minimum(rights, ref[0]) - np.maximum(lefts, x), 0, None)
+    height = np.clip(levels - y, 0, None)
+    return (width * height).sum(axis=1)
+
+
+def log_objectives(y, floor=1e-3):
+    # Log of (energy, latency) for the surrogates. Net energy of a short run can sit at or
+    # below the baseline noise (zero or negative); it is floored at `floor` of the largest
+    # positive value of its objective, so it ranks as the cheapest without turning into
+    # -inf/NaN or stretching the log scale.
+    y = np.array(y, dtype=np.float64)
+    for j in range(y.shape[1]):
+        positive = y[:, j][y[:, j] > 0]
+        y[:, j] = np.maximum(y[:, j], floor * positive.max() if len(positive) else 1e-12)
+    return np.log(y)
+
+
+class GaussianProcess:
+    # Exact GP regression with an RBF kernel on standardised targets; the length scale is
+    # picked from a short grid by marginal likelihood
+    def __init__(self, noise=1e-2, length_scales=(0.25, 0.5, 1.0, 2.0)):
+        self.noise = noise
+        self.length_scales = length_scales
+
+    @staticmethod
+    def _kernel(a, b, length):
+        d2 = ((a[:, None, :] - b[None, :, :]) ** 2).sum(-1)
+        return np.exp(-0.5 * d2 / length ** 2)
+
+    def fit(self, x, y):
+        self.x = x
+        self.mean = float(y.mean())
+        self.scale = float(y.std()) or 1.0
+        z = (y - self.mean) / self.scale
+        best = None
+        for length in self.length_scales:
+            k = self._kernel(x, x, length) + self.noise * np.eye(len(x))
+            try:
+                chol = np.linalg.cholesky(k)
+            except np.linalg.LinAlgError:
+                continue
+            alpha = np.linalg.solve(chol.T, np.linalg.solve(chol, z))
+            nll = 0.5 * z @ alpha + np.log(np.diag(chol)).sum()
+            if best is None or nll < best[0]:
+                best = (nll, length, chol, alpha)
+        _, self.length, self._chol, self._alpha = best
+        return self
+
+    def predict(self, x):
+        ks = self._kernel(x, self.x, self.length)
+        mu = ks @ self._alpha
+        v = np.linalg.solve(self._chol, ks.T)
+        var = np.clip(1.0 + self.noise - (v * v).sum(0), 1e-12, None)
+        return self.mean + self.scale * mu, self.scale * np.sqrt(var)
+
+
+class ParetoSearch:
+    # params: name -> values, as for Sweep. `group` is the parameter with a front of its
+    # own (the model); the others span the search space. Objectives are minimised.
+    def __init__(self, params, group="model", numeric=("batch_size",), seeds=4, patience=3, min_improvement=0.01,
+                 max_evals=None, n_samples=256, seed=0):
+        self.params = params
+        self.group = group
+        self.numeric = numeric
+        self.space = [name for name in params if name != group]
+        self.seeds = seeds
+        self.patience = patience
+        self.min_improvement = min_improvement
+        self.max_evals = max_evals
+        self.n_samples = n_samples
+        self.rng = np.random.default_rng(seed)
+        self.candidates = {g: [dict(zip(self.space, values), **{group: g})
+                               for values in product(*(params[name] for name in self.space))]
+                           for g in params[group]}
+        self.observed = {g: {} for g in params[group]}
+        self.failed = {g: set() for g in params[group]}
+        self.stable = {g: 0 for g in params[group]}
+        self.best_gain = {g: math.inf for g in params[group]}
+        self.done = {g: False for g in params[group]}
+
+    @staticmethod
+    def key(combo):
+        return json.dumps(combo, sort_keys=True)
+
+    def encode(self, combo):
+        # Numeric parameters on a log scale normalised to [0, 1], anything else (power
+        # mode ids, backends) one-hot
+        features = []
+        for name in self.space:
+            values = self.params[name]
+            if name in self.numeric:
+                lo, hi = math.log(min(values)), math.log(max(values))
+                features.append((math.log(combo[name]) - lo) / ((hi - lo) or 1.0))
+            else:
+                features.extend(1.0 if combo[name] == v else 0.0 for v in values)
+        return features
+
+    def _pending(self, g):
+        seen = set(self.observed[g]) | self.failed[g]
+        return [c for c in self.candidates[g] if self.key(c) not in seen]
+
+    def _seed_point(self, g, pending, taken):
+        # Greedy maximin over the encoded space, starting from the first combo
+        chosen = [self.encode(c) for c, _, _ in self.observed[g].values()] + [self.encode(c) for c in taken]
+        if not chosen:
+            return pending[0]
+        x = np.array([self.encode(c) for c in pending])
+        d = ((x[:, None, :] - np.array(chosen)[None, :, :]) ** 2).sum(-1).min(1)
+        return pending[int(np.argmax(d))]
+
+    def front(self, g):
+        # [(combo, energy, latency)] of the current front, by energy
+        items = list(self.observed[g].values())
+        if not items:
+            return []
+        return [items[i] for i in pareto_front([(e, l) for _, e, l in items])]
+
+    def _expected_gain(self, g, pending):
+        items = list(self.observed[g].values())
+        x = np.array([self.encode(c) for c, _, _ in items])
+        y = log_objectives(np.array([(e, l) for _, e, l in items], dtype=np.float64))
+        xs = np.array([self.encode(c) for c in pending])
+        mu, sd = zip(*(GaussianProcess().fit(x, y[:, j]).predict(xs) for j in range(2)))
+        front = y[pareto_front(y)]
+        span = y.max(0) - y.min(0)
+        ref = y.max(0) + 0.1 * np.where(span > 0, span, 1.0)
+        hv = hypervolume(front, ref)
+        z = self.rng.standard_normal((self.n_samples, 2))
+        gains = np.array([hv_improvement(front, ref, np.stack([mu[0][i] + sd[0][i] * z[:, 0],
+                                                               mu[1][i] + sd[1][i] * z[:, 1]], 1)).mean()
+                          for i in range(len(pending))])
+        return gains, hv
+
+    def suggest(self, per_group=1):
+        # Next combos to measure, at most per_group for every unfinished model
+        batch = []
+        for g in self.candidates:
+            if self.done[g]:
+                continue
+            taken = []
+            for _ in range(per_group):
+                pending = [c for c in self._pending(g) if c not in taken]
+                if not pending:
+                    break
+                if len(self.observed[g]) + len(taken) < max(self.seeds, 2):
+                    taken.append(self._seed_point(g, pending, taken))
+                    continue
+                if len(self.observed[g]) < 2:
+                    break
+                gains, hv = self._expected_gain(g, pending)
+                self.best_gain[g] = float(gains.max()) / hv if hv > 0 else math.inf
+                if self.stable[g] >= self.patience and self.best_gain[g] < self.min_improvement:
+                    self.done[g] = True
+                    break
+                taken.append(pending[int(np.argmax(gains))])
+            if not taken:
+                self.done[g] = True
+            batch.extend(taken)
+        return batch
+
+    def observe(self, combo, energy, latency):
+        g = combo[self.group]
+        before = {self.key(c) for c, _, _ in self.front(g)}
+        self.observed[g][self.key(combo)] = (dict(combo), energy, latency)
+        after = {self.key(c) for c, _, _ in self.front(g)}
+        self.stable[g] = self.stable[g] + 1 if after == before else 0
+        if self.max_evals is not None and len(self.observed[g]) >= self.max_evals:
+            self.done[g] = True
+
+    def observe_failure(self, combo):
+        self.failed[combo[self.group]].add(self.key(combo))
+
+    @property
+    def finished(self):
+        return all(self.done.values())
+
+    def evaluations(self):
+        return sum(len(o) for o in self.observed.values())
+
+    def grid_size(self):
+        return sum(len(c) for c in self.candidates.values())
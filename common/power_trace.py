@@ -0,0 +1,189 @@
+import threading
+
+import numpy as np
+
+
+class PowerRing:
+    # Fixed-capacity trace of (int64 ns timestamp, float32 watts) samples.
+    # Every sample is written twice, at slot and slot + capacity, so the most
+    # recent `capacity` samples are always one contiguous, zero-copy view.
+    # Pass `buffer` (e.g. SharedMemory.buf of nbytes(capacity)) to place the
+    # ring, including its write counter, in memory shared with another process.
+    def __init__(self, capacity=1 << 20, buffer=None):
+        self.capacity = capacity
+        if buffer is None:
+            buffer = bytearray(self.nbytes(capacity))
+        self._header = np.ndarray(1, dtype=np.int64, buffer=buffer, offset=0)
+        self.t_ns = np.ndarray(2 * capacity, dtype=np.int64, buffer=buffer, offset=8)
+        self.power = np.ndarray(2 * capacity, dtype=np.float32, buffer=buffer, offset=8 + 16 * capacity)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def nbytes(capacity):
+        return 8 + 2 * capacity * (8 + 4)
+
+    @property
+    def count(self):
+        return int(self._header[0])
+
+    @count.setter
+    def count(self, value):
+        self._header[0] = value
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, t_ns, power):
+        with self._lock:
+            slot = self.count % self.capacity
+            self.t_ns[slot] = self.t_ns[slot + self.capacity] = t_ns
+            self.power[slot] = self.power[slot + self.capacity] = power
+            # Counter is published last so a reader never sees an unwritten slot
+            self.count += 1
+
+    def extend(self, t_ns, power):
+        t_ns = np.asarray(t_ns, dtype=np.int64)[-self.capacity:]
+        power = np.asarray(power, dtype=np.float32)[-self.capacity:]
+        with self._lock:
+            n = len(t_ns)
+            slots = (self.count + np.arange(n)) % self.capacity
+            self.t_ns[slots] = self.t_ns[slots + self.capacity] = t_ns
+            self.power[slots] = self.power[slots + self.capacity] = power
+            self.count += n
+
+    def clear(self):
+        with self._lock:
+            self.count = 0
+
+    def view(self, since=None):
+        # Chronological views of everything currently held (valid until overwritten),
+        # or only of the samples written after the counter value `since`
+        count = self.count
+        if since is not None:
+            n = min(count - since, self.capacity)
+            end = count % self.capacity + self.capacity
+            return self.t_ns[end - n:end], self.power[end - n:end]
+        end = count % self.capacity + self.capacity
+        start = end - min(count, self.capacity)
+        return self.t_ns[start:end], self.power[start:end]
+
+    def window(self, t0_ns, t1_ns):
+        t_ns, power = self.view()
+        i0 = np.searchsorted(t_ns, t0_ns, side="left")
+        i1 = np.searchsorted(t_ns, t1_ns, side="right")
+        return t_ns[i0:i1], power[i0:i1]
+
+    def energy(self, t0_ns, t1_ns, baseline=0.0, n_inferences=1, rule="trapezoid"):
+        t_ns, power = self.view()
+        return window_energy(t_ns, power, t0_ns, t1_ns, baseline=baseline, n_inferences=n_inferences, rule=rule)
+
+
+def _trapezoid(t_s, power):
+    if len(t_s) < 2:
+        return 0.0
+    return float(0.5 * np.dot(np.diff(t_s), power[:-1] + power[1:]))
+
+
+def _simpson(t_s, power):
+    # Composite Simpson for unevenly spaced samples; an odd trailing interval
+    # falls back to a trapezoid, as does any pair containing a zero-width step.
+    n_int = len(t_s) - 1
+    if n_int < 2:
+        return _trapezoid(t_s, power)
+    h = np.diff(t_s)
+    m = n_int - n_int % 2
+    h0 = h[0:m:2]
+    h1 = h[1:m:2]
+    if not (np.all(h0 > 0) and np.all(h1 > 0)):
+        return _trapezoid(t_s, power)
+    y0 = power[0:m:2]
+    y1 = power[1:m:2]
+    y2 = power[2:m + 1:2]
+    hs = h0 + h1
+    total = np.sum(hs / 6 * ((2 - h1 / h0) * y0 + hs * hs / (h0 * h1) * y1 + (2 - h0 / h1) * y2))
+    if m < n_int:
+        total += 0.5 * h[-1] * (power[-2] + power[-1])
+    return float(total)
+
+
+def _interp(t_ns, power, i, t):
+    # Power at time t on the segment between samples i - 1 and i
+    ta, tb = t_ns[i - 1], t_ns[i]
+    if tb == ta:
+        return float(power[i])
+    return float(power[i - 1] + (power[i] - power[i - 1]) * (t - ta) / (tb - ta))
+
+
+def window_energy(t_ns, power, t0_ns, t1_ns, baseline=0.0, n_inferences=1, rule="trapezoid"):
+    # Energy in joules over [t0_ns, t1_ns] of a sorted trace. The window edges are
+    # interpolated from the neighbouring samples, the baseline is removed over the
+    # exact window length and the result is normalised per inference; only the
+    # in-window slice is touched and no sample is copied into Python objects.
+    n = len(t_ns)
+    i0 = int(np.searchsorted(t_ns, t0_ns, side="left"))
+    i1 = int(np.searchsorted(t_ns, t1_ns, side="right"))
+    duration = (t1_ns - t0_ns) / 1e9
+    result = {
+        "samples": i1 - i0,
+        "duration": duration,
+        "gross_energy_j": 0.0,
+        "energy_j": 0.0,
+        "avg_power": 0.0,
+    }
+    if i1 - i0 < 1 or duration <= 0:
+        return result
+
+    t_win = t_ns[i0:i1]
+    p_win = power[i0:i1]
+    t_s = (t_win - t_win[0]) / 1e9
+    integrate = _simpson if rule == "simpson" else _trapezoid
+    gross = integrate(t_s, p_win)
+
+    first, last = float(p_win[0]), float(p_win[-1])
+    if i0 > 0:
+        p_edge = _interp(t_ns, power, i0, t0_ns)
+        gross += 0.5 * (p_edge + first) * (t_win[0] - t0_ns) / 1e9
+    else:
+        gross += first * (t_win[0] - t0_ns) / 1e9
+    if i1 < n:
+        p_edge = _interp(t_ns, power, i1, t1_ns)
+        gross += 0.5 * (last + p_edge) * (t1_ns - t_win[-1]) / 1e9
+    else:
+        gross += last * (t1_ns - t_win[-1]) / 1e9
+
+    result["gross_energy_j"] = float(gross)
+    result["avg_power"] = float(gross / duration)
+    result["energy_j"] = float((gross - baseline * duration) / n_inferences)
+    return result
+
+
+def cumulative_energy(t_ns, power):
+    # Running trapezoidal energy in joules at each sample, starting from 0
+    out = np.zeros(len(t_ns), dtype=np.float64)
+    if len(t_ns) > 1:
+        np.cumsum(0.5 * np.diff(t_ns) / 1e9 * (power[:-1] + power[1:]), out=out[1:])
+    return out
+
+
+def energy_between(t_ns, power, marks_ns, baseline=0.0):
+    # Energy in joules between consecutive marks (e.g. iteration timestamps from a
+    # latency trace) on the same clock as the power trace; one value per interval.
+    marks_ns = np.asarray(marks_ns, dtype=np.int64)
+    if len(t_ns) < 2 or len(marks_ns) < 2:
+        return np.zeros(max(len(marks_ns) - 1, 0))
+    t0 = t_ns[0]
+    cum = np.interp(marks_ns - t0, t_ns - t0, cumulative_energy(t_ns, power))
+    return np.diff(cum) - baseline * np.diff(marks_ns) / 1e9
+
+
+def energy_intervals(t_ns, power, t0_ns, t1_ns, baseline=0.0):
+    # Energy in joules over arbitrary (possibly overlapping) intervals [t0_ns[i], t1_ns[i]],
+    # any shape, from one cumulative pass over the trace
+    t0_ns = np.asarray(t0_ns, dtype=np.int64)
+    t1_ns = np.asarray(t1_ns, dtype=np.int64)
+    if len(t_ns) < 2:
+        return np.zeros(t0_ns.shape)
+    t0 = t_ns[0]
+    cum = cumulative_energy(t_ns, power)
+    rel = t_ns - t0
+    return (np.interp(t1_ns - t0, rel, cum) - np.interp(t0_ns - t0, rel, cum)) - baseline * (t1_ns - t0_ns) / 1e9
@@ -0,0 +1,170 @@
+import itertools
+import threading
+import time
+
+import numpy as np
+
+from common.power_trace import energy_intervals
+
+# Named regions on top of an always-on sampler. Entering/leaving a region only writes
+# its timestamps into preallocated arrays (a slot from an atomic counter, a per-thread
+# stack for nesting), so marking costs a couple of microseconds and the sampler never sees
+# it. Energy is attributed afterwards by laying the regions over the shared trace.
+# The arrays are a ring: only the last `capacity` regions are kept.
+
+
+class Region:
+    # Reusable handle for one region name: a context manager and a decorator. All state
+    # lives in the recorder and the calling thread's stack, so one handle serves any
+    # number of threads and nesting levels.
+    __slots__ = ("_rec", "_id", "name")
+
+    def __init__(self, recorder, name_id, name):
+        self._rec = recorder
+        self._id = name_id
+        self.name = name
+
+    def __enter__(self):
+        rec = self._rec
+        local = rec._local
+        try:
+            stack = local.stack
+        except AttributeError:
+            stack = local.stack = []
+        seq = next(rec._counter)
+        slot = seq % rec.capacity
+        rec.end_ns[slot] = 0
+        rec.seq[slot] = seq
+        rec.name_id[slot] = self._id
+        rec.parent[slot] = stack[-1] if stack else -1
+        rec.thread[slot] = threading.get_ident()
+        stack.append(seq)
+        rec.start_ns[slot] = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        t_ns = time.time_ns()
+        rec = self._rec
+        rec.end_ns[rec._local.stack.pop() % rec.capacity] = t_ns
+        return False
+
+    def __call__(self, fn):
+        def wrapper(*args, **kwargs):
+            with self:
+                return fn(*args, **kwargs)
+        wrapper.__name__ = getattr(fn, "__name__", "region")
+        wrapper.__doc__ = getattr(fn, "__doc__", None)
+        return wrapper
+
+
+class RegionRecorder:
+    def __init__(self, capacity=1 << 16):
+        self.capacity = capacity
+        self.start_ns = np.zeros(capacity, dtype=np.int64)
+        self.end_ns = np.zeros(capacity, dtype=np.int64)
+        self.seq = np.full(capacity, -1, dtype=np.int64)
+        self.parent = np.full(capacity, -1, dtype=np.int64)
+        self.thread = np.zeros(capacity, dtype=np.int64)
+        self.name_id = np.zeros(capacity, dtype=np.int32)
+        self.names = []
+        self._handles = {}
+        self._counter = itertools.count()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def region(self, name):
+        handle = self._handles.get(name)
+        if handle is None:
+            # Only the first use of a name takes the lock
+            with self._lock:
+                handle = self._handles.get(name)
+                if handle is None:
+                    handle = Region(self, len(self.names), name)
+                    self.names.append(name)
+                    self._handles[name] = handle
+        return handle
+
+    def clear(self):
+        self.seq[:] = -1
+        self.end_ns[:] = 0
+
+    def completed(self, t0_ns=None, t1_ns=None):
+        # Finished regions (optionally only those inside [t0_ns, t1_ns]) in start order.
+        # parent is the row index of the enclosing region, -1 at top level or if it was
+        # overwritten; depth counts the enclosing regions.
+        keep = (self.seq >= 0) & (self.end_ns >= self.start_ns) & (self.end_ns > 0)
+        if t0_ns is not None:
+            keep &= self.start_ns >= t0_ns
+        if t1_ns is not None:
+            keep &= self.end_ns <= t1_ns
+        idx = np.flatnonzero(keep)
+        idx = idx[np.argsort(self.seq[idx], kind="stable")]
+        seq = self.seq[idx]
+        parent_seq = self.parent[idx]
+        pos = np.searchsorted(seq, parent_seq)
+        found = (parent_seq >= 0) & (pos < len(seq)) & (seq[np.minimum(pos, len(seq) - 1)] == parent_seq)
+        parent = np.where(found, pos, -1)
+        depth = np.zeros(len(idx), dtype=np.int64)
+        for i in range(len(idx)):
+            # Parents always precede their children in sequence order
+            if parent[i] >= 0:
+                depth[i] = depth[parent[i]] + 1
+        return {
+            "name": [self.names[i] for i in self.name_id[idx]],
+            "name_id": self.name_id[idx].copy(),
+            "start_ns": self.start_ns[idx].copy(),
+            "end_ns": self.end_ns[idx].copy(),
+            "thread": self.thread[idx].copy(),
+            "parent": parent,
+            "depth": depth,
+        }
+
+    def attribute(self, t_ns, power, baseline=0.0, split=False):
+        # Per-region energy (J, baseline removed) over the trace, and self energy with the
+        # nested regions' share taken out. split: regions running concurrently (top level,
+        # e.g. requests on several threads) divide the power between them instead of
+        # each being charged for all of it.
+        regions = self.completed(t_ns[0] if len(t_ns) else None, t_ns[-1] if len(t_ns) else None)
+        start, end = regions["start_ns"], regions["end_ns"]
+        net = np.asarray(power, dtype=np.float64) - baseline
+        if split and len(start):
+            top = regions["parent"] < 0
+            active = (np.searchsorted(np.sort(start[top]), t_ns, side="right")
+                      - np.searchsorted(np.sort(end[top]), t_ns, side="right"))
+            net = net / np.maximum(active, 1)
+        energy = energy_intervals(t_ns, net, start, end) if len(start) else np.zeros(0)
+        nested = regions["parent"] >= 0
+        children = np.bincount(regions["parent"][nested], weights=energy[nested], minlength=len(energy))
+        regions["duration_s"] = (end - start) / 1e9
+        regions["energy_j"] = energy
+        regions["self_energy_j"] = energy - children
+        return regions
+
+
+def summarize(regions, names):
+    # One row per region name: count, mean duration, mean and total energy
+    ids = regions["name_id"]
+    n = np.bincount(ids, minlength=len(names))
+    duration = np.bincount(ids, weights=regions["duration_s"], minlength=len(names))
+    energy = np.bincount(ids, weights=regions["energy_j"], minlength=len(names))
+    self_energy = np.bincount(ids, weights=regions["self_energy_j"], minlength=len(names))
+    rows = []
+    for i, name in enumerate(names):
+        if n[i] == 0:
+            continue
+        rows.append({
+            "region": name,
+            "count": int(n[i]),
+            "mean_ms": float(1e3 * duration[i] / n[i]),
+            "mean_energy_mj": float(1e3 * energy[i] / n[i]),
+            "mean_self_energy_mj": float(1e3 * self_energy[i] / n[i]),
+            "total_energy_j": float(energy[i]),
+        })
+    return rows
+
+
+def print_summary(rows):
+    print(f"{'region':<28} {'count':>7} {'ms':>10} {'mJ':>10} {'self mJ':>10} {'total J':>10}")
+    for r in sorted(rows, key=lambda r: r["total_energy_j"], reverse=True):
+        print(f"{r['region'][:28]:<28} {r['count']:7d} {r['mean_ms']:10.3f} {r['mean_energy_mj']:10.3f} "
+              f"{r['mean_self_energy_mj']:10.3f} {r['total_energy_j']:10.3f}")
@@ -0,0 +1,204 @@
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.power_trace import window_energy
+
+# Splits a run's power trace into warmup, steady state and tail instead of trusting the
+# printed start/end times. The trace is averaged into fixed-width bins (one bincount
+# pass), PELT finds the change points of the bin means, and the longest segment inside
+# the run window, extended over neighbours at the same level, is the steady state.
+# PELT costs one Python step per bin, so a run is cut into at most max_bins bins (a
+# 2M-sample trace takes about 0.2 s). Warmup is the run time before the steady state
+# (thermal ramp, clocks settling after nvpmodel); the tail runs from its end until
+# power is back at idle. Energy per inference comes from the steady state alone.
+
+
+def bin_trace(t_ns, power, bin_ns):
+    # -> (bin centre ns, mean power) of the non-empty bins
+    idx = (t_ns - t_ns[0]) // bin_ns
+    counts = np.bincount(idx)
+    sums = np.bincount(idx, weights=power)
+    keep = counts > 0
+    centres = t_ns[0] + (np.flatnonzero(keep) * bin_ns + bin_ns // 2)
+    return centres.astype(np.int64), sums[keep] / counts[keep]
+
+
+def noise_sigma(x):
+    # Robust noise level from the first differences, unaffected by a few level shifts
+    if len(x) < 3:
+        return 0.0
+    d = np.diff(x)
+    return float(1.4826 * np.median(np.abs(d - np.median(d))) / np.sqrt(2))
+
+
+def pelt(x, penalty, min_size=2):
+    # Optimal partition of x into constant-mean segments under a per-change penalty
+    # (PELT, Killick et al. 2012). The cost of every candidate split is evaluated at
+    # once from cumulative sums; pruning keeps the candidate set small, so the loop is
+    # linear in len(x), but it is still one Python step per bin (a few µs each), which
+    # is why segments() caps the number of bins. -> sorted change point indices
+    # (segment starts).
+    n = len(x)
+    if n < 2 * min_size:
+        return np.empty(0, dtype=np.int64)
+    s = np.concatenate(([0.0], np.cumsum(x)))
+    q = np.concatenate(([0.0], np.cumsum(x * x)))
+    f = np.full(n + 1, np.inf)
+    f[0] = -penalty
+    last = np.zeros(n + 1, dtype=np.int64)
+    # Candidate split points live in the first m slots of one preallocated buffer
+    buf = np.zeros(n + 1, dtype=np.int64)
+    m = 1
+    for t in range(min_size, n + 1):
+        if t - min_size >= min_size:
+            buf[m] = t - min_size
+            m += 1
+        candidates = buf[:m]
+        seg = s[t] - s[candidates]
+        values = f[candidates] + (q[t] - q[candidates]) - seg * seg / (t - candidates)
+        k = int(values.argmin())
+        f[t] = values[k] + penalty
+        last[t] = candidates[k]
+        keep = values <= f[t]
+        m = int(np.count_nonzero(keep))
+        buf[:m] = candidates[keep]
+    points = []
+    t = n
+    while t > 0:
+        t = int(last[t])
+        if t > 0:
+            points.append(t)
+    return np.array(points[::-1], dtype=np.int64)
+
+
+def segments(t_ns, power, bin_s=0.05, max_bins=4000, penalty=None, min_size=3):
+    # -> list of (t0_ns, t1_ns, mean W) covering the trace, split at the detected change points
+    span = int(t_ns[-1] - t_ns[0]) + 1
+    bin_ns = max(int(bin_s * 1e9), -(-span // max_bins))
+    centres, x = bin_trace(t_ns, power, bin_ns)
+    if penalty is None:
+        # BIC-style penalty on the robust noise level; floor it so a flat trace is one segment
+        sigma = max(noise_sigma(x), 1e-3 * max(float(np.abs(x).mean()), 1e-9))
+        penalty = 3.0 * sigma * sigma * np.log(max(len(x), 2))
+    bounds = np.concatenate(([0], pelt(x, penalty, min_size), [len(x)]))
+    edges = np.concatenate(([t_ns[0]], (centres[bounds[1:-1] - 1] + centres[bounds[1:-1]]) // 2, [t_ns[-1]]))
+    return [(int(edges[i]), int(edges[i + 1]), float(x[bounds[i]:bounds[i + 1]].mean())) for i in range(len(bounds) - 1)]
+
+
+def _overlap(seg, t0, t1):
+    return max(min(seg[1], t1) - max(seg[0], t0), 0)
+
+
+def detect(t_ns, power, start_ns, end_ns, baseline=None, n_inferences=1, marks_ns=None, tolerance=0.03,
+           idle_tolerance=0.05, rule="trapezoid", **options):
+    # Warmup/steady/tail split of one run and its energies. baseline (W) is subtracted
+    # from every figure; without it the tail ends at the level of the trace's last
+    # segment (the idle margin after the run). marks_ns: iteration timestamps, to count
+    # the inferences inside the steady state exactly; otherwise they are prorated by time.
+    t_ns = np.asarray(t_ns)
+    power = np.asarray(power)
+    if len(t_ns) < 2 or end_ns <= start_ns:
+        raise ValueError("need a trace with at least two samples and a non-empty run window")
+    segs = segments(t_ns, power, **options)
+
+    inside = [i for i, s in enumerate(segs) if _overlap(s, start_ns, end_ns) > 0]
+    if not inside:
+        raise ValueError("no samples inside the run window")
+    core = max(inside, key=lambda i: _overlap(segs[i], start_ns, end_ns))
+    level = segs[core][2]
+    lo = hi = core
+    while lo - 1 in inside and abs(segs[lo - 1][2] - level) <= tolerance * abs(level):
+        lo -= 1
+    while hi + 1 in inside and abs(segs[hi + 1][2] - level) <= tolerance * abs(level):
+        hi += 1
+    steady_start = max(segs[lo][0], start_ns)
+    steady_end = min(segs[hi][1], end_ns)
+
+    idle = segs[-1][2] if baseline is None else baseline
+    tail_end = int(t_ns[-1])
+    for s in segs[hi + 1:]:
+        if s[0] >= end_ns and abs(s[2] - idle) <= idle_tolerance * max(abs(idle), 1e-9):
+            tail_end = s[0]
+            break
+    tail_end = max(tail_end, steady_end)
+
+    run_s = (end_ns - start_ns) / 1e9
+    steady_s = (steady_end - steady_start) / 1e9
+    if marks_ns is not None:
+        marks_ns = np.asarray(marks_ns)
+        in_steady = int(np.count_nonzero((marks_ns[1:] > steady_start) & (marks_ns[1:] <= steady_end)))
+    else:
+        in_steady = n_inferences * steady_s / run_s
+    base = baseline or 0.0
+    steady = window_energy(t_ns, power, steady_start, steady_end, base, max(in_steady, 1e-12), rule)
+    warmup = window_energy(t_ns, power, start_ns, steady_start, base, 1, rule)
+    tail = window_energy(t_ns, power, steady_end, tail_end, base, 1, rule)
+    window = window_energy(t_ns, power, start_ns, end_ns, base, n_inferences, rule)
+    return {
+        "energy_j": steady["energy_j"] if in_steady > 0 else float("nan"),
+        "window_energy_j": window["energy_j"],
+        "steady_start_ns": steady_start,
+        "steady_end_ns": steady_end,
+        "steady_s": steady_s,
+        "steady_power": steady["avg_power"],
+        "steady_inferences": in_steady,
+        "warmup_s": (steady_start - start_ns) / 1e9,
+        "warmup_energy_j": warmup["energy_j"],
+        "tail_s": (tail_end - steady_end) / 1e9,
+        "tail_energy_j": tail["energy_j"],
+        "segments": len(segs),
+    }
+
+
+def main():
+    from common.trace_store import PARAMS, TraceStore
+
+    parser = argparse.ArgumentParser(description="Steady-state energy of the runs in a trace store")
+    parser.add_argument("store", help="trace store directory")
+    parser.add_argument("--bin", type=float, default=0.05, help="averaging bin before change-point detection (s)")
+    parser.add_argument("--tolerance", type=float, default=0.03,
+                        help="segments within this fraction of the steady level are merged into it")
+    parser.add_argument("--margin", type=float, default=5.0, help="trace read past the run end for the tail (s)")
+    parser.add_argument("--rule", choices=["trapezoid", "simpson"], default="trapezoid")
+    for param in PARAMS:
+        parser.add_argument(f"--{param.replace('_', '-')}", dest=param, help=f"only runs with this {param}")
+    parser.add_argument("--csv", help="write the rows here instead of stdout")
+    args = parser.parse_args()
+
+    filters = {p: getattr(args, p) for p in PARAMS if getattr(args, p) is not None}
+    margin_ns = int(args.margin * 1e9)
+    out = open(args.csv, "w", newline="") if args.csv else sys.stdout
+    t0 = time.perf_counter()
+    n_runs = n_samples = 0
+    try:
+        writer = None
+        with TraceStore(args.store) as store:
+            for run in store.query(**filters):
+                t_ns, power = store.trace(run, run["start_ns"] - margin_ns, run["end_ns"] + margin_ns)
+                try:
+                    stats = detect(t_ns, power, run["start_ns"], run["end_ns"], run["baseline"],
+                                   run["n_inferences"], tolerance=args.tolerance, rule=args.rule, bin_s=args.bin)
+                except ValueError as e:
+                    print(f"run {run['run_id']}: {e}", file=sys.stderr)
+                    continue
+                row = {**{k: run[k] for k in ("run_id",) + PARAMS}, "baseline": run["baseline"], **stats}
+                if writer is None:
+                    writer = csv.DictWriter(out, fieldnames=list(row))
+                    writer.writeheader()
+                writer.writerow(row)
+                n_runs += 1
+                n_samples += len(t_ns)
+    finally:
+        if args.csv:
+            out.close()
+    print(f"{n_runs} runs, {n_samples} samples in {time.perf_counter() - t0:.2f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
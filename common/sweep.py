@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import time
+from itertools import product
+
+
+class Sweep:
+    # Runs every combination of `params` (name -> list of values) with the first name
+    # varying slowest, so the most expensive state changes (power mode, then model)
+    # happen as rarely as possible. Completed combos are checkpointed to disk and
+    # skipped on restart, as are combos `is_done(combo)` reports (e.g. already in the
+    # results store). A failing combo is retried with exponential backoff. `params` may
+    # also be an explicit, already ordered list of combo dicts (e.g. one board's shard).
+    def __init__(self, params, checkpoint="sweep_checkpoint.json", is_done=None, retries=2, backoff=5.0,
+                 max_backoff=120.0):
+        self.params = params
+        self.checkpoint = checkpoint
+        self.is_done = is_done
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._state = {"done": [], "failed": {}}
+        if checkpoint and os.path.isfile(checkpoint):
+            try:
+                with open(checkpoint) as f:
+                    self._state = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable sweep checkpoint {checkpoint}: {e}")
+        self._done = set(self._state["done"])
+
+    @staticmethod
+    def key(combo):
+        return json.dumps(combo, sort_keys=True)
+
+    def combos(self):
+        if not isinstance(self.params, dict):
+            return list(self.params)
+        names = list(self.params)
+        return [dict(zip(names, values)) for values in product(*self.params.values())]
+
+    def pending(self):
+        return [c for c in self.combos()
+                if self.key(c) not in self._done and not (self.is_done and self.is_done(c))]
+
+    def mark_done(self, combo):
+        self._done.add(self.key(combo))
+        self._state["failed"].pop(self.key(combo), None)
+        self._save()
+
+    def mark_failed(self, combo, error):
+        self._state["failed"][self.key(combo)] = str(error)
+        self._save()
+
+    def delay(self, attempt):
+        return min(self.backoff * 2 ** attempt, self.max_backoff)
+
+    def _save(self):
+        if not self.checkpoint:
+            return
+        self._state["done"] = sorted(self._done)
+        tmp = self.checkpoint + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._state, f, indent=2)
+        os.replace(tmp, self.checkpoint)
+
+    def run(self, fn, on_change=None, state=None):
+        # fn(combo) measures one combo and raises on failure. on_change maps a parameter
+        # name to a callable(value, combo) invoked only when that parameter's value differs
+        # from the previous combo's (and again after a failure, as the state is unknown).
+        # state holds the values applied so far; passing the same dict to several runs
+        # carries them over, so a following run does not re-apply an unchanged value.
+        on_change = on_change or {}
+        todo = self.pending()
+        skipped = len(self.combos()) - len(todo)
+        if skipped:
+            print(f"Skipping {skipped} completed combos, {len(todo)} to go")
+        current = state if state is not None else {}
+        results = []
+        for i, combo in enumerate(todo):
+            for attempt in range(self.retries + 1):
+                try:
+                    for name, hook in on_change.items():
+                        if current.get(name, object()) != combo[name]:
+                            current.pop(name, None)
+                            hook(combo[name], combo)
+                            current[name] = combo[name]
+                    results.append(fn(combo))
+                except Exception as e:
+                    current.clear()
+                    if attempt == self.retries:
+                        print(f"[{i + 1}/{len(todo)}] {combo} failed after {attempt + 1} attempts: {e}")
+                        self.mark_failed(combo, e)
+                        break
+                    delay = self.delay(attempt)
+                    print(f"[{i + 1}/{len(todo)}] {combo} failed ({e}), retrying in {delay:.0f}s")
+                    time.sleep(delay)
+                    continue
+                self.mark_done(combo)
+                break
+        return results
+
+    async def run_async(self, fn, on_change=None, state=None):
+        # run() for coroutines: fn(combo) and the on_change hooks are awaited, and the
+        # retry backoff sleeps without blocking the event loop
+        on_change = on_change or {}
+        todo = self.pending()
+        skipped = len(self.combos()) - len(todo)
+        if skipped:
+            print(f"Skipping {skipped} completed combos, {len(todo)} to go")
+        current = state if state is not None else {}
+        results = []
+        for i, combo in enumerate(todo):
+            for attempt in range(self.retries + 1):
+                try:
+                    for name, hook in on_change.items():
+                        if current.get(name, object()) != combo[name]:
+                            current.pop(name, None)
+                            await hook(combo[name], combo)
+                            current[name] = combo[name]
+                    results.append(await fn(combo))
+                except Exception as e:
+                    current.clear()
+                    if attempt == self.retries:
+                        print(f"[{i + 1}/{len(todo)}] {combo} failed after {attempt + 1} attempts: {e}")
+                        self.mark_failed(combo, e)
+                        break
+                    delay = self.delay(attempt)
+                    print(f"[{i + 1}/{len(todo)}] {combo} failed ({e}), retrying in {delay:.0f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                self.mark_done(combo)
+                break
+        return results
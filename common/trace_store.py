@@ -0,0 +1,232 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.power_trace import window_energy
+
+# Keeps every run's raw power trace next to its parameters so energy can be recomputed
+# (other baseline, integration rule, window) without touching the hardware again.
+#
+# Layout of a store directory:
+#   index.sqlite      runs (parameters, window, baseline) and chunks (where each piece
+#                     of a trace lives, with its first/last timestamp)
+#   seg-NNNNN.bin     append-only segments of trace chunks
+#
+# A chunk is up to chunk_size samples. With codec "delta" it holds zlib(int64 timestamp
+# deltas) followed by zlib(float32 power); with "raw" it holds the int64 timestamps then
+# the float32 powers, which np.memmap exposes without reading or copying. Segments are
+# memory-mapped either way, so only chunks overlapping a queried window are touched.
+
+PARAMS = ("model", "batch_size", "mode", "backend", "meter")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    model TEXT, batch_size INTEGER, mode TEXT, backend TEXT, meter TEXT,
+    start_ns INTEGER, end_ns INTEGER, baseline REAL, n_inferences INTEGER,
+    n_samples INTEGER, codec TEXT, extra TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_params ON runs (model, batch_size, mode, backend, meter);
+CREATE TABLE IF NOT EXISTS chunks (
+    run_id INTEGER, seq INTEGER, segment INTEGER, offset INTEGER, nbytes INTEGER,
+    n INTEGER, t_first INTEGER, t_last INTEGER, t_nbytes INTEGER,
+    PRIMARY KEY (run_id, seq)
+);
+"""
+
+
+def encode_chunk(t_ns, power, codec):
+    t_ns = np.ascontiguousarray(t_ns, dtype=np.int64)
+    power = np.ascontiguousarray(power, dtype=np.float32)
+    if codec == "raw":
+        return t_ns.tobytes() + power.tobytes(), t_ns.nbytes
+    # Sample spacing is near-constant, so the deltas compress to a few bytes per sample
+    deltas = np.diff(t_ns, prepend=0)
+    t_bytes = zlib.compress(deltas.tobytes(), 6)
+    return t_bytes + zlib.compress(power.tobytes(), 6), len(t_bytes)
+
+
+def decode_chunk(buf, n, t_nbytes, codec):
+    if codec == "raw":
+        t_ns = np.frombuffer(buf, dtype=np.int64, count=n)
+        return t_ns, np.frombuffer(buf, dtype=np.float32, count=n, offset=t_nbytes)
+    t_ns = np.cumsum(np.frombuffer(zlib.decompress(bytes(buf[:t_nbytes])), dtype=np.int64))
+    return t_ns, np.frombuffer(zlib.decompress(bytes(buf[t_nbytes:])), dtype=np.float32)
+
+
+class TraceStore:
+    # add() buffers runs in memory; flush() (every batch_runs runs, or on close) appends
+    # all their chunks with one write and one fsync and indexes them in one transaction.
+    def __init__(self, path="trace_store", codec="delta", chunk_size=1 << 16, batch_runs=8,
+                 segment_bytes=256 << 20):
+        if codec not in ("delta", "raw"):
+            raise ValueError(f"unknown codec {codec!r}")
+        self.path = path
+        self.codec = codec
+        self.chunk_size = chunk_size
+        self.batch_runs = batch_runs
+        self.segment_bytes = segment_bytes
+        os.makedirs(path, exist_ok=True)
+        # Callers serialise access, but may write from an executor thread
+        self.db = sqlite3.connect(os.path.join(path, "index.sqlite"), check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(_SCHEMA)
+        self._pending = []
+        self._maps = {}
+        row = self.db.execute("SELECT MAX(segment) FROM chunks").fetchone()
+        self._segment = row[0] or 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.flush()
+        self._maps.clear()
+        self.db.close()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, f"seg-{segment:05d}.bin")
+
+    def add(self, t_ns, power, start_ns=None, end_ns=None, baseline=0.0, n_inferences=1, **meta):
+        # meta: the run parameters in PARAMS plus anything else (stored as JSON)
+        t_ns = np.asarray(t_ns, dtype=np.int64)
+        power = np.asarray(power, dtype=np.float32)
+        chunks = []
+        for i in range(0, len(t_ns), self.chunk_size):
+            t, p = t_ns[i:i + self.chunk_size], power[i:i + self.chunk_size]
+            data, t_nbytes = encode_chunk(t, p, self.codec)
+            chunks.append((data, len(t), int(t[0]), int(t[-1]), t_nbytes))
+        run = {k: meta.pop(k, None) for k in PARAMS}
+        run.update(
+            start_ns=int(start_ns if start_ns is not None else (t_ns[0] if len(t_ns) else 0)),
+            end_ns=int(end_ns if end_ns is not None else (t_ns[-1] if len(t_ns) else 0)),
+            baseline=float(baseline), n_inferences=int(n_inferences), n_samples=len(t_ns),
+            codec=self.codec, extra=json.dumps(meta, default=str),
+        )
+        self._pending.append((run, chunks))
+        if len(self._pending) >= self.batch_runs:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        path = self._segment_path(self._segment)
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        if offset >= self.segment_bytes:
+            self._segment += 1
+            path, offset = self._segment_path(self._segment), 0
+        blobs = []
+        with self.db:
+            for run, chunks in self._pending:
+                cur = self.db.execute(
+                    f"INSERT INTO runs ({', '.join(run)}) VALUES ({', '.join('?' * len(run))})", list(run.values()))
+                for seq, (data, n, t_first, t_last, t_nbytes) in enumerate(chunks):
+                    self.db.execute("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (cur.lastrowid, seq, self._segment, offset, len(data), n, t_first, t_last,
+                                     t_nbytes))
+                    blobs.append(data)
+                    offset += len(data)
+            # Chunk data is durable before the index rows pointing at it are committed
+            with open(path, "ab") as f:
+                f.write(b"".join(blobs))
+                f.flush()
+                os.fsync(f.fileno())
+        self._maps.pop(self._segment, None)
+        self._pending = []
+
+    def query(self, **filters):
+        # Runs matching the given parameters, e.g. query(model="resnet18", mode=0)
+        unknown = set(filters) - set(PARAMS)
+        if unknown:
+            raise ValueError(f"cannot filter on {sorted(unknown)}, expected some of {PARAMS}")
+        where = " AND ".join(f"{k} = ?" for k in filters) or "1"
+        rows = self.db.execute(f"SELECT * FROM runs WHERE {where} ORDER BY run_id", list(filters.values()))
+        runs = []
+        for row in rows:
+            run = dict(row)
+            run.update(json.loads(run.pop("extra") or "{}"))
+            runs.append(run)
+        return runs
+
+    def _map(self, segment):
+        if segment not in self._maps:
+            self._maps[segment] = np.memmap(self._segment_path(segment), dtype=np.uint8, mode="r")
+        return self._maps[segment]
+
+    def trace(self, run, t0_ns=None, t1_ns=None):
+        # (t_ns, power) of a run, decoding only the chunks that overlap [t0_ns, t1_ns].
+        # For raw single-chunk runs these are views straight into the mapped segment.
+        run_id = run["run_id"] if isinstance(run, dict) else run
+        codec = self.db.execute("SELECT codec FROM runs WHERE run_id = ?", (run_id,)).fetchone()[0]
+        chunks = self.db.execute("SELECT * FROM chunks WHERE run_id = ? ORDER BY seq", (run_id,)).fetchall()
+        t_first = np.array([c["t_first"] for c in chunks], dtype=np.int64)
+        t_last = np.array([c["t_last"] for c in chunks], dtype=np.int64)
+        # Keep the neighbouring chunk across each edge so the window ends can be interpolated
+        lo, hi = 0, len(chunks)
+        if t0_ns is not None:
+            lo = max(int(np.searchsorted(t_last, t0_ns)) - 1, 0)
+        if t1_ns is not None:
+            hi = min(int(np.searchsorted(t_first, t1_ns, side="right")) + 1, len(chunks))
+        parts = [decode_chunk(self._map(c["segment"])[c["offset"]:c["offset"] + c["nbytes"]], c["n"], c["t_nbytes"],
+                              codec)
+                 for c in chunks[lo:hi]]
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def recompute(self, rule="trapezoid", baseline=None, margin_ns=0, **filters):
+        # Re-derive energy for every matching run, one run's window in memory at a time.
+        # baseline: None keeps each run's stored baseline, a number overrides it, and a
+        # callable gets the run dict and returns the baseline to use.
+        for run in self.query(**filters):
+            t0, t1 = run["start_ns"] - margin_ns, run["end_ns"] + margin_ns
+            t_ns, power = self.trace(run, t0, t1)
+            if callable(baseline):
+                base = baseline(run)
+            else:
+                base = run["baseline"] if baseline is None else baseline
+            stats = window_energy(t_ns, power, run["start_ns"], run["end_ns"], baseline=base,
+                                  n_inferences=run["n_inferences"], rule=rule)
+            yield {**{k: run[k] for k in ("run_id",) + PARAMS}, "baseline": base, **stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute energy over stored raw traces")
+    parser.add_argument("store", help="trace store directory")
+    parser.add_argument("--rule", choices=["trapezoid", "simpson"], default="trapezoid")
+    parser.add_argument("--baseline", type=float, help="override every run's stored baseline (W)")
+    for param in PARAMS:
+        parser.add_argument(f"--{param.replace('_', '-')}", dest=param, help=f"only runs with this {param}")
+    parser.add_argument("--csv", help="write the recomputed rows here instead of stdout")
+    args = parser.parse_args()
+
+    filters = {p: getattr(args, p) for p in PARAMS if getattr(args, p) is not None}
+    with TraceStore(args.store) as store:
+        rows = store.recompute(rule=args.rule, baseline=args.baseline, **filters)
+        out = open(args.csv, "w", newline="") if args.csv else sys.stdout
+        try:
+            writer = None
+            for row in rows:
+                if writer is None:
+                    writer = csv.DictWriter(out, fieldnames=list(row))
+                    writer.writeheader()
+                writer.writerow(row)
+        finally:
+            if args.csv:
+                out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import json
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+
+
+def send_request(conn, payload):
+    # One JSON line each way; works over a socket or a paramiko channel
+    conn.sendall((json.dumps(payload) + "\n").encode())
+    buf = b""
+    while not buf.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            raise ConnectionError("inference server closed the connection")
+        buf += chunk
+    return json.loads(buf)
+
+
+def model_nbytes(model):
+    # Non-torch runtimes (e.g. an ONNX Runtime session) report their own footprint
+    if hasattr(model, "nbytes"):
+        return model.nbytes
+    return sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+
+
+class ModelCache:
+    # LRU of instantiated models, bounded by parameter + buffer memory.
+    # create_fn(args) builds a model; key_fn(args) says which args identify it.
+    def __init__(self, create_fn, max_bytes, key_fn=lambda args: (args.model,)):
+        self.create_fn = create_fn
+        self.max_bytes = max_bytes
+        self.key_fn = key_fn
+        self._models = OrderedDict()
+        self._sizes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, args):
+        key = self.key_fn(args)
+        model = self._models.get(key)
+        if model is not None:
+            self._models.move_to_end(key)
+            self.hits += 1
+            return model
+        self.misses += 1
+        model = self.create_fn(args)
+        self._models[key] = model
+        self._sizes[key] = model_nbytes(model)
+        while sum(self._sizes.values()) > self.max_bytes and len(self._models) > 1:
+            old, _ = self._models.popitem(last=False)
+            del self._sizes[old]
+        return model
+
+    def info(self):
+        return {
+            "models": [list(k) for k in self._models],
+            "bytes": sum(self._sizes.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class InferenceServer(socketserver.ThreadingTCPServer):
+    # Keeps torch/CUDA initialised between runs. Each request is a JSON object whose
+    # fields override the CLI defaults; run_fn(model, inputs, args) returns
+    # {"start_time", "end_time", "iterations", ...}.
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, cache, make_inputs, run_fn, defaults):
+        super().__init__(address, _Handler)
+        self.cache = cache
+        self.make_inputs = make_inputs
+        self.run_fn = run_fn
+        self.defaults = defaults
+        # One run at a time: concurrent runs would share the accelerator and the power trace
+        self.run_lock = threading.Lock()
+
+    def handle_request_payload(self, payload):
+        cmd = payload.get("cmd", "run")
+        if cmd == "ping":
+            # time_ns doubles as the remote stamp for host/board clock alignment
+            return {"ok": True, "time": time.time(), "time_ns": time.time_ns()}
+        if cmd == "stats":
+            return {"ok": True, "cache": self.cache.info()}
+        if cmd == "shutdown":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"ok": True}
+        if cmd != "run":
+            return {"ok": False, "error": f"unknown command {cmd!r}"}
+
+        args = vars(self.defaults).copy()
+        args.update({k.replace("-", "_"): v for k, v in payload.items() if k != "cmd"})
+        args = argparse.Namespace(**args)
+        with self.run_lock:
+            t0 = time.perf_counter()
+            model = self.cache.get(args)
+            load_time = time.perf_counter() - t0
+            inputs = self.make_inputs(args)
+            result = self.run_fn(model, inputs, args)
+        result.update(ok=True, model=args.model, batch_size=args.batch_size, load_time=load_time)
+        return result
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.handle_request_payload(json.loads(line))
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            self.wfile.flush()
@@ -1,31 +1,274 @@
 import argparse
+import json
+import os
+import sys
 import time
 from tqdm import tqdm
 import torch
 import timm
+from common.convergence import ConvergenceMonitor, WarmupDetector
+from common.latency_trace import IterationTracer, latency_stats, save_trace
+from common.layer_profile import LayerProfiler, attribute, hook_overhead, print_table, save_profile, select_modules
+from inference_server import InferenceServer, ModelCache
+from backends import BACKENDS, SHAPE_SPECIALISED, artifact_key, convert_inputs, prepare
+
+
+def _sync(device):
+    if device == "cuda":
+        torch.cuda.synchronize()
+
+
+def _make_tracer(device, args):
+    if args.trace is None:
+        return None
+    return IterationTracer(args.iterations, device)
+
+
+def _finish_trace(tracer, args):
+    t_ns = tracer.finish()
+    stats = latency_stats(t_ns, args.batch_size)
+    if stats:
+        print(f"latency p50/p90/p99: {1e3 * stats['latency_p50']:.3f} / {1e3 * stats['latency_p90']:.3f} / "
+              f"{1e3 * stats['latency_p99']:.3f} ms")
+        print(f"throughput: {stats['throughput']:.2f} images/s")
+    if args.trace:
+        save_trace(args.trace, t_ns, args.batch_size)
+        stats["trace"] = args.trace
+    return stats
+
+
+def run_adaptive(model, inputs, device, args):
+    warmup = WarmupDetector(tolerance=args.warmup_tolerance, max_iterations=args.max_warmup)
+    while True:
+        t0 = time.perf_counter()
+        model(inputs)
+        _sync(device)
+        if warmup.add(time.perf_counter() - t0):
+            break
+    print("warmup iterations:", warmup.iterations)
+
+    meter = _open_power_meter(args.meter)
+    monitor = ConvergenceMonitor(rel_error=args.rel_error, confidence=args.confidence,
+                                 min_iterations=args.min_iterations, max_iterations=args.iterations,
+                                 max_time=args.max_time)
+    tracer = _make_tracer(device, args)
+    n = 0
+    # Energy samples are the integrated power over batches of iterations spanning at
+    # least --energy-window seconds (J per inference), taken once the trace covers them
+    batch_ns, batch_n, pending = time.time_ns(), 0, []
+    # With a meter, latency alone converging (often before the first energy window is
+    # integrated) does not end the run
+    required = ("latency", "energy") if meter is not None else ("latency",)
+    start = tracer.start() if tracer else time.time()
+    print("start time:", start)
+    try:
+        while not monitor.done(time.time() - start, iterations=n, required=required):
+            t0 = time.perf_counter()
+            model(inputs)
+            if tracer: tracer.mark()
+            _sync(device)
+            latency = time.perf_counter() - t0
+            monitor.add(latency=latency)
+            n += 1
+            if meter is not None:
+                batch_n += 1
+                now_ns = time.time_ns()
+                if now_ns - batch_ns >= args.energy_window * 1e9:
+                    pending.append((batch_ns, now_ns, batch_n))
+                    batch_ns, batch_n = now_ns, 0
+                latest_ns = meter.latest_ns()
+                while pending and pending[0][1] <= latest_ns:
+                    t0_ns, t1_ns, k = pending.pop(0)
+                    monitor.add(energy=meter.ring.energy(t0_ns, t1_ns, n_inferences=k)["energy_j"])
+    except KeyboardInterrupt:
+        pass
+    trace_stats = _finish_trace(tracer, args) if tracer else {}
+    end = tracer.end_time if tracer else time.time()
+    print("end time:", end)
+    if meter is not None:
+        meter.close()
+    summary = monitor.summary()
+    for name, (mean, rel) in summary.items():
+        print(f"{name}: mean {mean:.6g} +/- {100 * rel:.2f}%")
+    return dict(trace_stats, start_time=start, end_time=end, iterations=n, warmup_iterations=warmup.iterations,
+                convergence=summary)
+
+
+def run_fixed(model, inputs, device, args):
+    for _ in range(args.warmup):
+        model(inputs)
+    tracer = _make_tracer(device, args)
+    n = 0
+    # Kernels are queued asynchronously on CUDA: drain the queue before taking either
+    # timestamp so the window covers exactly the timed iterations
+    _sync(device)
+    start = tracer.start() if tracer else time.time()
+    print("start time:",start)
+    try:
+        for _ in range(args.iterations):
+            model(inputs)
+            if tracer: tracer.mark()
+            n += 1
+    except KeyboardInterrupt:
+        pass
+    _sync(device)
+    trace_stats = _finish_trace(tracer, args) if tracer else {}
+    end = tracer.end_time if tracer else time.time()
+    print("end time:",end)
+    return dict(trace_stats, start_time=start, end_time=end, iterations=n, warmup_iterations=args.warmup)
+
+
+def _open_power_meter(meter):
+    # Sampled trace (not just the latest reading) for attributing energy to short intervals
+    if meter != "jtop":
+        return None
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "On_chip_Jetson"))
+    from Jtop import JtopMeter
+    return JtopMeter().open()
+
+
+def run_profile(model, inputs, device, args):
+    for _ in range(args.warmup):
+        model(inputs)
+    types = args.profile_types.split(",") if args.profile_types else None
+    modules = select_modules(model, depth=None if args.profile_leaf else args.profile_depth, leaf=args.profile_leaf,
+                             types=types)
+    if not modules:
+        raise ValueError("no modules match the --profile-* selection")
+    profiler = LayerProfiler(modules, args.profile_iterations, device)
+
+    overhead = hook_overhead(model, inputs, profiler, args.profile_iterations, lambda: _sync(device))
+    print(f"hook overhead: {1e3 * overhead['overhead_s']:.3f} ms/iteration ({overhead['overhead_percent']:.1f}%), "
+          f"{overhead['per_hook_us']:.2f} us per hook call, {len(modules)} layers")
+
+    meter = _open_power_meter(args.meter)
+    baseline = 0.0
+    if meter is not None:
+        baseline = meter.baseline(args.profile_baseline)
+
+    profiler.attach()
+    _sync(device)
+    profiler.start()
+    start = time.time()
+    print("start time:", start)
+    try:
+        for _ in range(args.profile_iterations):
+            profiler.next_iteration()
+            model(inputs)
+    finally:
+        _sync(device)
+        end = time.time()
+        profiler.detach()
+    print("end time:", end)
+    layer_ns = profiler.finish()
+
+    t_ns = power = None
+    if meter is not None:
+        meter.flush(int(end * 1e9))
+        t_ns, power = meter.trace(int(start * 1e9) - 10 ** 9, int(end * 1e9) + 10 ** 8)
+        t_ns, power = t_ns.copy(), power.copy()
+        meter.close()
+    rows, summary = attribute(layer_ns, profiler.names, profiler.types, t_ns, power, baseline,
+                              skip=min(2, len(layer_ns) - 1))
+    print_table(rows, summary, args.profile_top)
+    if args.profile_out:
+        save_profile(args.profile_out, layer_ns, profiler.names, profiler.types, overhead)
+    return dict(start_time=start, end_time=end, iterations=profiler.n, hook_overhead=overhead, layers=rows,
+                profile=summary)
+
+
+def resolve_device(args):
+    if args.device == "auto":
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    return args.device
+
+
+def create_model(args):
+    device = resolve_device(args)
+    model = timm.create_model(args.model, pretrained=False).to(device)
+    model.eval()
+    key = artifact_key(args.model, args.backend, args.batch_size, device)
+    return prepare(model, args.backend, make_inputs(args), device, args.cache_dir, key)
+
+
+def model_cache_key(args):
+    bs = args.batch_size if args.backend in SHAPE_SPECIALISED else None
+    return (args.model, resolve_device(args), args.backend, bs)
+
+
+def make_inputs(args):
+    return convert_inputs(torch.randn((args.batch_size, 3, 224, 224)).to(resolve_device(args)), args.backend)
+
+
+def run(model, inputs, args):
+    device = resolve_device(args)
+    with torch.no_grad():
+        if getattr(args, "profile_layers", False):
+            return run_profile(model, inputs, device, args)
+        if args.adaptive:
+            return run_adaptive(model, inputs, device, args)
+        return run_fixed(model, inputs, device, args)
+
+
+def serve(args):
+    cache = ModelCache(create_model, args.cache_mb * 2 ** 20, key_fn=model_cache_key)
+    server = InferenceServer((args.host, args.port), cache, make_inputs, run, args)
+    print(f"Serving on {args.host}:{args.port} ({resolve_device(args)})", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
 def main():
     parser = argparse.ArgumentParser(description="Run model inference with timm")
     parser.add_argument("--model", type=str, default="resnet18", help="timm model name to run")
     parser.add_argument("--batch-size", "-b", type=int, default=1, help="batch size for inputs")
+    parser.add_argument("--warmup", type=int, default=10, help="warmup iterations (fixed mode)")
+    parser.add_argument("--iterations", type=int, default=500, help="timed iterations, or the cap in adaptive mode")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="end warmup when latency stabilises and stop once the mean is within --rel-error")
+    parser.add_argument("--rel-error", type=float, default=0.01, help="target relative CI half-width (adaptive)")
+    parser.add_argument("--confidence", type=float, default=0.95, help="CI confidence level (adaptive)")
+    parser.add_argument("--min-iterations", type=int, default=20, help="minimum timed iterations (adaptive)")
+    parser.add_argument("--max-time", type=float, default=None, help="cap on timed seconds (adaptive)")
+    parser.add_argument("--warmup-tolerance", type=float, default=0.05, help="latency change that ends warmup (adaptive)")
+    parser.add_argument("--max-warmup", type=int, default=100, help="cap on warmup iterations (adaptive)")
+    parser.add_argument("--meter", choices=["none", "jtop"], default="none",
+                        help="also converge energy per inference using on-board power (adaptive), or attribute "
+                             "it to layers (--profile-layers)")
+    parser.add_argument("--energy-window", type=float, default=0.25,
+                        help="seconds of iterations integrated into one energy sample (adaptive, --meter jtop)")
+    parser.add_argument("--trace", nargs="?", const="", default=None, metavar="PATH",
+                        help="record synchronised per-iteration timestamps, report p50/p90/p99 latency and "
+                             "throughput, and write the binary trace to PATH if given")
+    parser.add_argument("--profile-layers", action="store_true",
+                        help="per-layer latency (and energy with --meter jtop) from forward hooks")
+    parser.add_argument("--profile-depth", type=int, default=2, help="profile modules this many levels deep")
+    parser.add_argument("--profile-leaf", action="store_true", help="profile leaf modules instead of a depth")
+    parser.add_argument("--profile-types", type=str, default=None, help="comma-separated module classes to profile")
+    parser.add_argument("--profile-iterations", type=int, default=50, help="profiled iterations")
+    parser.add_argument("--profile-baseline", type=float, default=2.0, help="idle seconds measured before profiling")
+    parser.add_argument("--profile-top", type=int, default=None, help="only print the N most expensive layers")
+    parser.add_argument("--profile-out", type=str, default=None, help="save layer timestamps (npz) for offline "
+                                                                    "attribution with common/layer_profile.py")
+    parser.add_argument("--backend", choices=BACKENDS, default="eager", help="inference backend / precision variant")
+    parser.add_argument("--cache-dir", type=str, default="artifacts", help="where compiled backends are cached")
+    parser.add_argument("--device", choices=["auto", "cpu", "cuda"], default="auto", help="inference device")
+    parser.add_argument("--serve", action="store_true",
+                        help="stay resident and take run requests as JSON lines on --host/--port")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="server bind address")
+    parser.add_argument("--port", type=int, default=8765, help="server port")
+    parser.add_argument("--cache-mb", type=int, default=2048, help="memory budget for cached models (MB)")
     args = parser.parse_args()
 
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    inputs = torch.randn((args.batch_size, 3, 224, 224)).to(device)
+    if args.serve:
+        serve(args)
+        return
 
-    model = timm.create_model(args.model, pretrained=False).to(device)
-    model.eval()
-
-    with torch.no_grad():
-        for _ in range(10):
-            model(inputs)
-        time.time()
-        print("start time:",time.time())
-        try:
-            for _ in range(500):
-                model(inputs)
-        except KeyboardInterrupt:
-            pass
-        print("end time:",time.time())
+    result = run(create_model(args), make_inputs(args), args)
+    # The daemon's reply as one JSON line, for callers that run this script over SSH
+    print("result:", json.dumps(result))
 
 
 
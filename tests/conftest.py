@@ -0,0 +1,11 @@
+import os
+import sys
+
+# The scripts import their siblings directly (FNB/, PZEM/) and common.* from the repo
+# root, so the tests run with the same search path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "FNB"), os.path.join(ROOT, "PZEM")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
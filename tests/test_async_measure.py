@@ -0,0 +1,49 @@
+import asyncio
+import time
+from itertools import product
+
+import pytest
+
+pytest.importorskip("minimalmodbus")
+pytest.importorskip("serial")
+pytest.importorskip("pty")
+
+from async_measure import cooldown, run_boards
+from Auto_measure import Recorder
+from simulate_lab import SimulatedBoard
+from common.trace_store import TraceStore
+
+PARAMS = {"mode": [0], "model": ["resnet18", "mobilenetv2_100"], "backend": ["eager"], "batch_size": [1, 2]}
+
+
+@pytest.fixture
+def lab(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    boards = [SimulatedBoard(f"sim{i}") for i in range(2)]
+    yield boards
+    for board in boards:
+        board.close()
+
+
+def test_cooldown_without_baseline_sleeps_the_fixed_time():
+    t0 = time.monotonic()
+    assert asyncio.run(cooldown(None, None, fixed=0.1)) == 0.1
+    assert time.monotonic() - t0 >= 0.1
+
+
+def test_boards_run_concurrently_and_keep_extra_fields(lab, tmp_path):
+    with TraceStore(str(tmp_path / "store")) as store:
+        record = Recorder(store, str(tmp_path / "results.csv"), board_column=True)
+        asyncio.run(run_boards([b.inventory_entry() for b in lab], PARAMS, record,
+                               is_done=lambda combo: bool(store.query(**combo)), max_cooldown=2.0))
+        runs = store.query()
+    assert sorted(run["board"] for run in runs) == ["sim0", "sim0", "sim1", "sim1"]
+    assert {(run["model"], run["batch_size"]) for run in runs} == set(product(PARAMS["model"], PARAMS["batch_size"]))
+    # The adaptive cooldown is stored with each run
+    assert all(0 < run["cooldown_s"] <= 2.0 for run in runs)
+    # Both boards were measuring at the same time
+    by_board = {}
+    for run in runs:
+        by_board.setdefault(run["board"], []).append((run["start_ns"], run["end_ns"]))
+    assert min(end for _, end in by_board["sim0"]) > min(start for start, _ in by_board["sim1"])
+    assert min(end for _, end in by_board["sim1"]) > min(start for start, _ in by_board["sim0"])
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from common.baseline_cache import BaselineCache
+from common.meter import ReplayMeter
+
+
+def test_cached_baseline_reused_until_it_drifts(tmp_path):
+    cache = BaselineCache(str(tmp_path / "cache.json"))
+    calls = []
+
+    def sampler(level):
+        def sample(duration):
+            calls.append(duration)
+            return [level + 0.01 * (i % 3) for i in range(20)]
+        return sample
+
+    mean, _, cached = cache.baseline("k", sampler(2.0), duration=5)
+    assert not cached and mean == pytest.approx(2.0, abs=0.02)
+    mean, _, cached = cache.baseline("k", sampler(2.0), duration=5)
+    assert cached and calls[-1] == cache.probe_duration
+    mean, _, cached = cache.baseline("k", sampler(3.0), duration=5)
+    assert not cached and mean == pytest.approx(3.0, abs=0.02) and calls[-1] == 5
+
+
+def test_empty_probe_is_not_trusted(tmp_path):
+    cache = BaselineCache(str(tmp_path / "cache.json"))
+    cache.put("k", [2.0, 2.1, 1.9])
+    mean, probe, cached = cache.baseline("k", lambda duration: [], duration=5)
+    assert mean is None and not cached and probe == []
+
+
+def test_dead_meter_fails_loudly(tmp_path):
+    meter = ReplayMeter(np.array([0, 1], dtype=np.int64), np.array([1.0, 1.0]), loop=False)
+    with pytest.raises(RuntimeError):
+        meter.baseline(0.05)
+    cache = BaselineCache(str(tmp_path / "cache.json"))
+    cache.put("k", [2.0, 2.1, 1.9])
+    with pytest.raises(RuntimeError):
+        meter.baseline(0.05, cache=cache, key="k")
+
+
+def test_cache_and_no_cache_agree(tmp_path):
+    # Uneven spacing: a time-weighted mean and a sample mean would differ here
+    t = np.cumsum(np.tile([2, 8], 200)) * 1_000_000
+    power = np.tile([1.0, 5.0], 200)
+    meter = ReplayMeter(t, power, speed=1.0).open()
+    try:
+        plain = meter.baseline(0.5)
+        cached = meter.baseline(0.5, cache=BaselineCache(str(tmp_path / "cache.json")), key="k")
+    finally:
+        meter.close()
+    assert plain == pytest.approx(3.0, abs=0.3)
+    assert cached == pytest.approx(plain, abs=0.3)
@@ -0,0 +1,21 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Minimum sample rates (Hz): the replayed trace is 1 kHz, the simulated PZEM ~30 Hz
+MIN_RATE = {"replay": 500.0, "pzem": 15.0}
+
+
+def test_smoke(tmp_path):
+    out = tmp_path / "bench.json"
+    subprocess.run([sys.executable, os.path.join(ROOT, "common", "bench_meters.py"), "--meters", *MIN_RATE,
+                    "--duration", "0.5", "--json", str(out)], check=True, timeout=60)
+    with open(out) as f:
+        results = json.load(f)
+    assert set(results) == set(MIN_RATE)
+    for name, rate in MIN_RATE.items():
+        assert results[name]["sample_rate"] >= rate, name
+        assert results[name]["samples"] > 1
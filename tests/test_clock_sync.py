@@ -0,0 +1,67 @@
+import math
+import time
+
+import numpy as np
+import pytest
+
+from common.clock_sync import ClockSync
+
+S = 10**9
+T0 = 1_700_000_000 * S
+
+
+def bursts(sync, offset_ns, drift_ppm, span_s=300.0, n=16, rtt_ns=200_000, seed=0):
+    # Best-of-burst round trips against a board clock with a fixed offset and drift;
+    # each burst's offset error is within half its round trip
+    rng = np.random.default_rng(seed)
+    for host in np.linspace(T0, T0 + span_s * S, n).astype(np.int64):
+        rtt = int(rtt_ns * rng.uniform(0.5, 1.0))
+        true = offset_ns + drift_ppm * 1e3 * (host - T0) / S
+        sync.add(int(host), int(true + rng.uniform(-0.5, 0.5) * rtt), rtt)
+
+
+def test_recovers_offset_and_drift():
+    sync = ClockSync()
+    bursts(sync, offset_ns=-3.2e6, drift_ppm=20.0)
+    summary = sync.summary(T0)
+    assert summary["clock_offset_ms"] == pytest.approx(-3.2, abs=0.05)
+    assert summary["clock_drift_ppm"] == pytest.approx(20.0, abs=1.0)
+    assert summary["clock_bursts"] == 16
+    # Extrapolating the fit an hour past the last burst
+    host = T0 + 3600 * S
+    offset, uncertainty = sync.offset_at(host)
+    assert abs(offset - (-3.2e6 + 20.0 * 3600 * 1e3)) < 5 * uncertainty
+
+
+def test_to_host_undoes_the_board_clock():
+    sync = ClockSync()
+    bursts(sync, offset_ns=5e8, drift_ppm=-10.0)
+    host = T0 + 120 * S
+    remote = int(host + 5e8 - 10.0 * 120 * 1e3)
+    assert abs(sync.to_host(remote) - host) < 100_000
+
+
+def test_short_span_uses_latest_burst_and_drift_bound():
+    sync = ClockSync(min_span=10.0, max_drift_ppm=50.0)
+    assert sync.offset_at(T0) == (0.0, math.inf)
+    sync.add(T0, 1_000_000, 400_000)
+    sync.add(T0 + 2 * S, 1_100_000, 200_000)
+    offset, uncertainty = sync.offset_at(T0 + 2 * S)
+    assert offset == 1_100_000
+    assert uncertainty == pytest.approx(100_000)
+    # 100 s later the assumed drift bound dominates: 50 ppm of 100 s is 5 ms
+    _, later = sync.offset_at(T0 + 102 * S)
+    assert later == pytest.approx(math.hypot(100_000, 5e6), rel=1e-6)
+
+
+def test_old_bursts_leave_the_window():
+    sync = ClockSync(window=60.0)
+    bursts(sync, offset_ns=0, drift_ppm=0.0, span_s=300.0, n=31)
+    assert len(sync.bursts) == 7
+
+
+def test_burst_keeps_the_fastest_round_trip():
+    sync = ClockSync()
+    host_ns, offset_ns, rtt_ns = sync.burst(lambda: time.time_ns() + 2 * S, n=8)
+    assert offset_ns == pytest.approx(2 * S, abs=rtt_ns / 2 + 1)
+    assert sync.bursts == [(host_ns, offset_ns, rtt_ns)]
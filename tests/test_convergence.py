@@ -0,0 +1,53 @@
+import pytest
+
+from common.convergence import ConvergenceMonitor, RunningStats, WarmupDetector
+
+
+def test_running_stats():
+    stats = RunningStats()
+    for x in (1.0, 2.0, 3.0, 4.0):
+        stats.add(x)
+    assert stats.mean == 2.5
+    assert abs(stats.std - 1.2909944) < 1e-6
+    assert RunningStats().rel_half_width() == float("inf")
+
+
+def test_warmup_ends_when_latency_settles():
+    warmup = WarmupDetector(window=3, tolerance=0.05)
+    latencies = [0.5, 0.3, 0.2, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1]
+    stable = [warmup.add(x) for x in latencies]
+    assert stable.index(True) == 8
+    assert WarmupDetector(max_iterations=4).add(1.0) is False
+
+
+def test_converged_latency_waits_for_required_energy():
+    monitor = ConvergenceMonitor(rel_error=0.01, min_iterations=20, max_iterations=500, max_time=10.0)
+    for _ in range(20):
+        monitor.add(latency=0.004)
+    # Latency alone has converged
+    assert monitor.done(0.08, iterations=20)
+    assert not monitor.done(0.08, iterations=20, required=("latency", "energy"))
+    monitor.add(energy=0.02)
+    assert not monitor.done(0.3, iterations=75, required=("latency", "energy"))
+    monitor.add(energy=0.02)
+    assert monitor.done(0.55, iterations=140, required=("latency", "energy"))
+
+
+def test_caps_end_the_run_without_required_quantities():
+    monitor = ConvergenceMonitor(min_iterations=2, max_iterations=50, max_time=1.0)
+    for _ in range(10):
+        monitor.add(latency=0.01)
+    required = ("latency", "energy")
+    assert not monitor.done(0.5, iterations=10, required=required)
+    assert monitor.done(1.0, iterations=10, required=required)
+    assert monitor.done(0.5, iterations=50, required=required)
+
+
+def test_noisy_energy_keeps_the_run_going():
+    monitor = ConvergenceMonitor(rel_error=0.01, min_iterations=2)
+    for i in range(30):
+        monitor.add(latency=0.01)
+    for e in (0.01, 0.03, 0.02):
+        monitor.add(energy=e)
+    assert not monitor.done(iterations=30, required=("energy",))
+    assert monitor.summary()["energy"][0] == pytest.approx(0.02)
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, "Convert_model"))
+from convert import RknnBuild, build_stages, convert
+
+
+def tiny_model():
+    torch = pytest.importorskip("torch")
+    torch.manual_seed(0)
+    return torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.ReLU(), torch.nn.AdaptiveAvgPool2d(1),
+                               torch.nn.Flatten(), torch.nn.Linear(4, 2))
+
+
+def test_stages_are_cached_by_content(tmp_path):
+    model = tiny_model()
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxsim")
+    options = dict(cache_dir=str(tmp_path / "cache"), out_dir=str(tmp_path / "out"), image_size=16, model=model)
+    stages = build_stages(["onnx", "onnxsim"])
+
+    first = convert("tiny", stages, **options)
+    assert [s["cached"] for s in first["stages"][1:]] == [False, False]
+    assert os.path.isfile(tmp_path / "out" / "tiny.sim.onnx")
+
+    second = convert("tiny", stages, **options)
+    assert [s["cached"] for s in second["stages"][1:]] == [True, True]
+    assert [s["key"] for s in second["stages"][1:]] == [s["key"] for s in first["stages"][1:]]
+
+    # Another opset is another export, and so another simplified model too
+    other = convert("tiny", build_stages(["onnx", "onnxsim"], opset=14), **options)
+    assert [s["cached"] for s in other["stages"][1:]] == [False, False]
+    assert {s["key"] for s in other["stages"][1:]}.isdisjoint(s["key"] for s in first["stages"][1:])
+
+
+def test_rknn_key_follows_the_calibration_images(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.jpg").write_bytes(b"image a")
+    (tmp_path / "b.jpg").write_bytes(b"image b")
+    (tmp_path / "dataset.txt").write_text("a.jpg\nb.jpg\n")
+    stage = RknnBuild(dataset="dataset.txt")
+    key = stage.key("src")
+    assert stage.key("src") == key
+
+    (tmp_path / "b.jpg").write_bytes(b"image b, recaptured")
+    changed = stage.key("src")
+    assert changed != key
+    (tmp_path / "b.jpg").unlink()
+    assert stage.key("src") not in (key, changed)
+    # Without quantization the calibration data does not matter
+    assert RknnBuild(quantize=False, dataset="dataset.txt").params()["dataset"] is None
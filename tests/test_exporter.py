@@ -0,0 +1,89 @@
+import json
+import socket
+import time
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import numpy as np
+import pytest
+
+from common.exporter import TelemetryExporter
+from common.meter import PowerMeter, ReplayMeter
+from common.power_trace import cumulative_energy
+
+
+def test_energy_counter_bridges_ticks():
+    # Ticks driven by hand over a meter whose ring is filled directly
+    meter = PowerMeter(ring_capacity=1024)
+    exporter = TelemetryExporter(meter, history=4)
+    t = np.arange(30) * 10_000_000 + 1_000_000_000
+    power = np.where(np.arange(30) < 15, 2.0, 4.0)
+    meter.ring.extend(t[:15], power[:15])
+    exporter.tick()
+    exporter.tick()
+    meter.ring.extend(t[15:], power[15:])
+    exporter.tick()
+
+    expected = cumulative_energy(t, power)[-1]
+    assert exporter.energy_j == pytest.approx(expected)
+    assert exporter.samples == 30
+    history = exporter.history()
+    assert history["samples"] == [15, 0, 15]
+    # An interval without samples is null, not NaN, so /history stays valid JSON
+    assert history["mean"] == [2.0, None, 4.0]
+    json.dumps(history, allow_nan=False)
+
+    text = exporter.render()
+    assert 'power_watts{meter="meter",stat="max"} 4.0' in text
+    assert f'energy_joules_total{{meter="meter"}} {exporter.energy_j}' in text
+    assert "# TYPE energy_joules_total counter" in text
+    assert "# HELP" not in exporter.render(help=False)
+
+    # Only the last `history` intervals are kept, oldest first
+    exporter.tick()
+    exporter.tick()
+    assert exporter.history()["samples"] == [0, 15, 0, 0]
+
+
+def metric(text, name):
+    for line in text.splitlines():
+        if line.startswith(name + "{"):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def test_live_meter_over_http_and_udp():
+    # 3 W constant at 1 kHz, replayed; regions reported 1 W above a 2 W baseline
+    t = np.arange(0, 5000) * 1_000_000
+    udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp.bind(("127.0.0.1", 0))
+    udp.settimeout(2)
+    with ReplayMeter(t, np.full(len(t), 3.0)) as meter:
+        with TelemetryExporter(meter, interval=0.05, http_port=0, http_host="127.0.0.1", baseline=2.0,
+                               udp=udp.getsockname(), labels={"device": "test"}) as exporter:
+            t0 = time.perf_counter()
+            for _ in range(3):
+                with meter.region("request"):
+                    time.sleep(0.05)
+            time.sleep(0.2)
+            elapsed = time.perf_counter() - t0
+            url = f"http://127.0.0.1:{exporter.http_port}"
+            with urlopen(url + "/metrics", timeout=2) as response:
+                text = response.read().decode()
+            with urlopen(url + "/history", timeout=2) as response:
+                history = json.loads(response.read())
+            with pytest.raises(HTTPError):
+                urlopen(url + "/other", timeout=2)
+            datagram = udp.recv(65536).decode()
+    udp.close()
+
+    assert 'device="test"' in text
+    assert metric(text, "power_watts") == pytest.approx(3.0)
+    assert metric(text, "energy_joules_total") == pytest.approx(3.0 * elapsed, rel=0.3)
+    assert metric(text, "power_samples_total") > 100
+    assert metric(text, "region_count_total") == 3
+    seconds = metric(text, "region_seconds_total")
+    assert seconds >= 0.15
+    assert metric(text, "region_energy_joules_total") == pytest.approx(1.0 * seconds, rel=0.02)
+    assert len(history["mean"]) >= 3 and all(m == pytest.approx(3.0) for m in history["mean"] if m is not None)
+    assert "# HELP" not in datagram and "energy_joules_total" in datagram
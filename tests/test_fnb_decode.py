@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import DATA
+from fnb_decode import FNBDecoder, crc8, decode_packets, load_capture
+
+# data/fnb_synthetic.bin is synthetic, not recorded from a device: six packets written
+# in the FNBTool.capture() format, 40 ms apart. Four data packets, one with a corrupted
+# CRC (third) and one of another packet type with a valid CRC (fifth).
+CAPTURE = os.path.join(DATA, "fnb_synthetic.bin")
+T0_NS = 1_700_000_000_000_000_000
+
+# One FNB58 data packet: 5.00 V and 0.400/0.401/0.402/0.403 A, 25.0 C
+PACKET = bytes.fromhex(
+    "aa0420a10700409c00000000000000fa0020a10700a49c00000000000000fa00"
+    "20a10700089d00000000000000fa0020a107006c9d00000000000000fa0000be")
+
+
+def crc8_reference(data, poly=0x39, init=0x42):
+    # Bitwise CRC-8, independent of the table-driven implementation
+    crc = init
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+def test_crc8_known_packet():
+    raw = np.frombuffer(PACKET, dtype=np.uint8).reshape(1, -1)
+    assert crc8_reference(PACKET[1:63]) == PACKET[63] == 0xbe
+    assert int(crc8(raw)[0]) == 0xbe
+
+
+def test_crc8_hand_computed():
+    # Worked by hand, one byte at a time (crc <- table[crc ^ byte], table[0] == 0):
+    #   type 0x04: 0x42 ^ 0x04 = 0x46 -> 0x8c 0x21 0x42 0x84 0x31 0x62 0xc4 0xb1
+    #   byte 0xb1: 0xb1 ^ 0xb1 = 0    -> 0, and every zero byte after keeps it 0
+    #   last byte 0x01: 0x01 shifted left 7 times is 0x80, the 8th shift xors in 0x39
+    packet = bytearray(64)
+    packet[0], packet[1], packet[2] = 0xaa, 0x04, 0xb1
+    assert crc8_reference(packet[1:63]) == 0x00
+    assert int(crc8(np.frombuffer(bytes(packet), dtype=np.uint8).reshape(1, -1))[0]) == 0x00
+    packet[62] = 0x01
+    assert int(crc8(np.frombuffer(bytes(packet), dtype=np.uint8).reshape(1, -1))[0]) == 0x39
+    # With the CRC byte right it decodes: voltage field 0x000000b1 = 177e-5 V, no current
+    packet[63] = 0x39
+    voltage, current, _, dropped = decode_packets(bytes(packet))
+    assert dropped == 0
+    np.testing.assert_allclose(voltage, [0.00177, 0.0, 0.0, 0.0])
+    np.testing.assert_allclose(current, [0.0] * 4)
+
+
+def test_crc8_matches_reference_on_capture():
+    _, packets = load_capture(CAPTURE)
+    expected = [crc8_reference(bytes(p[1:63])) for p in packets]
+    assert crc8(packets).tolist() == expected
+    # Only the corrupted packet disagrees with its CRC byte
+    assert (crc8(packets) != packets[:, 63]).tolist() == [False, False, True, False, False, False]
+
+
+def test_decode_known_packet():
+    voltage, current, power, dropped = decode_packets(PACKET)
+    assert dropped == 0
+    np.testing.assert_allclose(voltage, [5.0] * 4)
+    np.testing.assert_allclose(current, [0.400, 0.401, 0.402, 0.403])
+    np.testing.assert_allclose(power, 5.0 * np.array([0.400, 0.401, 0.402, 0.403]))
+
+
+def test_decode_capture_drops_bad_crc_and_other_types():
+    t_ns, packets = load_capture(CAPTURE)
+    assert len(t_ns) == 6
+    assert t_ns[0] == T0_NS and np.all(np.diff(t_ns) == 40_000_000)
+    voltage, current, power, dropped = decode_packets(packets.tobytes())
+    assert dropped == 2
+    assert len(power) == 4 * 4
+    np.testing.assert_allclose(voltage[::4], [5.0, 5.01, 4.99, 5.02])
+    np.testing.assert_allclose(current[::4], [0.40, 0.41, 0.42, 0.43])
+    # Without the CRC check the corrupted packet (9 V, 1 A) gets through
+    _, _, power, dropped = decode_packets(packets.tobytes(), check_crc=False)
+    assert dropped == 1
+    assert pytest.approx(9.0) in power.tolist()
+
+
+def test_decoder_spreads_samples_over_arrival_gap():
+    t_ns, packets = load_capture(CAPTURE)
+    decoder = FNBDecoder()
+    times = []
+    for arrival, packet in zip(t_ns, packets):
+        t, _, _, power = decoder.decode(packet.tobytes(), int(arrival))
+        assert len(t) == len(power)
+        times.append(t)
+    assert decoder.n_packets == 6 and decoder.n_dropped == 2
+    # First packet: nominal 10 ms spacing ending at its arrival
+    assert times[0].tolist() == [T0_NS - 30_000_000, T0_NS - 20_000_000, T0_NS - 10_000_000, T0_NS]
+    # After a dropped packet the gap is 80 ms, over the 2x nominal limit, so spacing is nominal again
+    assert np.all(np.diff(times[3]) == 10_000_000)
+    assert times[1][-1] == T0_NS + 40_000_000
+    t_all = np.concatenate(times)
+    assert np.all(np.diff(t_all) > 0)
@@ -0,0 +1,125 @@
+import csv
+import time
+
+import numpy as np
+import pytest
+
+usb_core = pytest.importorskip("usb.core")
+pytest.importorskip("pandas")
+
+from FNB import FNBTool
+from fnb_decode import FakeEndpoint, SAMPLES_PER_PACKET
+
+
+class Level:
+    # Power source for the fake endpoint that the test switches between idle and load
+    def __init__(self, watts):
+        self.watts = watts
+
+    def __call__(self, t):
+        return np.full(np.shape(t), self.watts)
+
+
+class FailingEndpoint(FakeEndpoint):
+    # Raises a USB error on the first `failures` reads after fail() (-1: on every read)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failures = 0
+
+    def read(self, size_or_buffer=64, timeout=None):
+        if self.failures:
+            self.failures -= 1
+            raise usb_core.USBError("Input/Output Error")
+        return super().read(size_or_buffer, timeout)
+
+
+def open_tool(tmp_path, endpoint, **kwargs):
+    return FNBTool(file_path=str(tmp_path / "energy.csv"), baseline_duration=0.3, endpoints=(endpoint, endpoint),
+                   **kwargs)
+
+
+def measure(tool, seconds):
+    tool.start("run")
+    time.sleep(seconds)
+    tool.stop()
+
+
+def test_meter_rate_window_energy(tmp_path):
+    # Packets every 40 ms as from the meter: trapezoid energy over the start/stop window
+    level = Level(2.0)
+    tool = open_tool(tmp_path, FakeEndpoint(level))
+    try:
+        assert tool._power_init == pytest.approx(2.0, abs=1e-4)
+        level.watts = 5.0
+        time.sleep(0.2)
+        measure(tool, 1.0)
+        stats = tool.stats()
+    finally:
+        tool.close()
+    assert stats["queue_overflows"] == 0 and stats["dropped_packets"] == 0
+    # 100 samples/s at the meter's nominal rate
+    assert tool._n_measurements == pytest.approx(100, abs=8)
+    with open(tmp_path / "energy.csv", encoding="utf-8-sig") as f:
+        row, = csv.DictReader(f)
+    duration = float(row["Duration"])
+    assert duration == pytest.approx(1.0, abs=0.05)
+    # 3 W above the baseline over the window, in mWh
+    assert float(row["Energy consumption (mWh)"]) == pytest.approx(3.0 * duration / 3.6, rel=1e-3)
+
+
+def test_full_rate_without_drops(tmp_path):
+    # Packets back to back, as fast as the reader can take them
+    endpoint = FakeEndpoint(Level(4.0), realtime=False)
+    tool = open_tool(tmp_path, endpoint, queue_size=1 << 16)
+    try:
+        reads0, packets0 = endpoint.n_reads, tool.stats()["packets"]
+        measure(tool, 0.5)
+        tool.flush(time.time_ns())
+        stats = tool.stats()
+    finally:
+        tool.close()
+    reads = endpoint.n_reads - reads0
+    assert reads > 1000
+    assert stats["queue_overflows"] == 0 and stats["dropped_packets"] == 0
+    # Every packet read was decoded, four samples each
+    assert stats["packets"] - packets0 >= reads - stats["queue_depth"] - 1
+    assert stats["samples"] == SAMPLES_PER_PACKET * stats["packets"]
+    assert float(tool._power) == pytest.approx(0.0, abs=1e-3)
+
+
+def test_usb_errors_back_off_and_recover(tmp_path):
+    endpoint = FailingEndpoint(Level(3.0))
+    tool = open_tool(tmp_path, endpoint, usb_backoff=0.05)
+    try:
+        packets = tool.stats()["packets"]
+        endpoint.failures = 4
+        t0 = time.monotonic()
+        while endpoint.failures or tool.stats()["packets"] <= packets + 1:
+            time.sleep(0.005)
+        # 50 + 100 + 200 + 400 ms of backoff before the next packet
+        assert time.monotonic() - t0 >= 0.7
+        stats = tool.stats()
+        assert stats["usb_errors"] == 4
+        assert stats["last_usb_error"].endswith("Input/Output Error")
+        # The streak has ended, so a window measures normally
+        measure(tool, 0.3)
+        assert tool._n_measurements > 20
+    finally:
+        tool.close()
+
+
+def test_failing_reader_fails_the_window(tmp_path):
+    endpoint = FailingEndpoint(Level(3.0))
+    tool = open_tool(tmp_path, endpoint, max_usb_errors=3, usb_backoff=0.01)
+    try:
+        tool.start("run")
+        endpoint.failures = -1
+        t0 = time.monotonic()
+        while tool.stats()["usb_errors"] < 3 and time.monotonic() - t0 < 2:
+            time.sleep(0.01)
+        with pytest.raises(RuntimeError, match="USB reader stopped"):
+            tool.stop()
+        assert not tool._reader_thread.is_alive()
+        assert tool.stats()["usb_errors"] == 3
+    finally:
+        tool.close()
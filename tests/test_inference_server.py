@@ -0,0 +1,101 @@
+import json
+import socket
+import threading
+from argparse import Namespace
+from types import SimpleNamespace
+
+import pytest
+
+from inference_server import InferenceServer, ModelCache, model_nbytes, send_request
+
+
+def stub_factory(created):
+    # Model "instances" with a fixed footprint; records every construction
+    def create(args):
+        created.append(args.model)
+        return SimpleNamespace(name=args.model, nbytes=100)
+    return create
+
+
+def make_cache(created, max_bytes=250):
+    return ModelCache(stub_factory(created), max_bytes=max_bytes)
+
+
+def test_lru_eviction():
+    created = []
+    cache = make_cache(created)
+    get = lambda name: cache.get(Namespace(model=name))
+    a = get("a")
+    get("b")
+    assert get("a") is a
+    # Over 250 bytes: b is the least recently used
+    get("c")
+    assert cache.info() == {"models": [["a"], ["c"]], "bytes": 200, "hits": 1, "misses": 3}
+    get("b")
+    assert created == ["a", "b", "c", "b"]
+    assert [m[0] for m in cache.info()["models"]] == ["c", "b"]
+    # A model larger than the budget is still kept, alone
+    big = ModelCache(lambda args: SimpleNamespace(nbytes=1000), max_bytes=10)
+    big.get(Namespace(model="x"))
+    big.get(Namespace(model="y"))
+    assert big.info()["models"] == [["y"]]
+
+
+def test_torch_module_size():
+    torch = pytest.importorskip("torch")
+    model = torch.nn.Sequential(torch.nn.Linear(4, 3), torch.nn.BatchNorm1d(3))
+    # 4*3 + 3 weights/bias, 3 + 3 affine, 3 + 3 running stats in float32, one int64 counter
+    assert model_nbytes(model) == (15 + 6 + 6) * 4 + 8
+
+
+@pytest.fixture
+def server():
+    created = []
+
+    def run(model, inputs, args):
+        if args.batch_size < 1:
+            raise ValueError("batch size must be positive")
+        return {"start_time": 1.0, "end_time": 2.0, "iterations": 10, "inputs": inputs, "name": model.name}
+
+    server = InferenceServer(("127.0.0.1", 0), make_cache(created), lambda args: args.batch_size * 2, run,
+                             Namespace(model="resnet18", batch_size=1, backend="eager"))
+    server.created = created
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_second_request_hits_the_cache(server):
+    with socket.create_connection(server.server_address) as conn:
+        first = send_request(conn, {"model": "mobilenet", "batch-size": 4})
+        second = send_request(conn, {"model": "mobilenet", "batch_size": 8})
+        stats = send_request(conn, {"cmd": "stats"})
+    assert first["ok"] and second["ok"]
+    assert (first["model"], first["batch_size"], first["inputs"], first["name"]) == ("mobilenet", 4, 8, "mobilenet")
+    assert second["inputs"] == 16
+    assert server.created == ["mobilenet"]
+    assert stats["cache"]["hits"] == 1 and stats["cache"]["misses"] == 1
+
+
+def test_json_lines_round_trip_and_errors(server):
+    with socket.create_connection(server.server_address) as conn:
+        reader = conn.makefile("rb")
+
+        def exchange(line):
+            conn.sendall(line)
+            return json.loads(reader.readline())
+
+        # Several requests in one write, answered in order
+        conn.sendall(b'{"cmd": "ping"}\n\n{"cmd": "stats"}\n')
+        ping, stats = json.loads(reader.readline()), json.loads(reader.readline())
+        assert ping["ok"] and isinstance(ping["time_ns"], int)
+        assert stats == {"ok": True, "cache": {"models": [], "bytes": 0, "hits": 0, "misses": 0}}
+
+        bad = exchange(b"{not json\n")
+        assert not bad["ok"] and bad["error"].startswith("JSONDecodeError")
+        assert exchange(b'{"cmd": "reboot"}\n') == {"ok": False, "error": "unknown command 'reboot'"}
+        failed = exchange(b'{"model": "resnet18", "batch_size": 0}\n')
+        assert failed == {"ok": False, "error": "ValueError: batch size must be positive"}
+        # The connection is still usable after the errors
+        assert exchange(b'{"model": "resnet18"}\n')["ok"]
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import numpy as np
+
+from conftest import ROOT
+from common.meter import SquareWave
+
+sys.path.insert(0, os.path.join(ROOT, "On_chip_Jetson"))
+import Jtop
+
+
+def test_sample_interval_is_the_sampler_period(monkeypatch, tmp_path):
+    # Off-board: the monitor's sampler process reads a synthetic source instead of jtop
+    meter = Jtop.JtopMeter
+    monkeypatch.setattr(Jtop, "JtopMeter", lambda **options: meter(source=SquareWave(), **options))
+    monitor = Jtop.JtopMonitor(baseline_duration=0.5, sample_interval=0.05, filename=str(tmp_path / "energy.csv"))
+    try:
+        assert monitor.meter.interval == 0.05
+        t_ns, _ = monitor.meter.trace(0, 2 ** 62)
+        assert 2 <= len(t_ns) <= 12
+        assert np.diff(t_ns).min() >= 0.05e9
+    finally:
+        monitor.close()
@@ -0,0 +1,62 @@
+import time
+
+import numpy as np
+import pytest
+
+from common.latency_trace import IterationTracer, latency_stats, load_trace, save_trace
+from common.meter import ReplayMeter
+from common.power_trace import energy_between
+
+STEP_S = 0.01
+
+
+def traced_loop(iterations):
+    tracer = IterationTracer(iterations)
+    before_ns = time.time_ns()
+    tracer.start()
+    for _ in range(iterations):
+        time.sleep(STEP_S)
+        tracer.mark()
+    t_ns = tracer.finish()
+    return tracer, t_ns, before_ns, time.time_ns()
+
+
+def test_timestamps_are_on_the_wall_clock():
+    tracer, t_ns, before_ns, after_ns = traced_loop(10)
+    assert len(t_ns) == 11
+    assert before_ns <= t_ns[0] and t_ns[-1] <= after_ns
+    assert np.all(np.diff(t_ns) >= STEP_S * 1e9)
+    assert tracer.start_time == pytest.approx(t_ns[0] / 1e9) and tracer.end_time == pytest.approx(t_ns[-1] / 1e9)
+
+    stats = latency_stats(t_ns, batch_size=4)
+    assert STEP_S <= stats["latency_p50"] <= stats["latency_p90"] <= stats["latency_p99"]
+    assert stats["throughput"] == pytest.approx(4 / stats["latency_mean"])
+    assert latency_stats(t_ns[:1]) == {}
+
+
+def test_iterations_over_a_replayed_trace():
+    # 4 W constant at 1 kHz: each iteration's energy is 4 W times its own latency
+    t = np.arange(0, 5000) * 1_000_000
+    meter = ReplayMeter(t, np.full(len(t), 4.0)).open()
+    try:
+        time.sleep(0.05)
+        _, t_ns, _, _ = traced_loop(20)
+        meter.flush(int(t_ns[-1]))
+        trace_t, power = meter.trace()
+    finally:
+        meter.close()
+    energy = energy_between(trace_t, power, t_ns)
+    np.testing.assert_allclose(energy, 4.0 * np.diff(t_ns) / 1e9, rtol=1e-6)
+
+
+def test_save_load_round_trip(tmp_path):
+    _, t_ns, _, _ = traced_loop(5)
+    path = str(tmp_path / "trace.bin")
+    save_trace(path, t_ns, batch_size=8)
+    loaded, batch_size = load_trace(path)
+    assert batch_size == 8 and loaded.tolist() == t_ns.tolist()
+
+    with open(path, "r+b") as f:
+        f.write(b"XXXX")
+    with pytest.raises(ValueError):
+        load_trace(path)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from common.layer_profile import LayerProfiler, attribute, select_modules
+
+torch = pytest.importorskip("torch")
+
+
+def tiny_model():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(
+        torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.ReLU()),
+        torch.nn.Sequential(torch.nn.Conv2d(4, 4, 3), torch.nn.ReLU()),
+        torch.nn.Flatten(),
+    ).eval()
+
+
+def test_nested_modules_are_not_selected_twice():
+    model = tiny_model()
+    names = [name for name, _ in select_modules(model)]
+    assert names == ["0.0", "0.1", "1.0", "1.1", "2"]
+    assert [name for name, _ in select_modules(model, types={"Sequential", "Conv2d"})] == ["0.0", "1.0"]
+    assert [name for name, _ in select_modules(model, depth=1)] == ["0", "1", "2"]
+
+
+def test_only_counted_iterations_are_recorded():
+    model = tiny_model()
+    modules = select_modules(model, depth=1)
+    profiler = LayerProfiler(modules, max_iterations=3).attach()
+    x = torch.zeros(1, 3, 8, 8)
+    profiler.start()
+    with torch.no_grad():
+        # A forward pass before next_iteration() must not land in the last row
+        model(x)
+        assert not profiler.t_ns.any()
+        for _ in range(5):
+            profiler.next_iteration()
+            model(x)
+    profiler.detach()
+    layer_ns = profiler.finish()
+    assert layer_ns.shape == (3, 3, 2)
+    assert (layer_ns[:, :, 1] >= layer_ns[:, :, 0]).all()
+    # Layers run one after another within an iteration
+    assert (layer_ns[:, 1:, 0] >= layer_ns[:, :-1, 1]).all()
+
+    rows, summary = attribute(layer_ns, profiler.names, profiler.types)
+    assert summary["iterations"] == 3
+    assert sum(r["latency_share"] for r in rows) == pytest.approx(1.0)
+    assert summary["layers_ms"] <= summary["iteration_ms"] + 1e-9
+    assert np.isfinite([r["latency_ms"] for r in rows]).all()
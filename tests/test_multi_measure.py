@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+pytest.importorskip("minimalmodbus")
+pytest.importorskip("serial")
+pytest.importorskip("pty")
+
+from multi_measure import run_lab
+from simulate_lab import SimulatedBoard
+
+PARAMS = {"mode": [0], "model": ["resnet18", "mobilenetv2_100"], "backend": ["eager"], "batch_size": [1, 2]}
+
+
+@pytest.fixture
+def lab(tmp_path, monkeypatch):
+    # Workers write their baseline caches to the working directory
+    monkeypatch.chdir(tmp_path)
+    boards = [SimulatedBoard(f"sim{i}") for i in range(2)]
+    yield boards
+    for board in boards:
+        board.close()
+
+
+def _die(board, combos, queue):
+    # A worker killed outright, before it can report anything
+    os._exit(3)
+
+
+def test_two_boards_share_the_sweep(lab, tmp_path):
+    counts = run_lab([b.inventory_entry() for b in lab], PARAMS, str(tmp_path / "store"), str(tmp_path / "results.csv"))
+    assert counts == {"sim0": 2, "sim1": 2}
+    with open(tmp_path / "results.csv") as f:
+        rows = f.read().splitlines()
+    assert len(rows) == 5
+    # A rerun finds every combo in the merged store
+    assert run_lab([b.inventory_entry() for b in lab], PARAMS, str(tmp_path / "store"),
+                   str(tmp_path / "results.csv")) == {}
+
+
+def test_dead_worker_does_not_hang_the_controller(lab, tmp_path, capsys):
+    counts = run_lab([b.inventory_entry() for b in lab], PARAMS, str(tmp_path / "store"), str(tmp_path / "results.csv"),
+                     worker=_die, poll=0.2)
+    assert counts == {}
+    out = capsys.readouterr().out
+    assert "[sim0] finished: 0 combos, stopped by worker exited with code 3" in out
+    assert "[sim1] finished: 0 combos, stopped by worker exited with code 3" in out
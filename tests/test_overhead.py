@@ -0,0 +1,77 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from common.meter import ReplayMeter, ThreadedMeter
+from common.overhead import AdaptiveInterval, proc_usage, usage_delta
+
+
+def test_usage_delta():
+    before = {"cpu_time": 1.0, "wakeups": 100, "memory_bytes": 0, "errors": 2}
+    after = {"cpu_time": 1.5, "wakeups": 600, "memory_bytes": 2 ** 21, "errors": 5}
+    delta = usage_delta(before, after, 2.0)
+    assert delta["sampler_cpu_s"] == pytest.approx(0.5) and delta["sampler_cpu_percent"] == pytest.approx(25.0)
+    assert delta["sampler_wakeups"] == 500 and delta["sampler_wakeups_per_s"] == 250
+    assert delta["sampler_memory_mb"] == 2.0 and delta["sampler_errors"] == 3
+    assert usage_delta(None, after, 2.0) == {} and usage_delta(before, after, 0) == {}
+
+
+def test_adaptive_interval_backs_off_and_tightens():
+    pacer = AdaptiveInterval(0.01, 0.1)
+    intervals = [pacer.next(False) for _ in range(10)]
+    assert intervals[0] == pytest.approx(0.015) and intervals[-1] == 0.1
+    assert all(a <= b for a, b in zip(intervals, intervals[1:]))
+    assert pacer.next(True) == 0.05
+    for _ in range(10):
+        pacer.next(True)
+    assert pacer.interval == 0.01
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/task"), reason="needs /proc")
+def test_proc_usage_of_this_process():
+    usage = proc_usage(os.getpid())
+    assert usage["memory_bytes"] > 0 and usage["cpu_time"] >= 0 and usage["wakeups"] >= 0
+    assert proc_usage(os.getpid(), tid=-1) is None
+
+
+def test_replay_window_reports_sampler_cost():
+    # 1 kHz replay: one sampler wakeup per sample
+    t = np.arange(0, 5000) * 1_000_000
+    with ReplayMeter(t, np.full(len(t), 3.0)) as meter:
+        meter.baseline(0.2)
+        assert meter.baseline_overhead["sampler_wakeups_per_s"] == pytest.approx(1000, rel=0.3)
+        meter.start_window("w")
+        time.sleep(0.3)
+        result = meter.stop_window()
+    assert result["sampler_wakeups_per_s"] == pytest.approx(1000, rel=0.3)
+    assert 0 < result["sampler_cpu_percent"] < 100
+    assert result["sampler_memory_mb"] == pytest.approx(meter.ring.nbytes(meter.ring.capacity) / 2 ** 20)
+    assert result["sampler_errors"] == 0
+
+
+class FlakyMeter(ThreadedMeter):
+    # Every third read fails
+    name = "flaky"
+
+    def __init__(self):
+        super().__init__(error_backoff=0.001, max_error_backoff=0.001)
+        self.calls = 0
+
+    def read(self):
+        self.calls += 1
+        time.sleep(0.002)
+        if self.calls % 3 == 0:
+            raise OSError("no response")
+        return time.time_ns(), 1.0
+
+
+def test_failed_reads_are_counted_in_the_window():
+    with FlakyMeter() as meter:
+        meter.start_window()
+        time.sleep(0.2)
+        result = meter.stop_window()
+    assert result["sampler_errors"] > 0
+    assert result["sampler_wakeups"] >= 2 * result["sampler_errors"]
+    assert isinstance(meter.last_error, OSError)
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from common.pareto import GaussianProcess, ParetoSearch, hv_improvement, hypervolume, log_objectives, pareto_front
+
+
+def test_pareto_front():
+    points = [(3, 1), (1, 3), (2, 2), (2, 3), (4, 4), (1, 4), (3, 1)]
+    assert pareto_front(points) == [1, 2, 0]
+    assert pareto_front([]) == []
+
+
+def test_hypervolume_of_a_staircase():
+    front = [(1, 3), (2, 2), (3, 1)]
+    assert hypervolume(front, (4, 4)) == pytest.approx(3 * 1 + 2 * 1 + 1 * 1)
+    # Points beyond the reference contribute nothing
+    assert hypervolume([(5, 0), (1, 3)], (4, 4)) == pytest.approx(3)
+
+
+def test_hv_improvement_matches_recomputed_hypervolume():
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 1, (12, 2))
+    front = points[pareto_front(points)]
+    ref = (1.1, 1.1)
+    samples = rng.uniform(0, 1.2, (50, 2))
+    gains = hv_improvement(front, ref, samples)
+    hv = hypervolume(front, ref)
+    for sample, gain in zip(samples, gains):
+        merged = np.vstack((front, sample))
+        assert gain == pytest.approx(hypervolume(merged[pareto_front(merged)], ref) - hv, abs=1e-12)
+
+
+def test_gaussian_process_interpolates():
+    x = np.linspace(0, 1, 8)[:, None]
+    y = np.sin(3 * x[:, 0])
+    mu, sd = GaussianProcess(noise=1e-4).fit(x, y).predict(np.array([[0.5], [3.0]]))
+    assert mu[0] == pytest.approx(np.sin(1.5), abs=0.02)
+    assert sd[0] < sd[1]
+
+
+def objectives(combo):
+    # Larger batches cost less energy per image but more latency; mode 1 is slower and
+    # cheaper; the "slow" backend is dominated everywhere
+    b, mode = combo["batch_size"], combo["mode"]
+    scale = {"m1": 1.0, "m2": 2.0}[combo["model"]]
+    energy = scale * (1.0 + 4.0 / b) * (0.7 if mode else 1.0) * (1.5 if combo["backend"] == "slow" else 1.0)
+    latency = scale * (0.01 * b + 0.02) * (1.6 if mode else 1.0) * (1.3 if combo["backend"] == "slow" else 1.0)
+    return energy, latency
+
+
+PARAMS = {"model": ["m1", "m2"], "batch_size": [1, 2, 4, 8, 16, 32, 64], "mode": [0, 1],
+          "backend": ["fast", "slow"]}
+
+
+def true_front(search, model):
+    combos = search.candidates[model]
+    points = [objectives(c) for c in combos]
+    return {search.key(combos[i]) for i in pareto_front(points)}
+
+
+def test_search_finds_the_front_with_fewer_measurements():
+    search = ParetoSearch(PARAMS, seeds=4, patience=3, min_improvement=0.01, seed=0)
+    while not search.finished:
+        for combo in search.suggest(per_group=2):
+            search.observe(combo, *objectives(combo))
+    assert search.evaluations() < search.grid_size()
+    for model in PARAMS["model"]:
+        found = {search.key(c) for c, _, _ in search.front(model)}
+        expected = true_front(search, model)
+        assert found == expected
+
+
+def test_seed_points_are_spread_and_failures_are_skipped():
+    search = ParetoSearch(PARAMS, seeds=4, max_evals=5)
+    first = search.suggest(per_group=4)
+    assert len(first) == 8
+    m1 = [c for c in first if c["model"] == "m1"]
+    assert len({search.key(c) for c in m1}) == 4
+    assert {c["backend"] for c in m1} == {"fast", "slow"}
+    for combo in first:
+        if combo["model"] == "m1" and combo["batch_size"] == 1:
+            search.observe_failure(combo)
+        else:
+            search.observe(combo, *objectives(combo))
+    failed = search.failed["m1"]
+    assert len(failed) == 1
+    for _ in range(10):
+        for combo in search.suggest():
+            assert search.key(combo) not in failed
+            search.observe(combo, *objectives(combo))
+    # max_evals ends each model's search
+    assert search.finished
+    assert {m: len(o) for m, o in search.observed.items()} == {"m1": 5, "m2": 5}
+
+
+def test_non_positive_net_energy():
+    y = log_objectives([(2.0, 0.1), (0.0, 0.05), (-0.3, 0.2)])
+    assert np.all(np.isfinite(y))
+    assert y[1, 0] == y[2, 0] == pytest.approx(np.log(2e-3))
+
+    # Runs at or below the baseline noise neither break the surrogates nor end the search
+    search = ParetoSearch(PARAMS, seeds=4, seed=0)
+    for combo in search.suggest(per_group=4):
+        energy, latency = objectives(combo)
+        search.observe(combo, -0.1 if combo["batch_size"] == 1 else energy, latency)
+    with np.errstate(invalid="raise", divide="raise"):
+        nxt = search.suggest()
+    assert len(nxt) == 2
+    assert all(np.isfinite(search.best_gain[m]) for m in PARAMS["model"])
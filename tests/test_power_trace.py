@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from common.power_trace import PowerRing, energy_between, energy_intervals, window_energy
+
+S = 10**9
+
+
+def uneven_times(n, seed=0):
+    # Sorted sample times in seconds on [0, 2] with jittered, uneven spacing
+    rng = np.random.default_rng(seed)
+    t = np.cumsum(rng.uniform(0.5, 1.5, n - 1))
+    return np.concatenate(([0.0], 2.0 * t / t[-1]))
+
+
+def test_trapezoid_is_exact_for_linear_power():
+    t = uneven_times(31)
+    t_ns = (t * S).astype(np.int64)
+    power = 2.0 + 3.0 * t_ns / S
+    stats = window_energy(t_ns, power, t_ns[0], t_ns[-1])
+    # integral of 2 + 3t over [0, 2]
+    assert stats["gross_energy_j"] == pytest.approx(10.0, rel=1e-9)
+    assert stats["avg_power"] == pytest.approx(5.0, rel=1e-9)
+    assert stats["samples"] == 31
+
+
+@pytest.mark.parametrize("n", [33, 34])
+def test_simpson_is_exact_for_quadratic_power(n):
+    # An even number of intervals is pure Simpson; an odd one ends with a trapezoid
+    t = uneven_times(n)
+    t_ns = (t * S).astype(np.int64)
+    t_s = t_ns / S
+    power = t_s ** 2
+    simpson = window_energy(t_ns, power, t_ns[0], t_ns[-1], rule="simpson")["gross_energy_j"]
+    trapezoid = window_energy(t_ns, power, t_ns[0], t_ns[-1])["gross_energy_j"]
+    exact = t_s[-1] ** 3 / 3
+    if n % 2:
+        assert simpson == pytest.approx(exact, rel=1e-9)
+    else:
+        # All of the error comes from the trapezoid over the last interval
+        a, b = t_s[-2], t_s[-1]
+        last_error = (a * a + b * b) / 2 * (b - a) - (b ** 3 - a ** 3) / 3
+        assert simpson - exact == pytest.approx(last_error, rel=1e-6)
+    assert abs(simpson - exact) < abs(trapezoid - exact)
+
+
+def test_window_edges_are_interpolated():
+    # 1 Hz samples of a linear ramp; the window starts and ends between samples
+    t_ns = np.arange(11, dtype=np.int64) * S
+    power = 2.0 + 3.0 * t_ns / S
+    t0, t1 = int(2.5 * S), int(7.25 * S)
+    stats = window_energy(t_ns, power, t0, t1, baseline=1.0, n_inferences=4)
+    gross = 2.0 * (7.25 - 2.5) + 1.5 * (7.25 ** 2 - 2.5 ** 2)
+    assert stats["gross_energy_j"] == pytest.approx(gross, rel=1e-12)
+    assert stats["duration"] == pytest.approx(4.75)
+    assert stats["energy_j"] == pytest.approx((gross - 1.0 * 4.75) / 4, rel=1e-12)
+    assert stats["samples"] == 5
+
+
+def test_window_past_the_trace_holds_the_edge_sample():
+    t_ns = np.array([1, 2, 3], dtype=np.int64) * S
+    power = np.array([4.0, 4.0, 6.0])
+    stats = window_energy(t_ns, power, 0, 4 * S)
+    # 4 W held before the first sample and 6 W after the last
+    assert stats["gross_energy_j"] == pytest.approx(4.0 + 4.0 + 5.0 + 6.0)
+
+
+def test_empty_window():
+    t_ns = np.array([0, S], dtype=np.int64)
+    stats = window_energy(t_ns, np.array([1.0, 1.0]), 2 * S, 3 * S)
+    assert stats["samples"] == 0
+    assert stats["energy_j"] == 0.0
+
+
+def test_intervals_and_marks_match_window_energy():
+    t_ns = np.arange(0, 10 * S + 1, S // 100, dtype=np.int64)
+    power = 3.0 + np.sin(t_ns / S)
+    t0 = np.array([0.5, 2.0, 1.0], dtype=np.float64) * S
+    t1 = np.array([1.5, 9.0, 8.0], dtype=np.float64) * S
+    intervals = energy_intervals(t_ns, power, t0, t1, baseline=2.0)
+    expected = [window_energy(t_ns, power, int(a), int(b), baseline=2.0)["energy_j"] for a, b in zip(t0, t1)]
+    np.testing.assert_allclose(intervals, expected, rtol=1e-9)
+
+    marks = np.array([0.0, 1.25, 4.0, 10.0]) * S
+    between = energy_between(t_ns, power, marks, baseline=2.0)
+    assert len(between) == 3
+    np.testing.assert_allclose(between, energy_intervals(t_ns, power, marks[:-1], marks[1:], baseline=2.0), rtol=1e-12)
+    # Integral of 1 + sin(t) over [0, 10]
+    assert between.sum() == pytest.approx(10.0 + 1.0 - np.cos(10.0), rel=1e-4)
+
+
+def test_ring_keeps_the_latest_samples_contiguous():
+    ring = PowerRing(capacity=8)
+    ring.extend(np.arange(5), np.arange(5))
+    for i in range(5, 13):
+        ring.append(i, i)
+    t_ns, power = ring.view()
+    assert list(t_ns) == list(range(5, 13))
+    assert list(power) == list(range(5, 13))
+    assert list(ring.view(since=10)[0]) == [10, 11, 12]
+    assert list(ring.window(7, 9)[0]) == [7, 8, 9]
@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+import pytest
+
+from pzem_sampler import PZEMMeter, PZEMSampler, SimulatedPZEM, decode_registers
+
+S = 10**9
+
+
+def test_simulated_registers_decode():
+    device = SimulatedPZEM(lambda t: 7.5, voltage=19.0, realtime=False)
+    # 19 V, 7.5 W / 19 V = 0.39 A at the register's 10 mA resolution
+    assert decode_registers(device.registers()) == (19.0, 0.39, 7.5)
+    assert decode_registers(SimulatedPZEM(lambda t: 7000.0, realtime=False).registers())[2] == 7000.0
+
+
+def test_block_reads_through_the_pty(tmp_path):
+    pytest.importorskip("minimalmodbus")
+    pytest.importorskip("serial")
+    pytest.importorskip("pty")
+    from Auto_measure import open_instrument
+    from pzem_sampler import ModbusTransport, PtyPZEM
+
+    device = PtyPZEM(SimulatedPZEM(lambda t: 12.0 if t % 0.2 < 0.1 else 4.0, voltage=20.0, realtime=False))
+    try:
+        sampler = PZEMSampler(ModbusTransport(open_instrument(device.port)))
+        voltage, current, power = zip(*(sampler.read()[1:] for _ in range(20)))
+        assert set(voltage) == {20.0}
+        assert set(power) <= {12.0, 4.0}
+        assert all(c == pytest.approx(p / 20.0, abs=0.01) for c, p in zip(current, power))
+        assert sampler.n_samples == 20 and sampler.sample_rate() > 0
+
+        # The same path as a meter: wall-clock timestamps, power in the ring
+        t0 = time.time_ns()
+        meter = PZEMMeter(ModbusTransport(open_instrument(device.port))).open()
+        time.sleep(0.3)
+        meter.close()
+        t_ns, power = meter.trace()
+        assert len(t_ns) > 10
+        assert np.all(np.diff(t_ns) > 0)
+        assert t0 <= t_ns[0] and t_ns[-1] <= time.time_ns()
+        assert set(power.tolist()) == {12.0, 4.0}
+        assert meter.usage()["errors"] == 0
+    finally:
+        device.close()
+
+
+def test_wall_clock_is_reanchored(monkeypatch):
+    sampler = PZEMSampler(SimulatedPZEM(lambda t: 5.0, realtime=False), anchor_interval=0.05)
+    real_time_ns = time.time_ns
+
+    def stamp():
+        t_ns = sampler.read()[0]
+        return sampler.wall_ns(t_ns)
+
+    assert abs(stamp() - real_time_ns()) < 0.01 * S
+    # The wall clock is stepped forward: followed once the anchor interval has passed
+    monkeypatch.setattr(time, "time_ns", lambda: real_time_ns() + 2 * S)
+    assert abs(stamp() - real_time_ns()) < 0.01 * S
+    time.sleep(0.06)
+    ahead = stamp()
+    assert abs(ahead - (real_time_ns() + 2 * S)) < 0.01 * S
+    # Stepped back again: timestamps never go backwards
+    monkeypatch.setattr(time, "time_ns", real_time_ns)
+    time.sleep(0.06)
+    stamps = [stamp() for _ in range(5)]
+    assert all(b > a for a, b in zip([ahead] + stamps, stamps))
+    assert abs(stamps[-1] - real_time_ns()) < 2 * S
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from common.meter import ReplayMeter
+from common.regions import RegionRecorder
+
+
+def constant_meter(watts=5.0):
+    # 1 kHz replay of a constant load
+    t = np.arange(0, 5000) * 1_000_000
+    return ReplayMeter(t, np.full(len(t), watts))
+
+
+def test_nested_regions_and_self_energy():
+    with constant_meter() as meter:
+        time.sleep(0.02)
+        with meter.region("request"):
+            time.sleep(0.03)
+            with meter.region("infer"):
+                time.sleep(0.04)
+
+        @meter.region("post")
+        def post():
+            time.sleep(0.02)
+            return "ok"
+
+        assert post() == "ok" and post.__name__ == "post"
+        time.sleep(0.02)
+        regions, rows = meter.region_energy(baseline=1.0)
+
+    assert regions["name"] == ["request", "infer", "post"]
+    assert regions["depth"].tolist() == [0, 1, 0] and regions["parent"].tolist() == [-1, 0, -1]
+    # 4 W above baseline for each region's own duration
+    np.testing.assert_allclose(regions["energy_j"], 4.0 * regions["duration_s"], rtol=1e-3)
+    assert regions["self_energy_j"][0] == pytest.approx(regions["energy_j"][0] - regions["energy_j"][1])
+    assert regions["self_energy_j"][1] == pytest.approx(regions["energy_j"][1])
+    by_name = {r["region"]: r for r in rows}
+    assert by_name["request"]["count"] == 1 and by_name["request"]["mean_ms"] >= 70
+    assert by_name["infer"]["mean_energy_mj"] == pytest.approx(4.0 * by_name["infer"]["mean_ms"], rel=1e-3)
+
+
+def test_concurrent_regions_split_the_power():
+    with constant_meter() as meter:
+        time.sleep(0.02)
+        barrier = threading.Barrier(2)
+
+        def request():
+            barrier.wait()
+            with meter.region("request"):
+                time.sleep(0.1)
+
+        threads = [threading.Thread(target=request) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        time.sleep(0.02)
+        regions, _ = meter.region_energy(baseline=0.0)
+        split, _ = meter.region_energy(baseline=0.0, split=True)
+
+    assert len(set(regions["thread"].tolist())) == 2
+    np.testing.assert_allclose(regions["energy_j"], 5.0 * regions["duration_s"], rtol=1e-3)
+    # While both run, each is charged half; together they cannot exceed the wall-clock energy
+    assert split["energy_j"].sum() == pytest.approx(5.0 * (split["end_ns"].max() - split["start_ns"].min()) / 1e9,
+                                                    rel=0.02)
+    assert np.all(split["energy_j"] < 0.75 * regions["energy_j"])
+
+
+def test_only_the_last_capacity_regions_are_kept():
+    recorder = RegionRecorder(capacity=4)
+    for i in range(10):
+        with recorder.region(f"r{i % 2}"):
+            pass
+    regions = recorder.completed()
+    assert regions["name"] == ["r0", "r1", "r0", "r1"]
+    assert np.all(np.diff(regions["start_ns"]) >= 0)
+    # An open region is not reported
+    with recorder.region("open"):
+        assert len(recorder.completed()["name"]) == 3
@@ -0,0 +1,129 @@
+import socket
+import subprocess
+import threading
+import time
+
+import pytest
+
+paramiko = pytest.importorskip("paramiko")
+
+from ssh_session import LocalSession, SSHSession
+
+
+class _Server(paramiko.ServerInterface):
+    # Password login, and exec requests run with bash with stdout streamed back as it is produced
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL if password == "secret" else paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self._exec, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+    @staticmethod
+    def _exec(channel, command):
+        proc = subprocess.Popen(["bash", "-c", command], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            for line in iter(proc.stdout.readline, b""):
+                channel.sendall(line)
+            channel.sendall_stderr(proc.stderr.read())
+            channel.send_exit_status(proc.wait())
+        except (OSError, EOFError):
+            proc.kill()
+        finally:
+            channel.close()
+
+
+class SSHServer:
+    # In-process SSH server on localhost; counts the transports (logins) it has accepted
+    def __init__(self):
+        self.key = paramiko.RSAKey.generate(2048)
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.address = self.listener.getsockname()
+        self.transports = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self.key)
+            transport.start_server(server=_Server())
+            self.transports.append(transport)
+            threading.Thread(target=self._channels, args=(transport,), daemon=True).start()
+
+    @staticmethod
+    def _channels(transport):
+        # A paramiko channel closes when it is garbage collected, so accepted ones are kept
+        channels = []
+        while transport.is_active():
+            channel = transport.accept(0.5)
+            if channel is not None:
+                channels.append(channel)
+
+    def drop_connections(self):
+        for transport in self.transports:
+            transport.close()
+
+    def close(self):
+        self.drop_connections()
+        self.listener.close()
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = SSHServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def session(server):
+    session = SSHSession("board", "jetson", password="secret", timeout=5,
+                         sock_factory=lambda: socket.create_connection(server.address))
+    yield session
+    session.close()
+
+
+def test_commands_share_one_transport(server, session):
+    before = len(server.transports)
+    for i in range(5):
+        out, err, code = session.run(f"echo run {i}; echo oops >&2; exit {i}")
+        assert (out, err, code) == (f"run {i}\n", "oops\n", i)
+    assert len(server.transports) == before + 1
+
+
+def test_reconnects_on_a_fresh_socket(server, session):
+    assert session.run("echo first")[0] == "first\n"
+    before = len(server.transports)
+    server.drop_connections()
+    deadline = time.monotonic() + 5
+    while session._client.get_transport().is_active() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert session.run("echo second")[0] == "second\n"
+    assert len(server.transports) == before + 1
+
+
+def test_output_streams_before_the_timeout(session):
+    chunks = []
+    t0 = time.monotonic()
+    with pytest.raises(TimeoutError):
+        session.run("echo started; sleep 10", on_stdout=chunks.append, timeout=0.5)
+    assert time.monotonic() - t0 < 3
+    assert "".join(chunks) == "started\n"
+    # The transport survives a timed-out command
+    assert session.run("echo next")[0] == "next\n"
+
+
+def test_local_session_times_out_the_same_way():
+    with pytest.raises(TimeoutError):
+        LocalSession().run("sleep 10", timeout=0.2)
+    assert LocalSession().run("echo hi") == ("hi\n", "", 0)
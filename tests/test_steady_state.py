@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from common.steady_state import bin_trace, detect, noise_sigma, pelt, segments
+
+S = 10**9
+RATE = 1000
+
+
+def run_trace(idle=3.0, warmup=6.0, steady=8.0, warmup_s=2.0, steady_s=10.0, tail_s=1.5, margin_s=3.0, noise=0.05,
+              seed=0):
+    # Idle margin, run (warmup plateau then steady state), a tail still above idle,
+    # idle margin; -> t_ns, power, run start, run end
+    rng = np.random.default_rng(seed)
+    levels = [(margin_s, idle), (warmup_s, warmup), (steady_s, steady), (tail_s, 0.5 * (idle + steady)),
+              (margin_s, idle)]
+    power = np.concatenate([np.full(int(d * RATE), p) for d, p in levels])
+    power = power + rng.normal(0, noise, len(power))
+    t_ns = np.arange(len(power), dtype=np.int64) * (S // RATE)
+    start = int(margin_s * S)
+    return t_ns, power, start, start + int((warmup_s + steady_s) * S)
+
+
+def test_bin_trace_and_noise():
+    t_ns = np.array([0, 10, 20, 55, 60], dtype=np.int64)
+    centres, means = bin_trace(t_ns, np.array([1.0, 3.0, 5.0, 7.0, 9.0]), 25)
+    assert list(centres) == [12, 62]
+    assert list(means) == [3.0, 8.0]
+    rng = np.random.default_rng(1)
+    x = np.concatenate((np.zeros(500), np.full(500, 10.0))) + rng.normal(0, 0.5, 1000)
+    # The level shift does not inflate the noise estimate
+    assert noise_sigma(x) == pytest.approx(0.5, rel=0.15)
+
+
+def test_pelt_finds_level_shifts():
+    rng = np.random.default_rng(2)
+    x = np.concatenate((np.full(40, 1.0), np.full(60, 4.0), np.full(30, 2.0))) + rng.normal(0, 0.1, 130)
+    assert list(pelt(x, penalty=1.0, min_size=3)) == [40, 100]
+    assert len(pelt(np.ones(50), penalty=1.0)) == 0
+
+
+def test_segments_split_at_level_changes():
+    t_ns, power, _, _ = run_trace()
+    segs = segments(t_ns, power, bin_s=0.001, max_bins=500)
+    assert segs[0][0] == t_ns[0] and segs[-1][1] == t_ns[-1]
+    assert all(a[1] == b[0] for a, b in zip(segs, segs[1:]))
+    # 19.5 s in at most 500 bins: every level change lands within a bin or two of an edge
+    bin_ns = -(-int(t_ns[-1] - t_ns[0] + 1) // 500)
+    edges = np.array([seg[0] for seg in segs[1:]])
+    for change_s in (3.0, 5.0, 15.0, 16.5):
+        assert np.abs(edges - change_s * S).min() <= 2 * bin_ns
+    longest = max(segs, key=lambda seg: seg[1] - seg[0])
+    assert longest[2] == pytest.approx(8.0, abs=0.02)
+
+
+def test_detect_splits_warmup_steady_and_tail():
+    t_ns, power, start, end = run_trace()
+    result = detect(t_ns, power, start, end, baseline=3.0, n_inferences=1200)
+    assert result["warmup_s"] == pytest.approx(2.0, abs=0.06)
+    assert result["steady_s"] == pytest.approx(10.0, abs=0.06)
+    assert result["tail_s"] == pytest.approx(1.5, abs=0.06)
+    assert result["steady_power"] == pytest.approx(8.0, abs=0.02)
+    # 1000 of the 1200 inferences fall in the steady state, at 5 W above idle for 10 s
+    assert result["steady_inferences"] == pytest.approx(1000, rel=0.01)
+    assert result["energy_j"] == pytest.approx(50.0 / 1000, rel=0.02)
+    assert result["warmup_energy_j"] == pytest.approx(3.0 * 2.0, rel=0.05)
+    assert result["tail_energy_j"] == pytest.approx(2.5 * 1.5, rel=0.05)
+    # The whole window mixes in the cheaper warmup
+    assert result["window_energy_j"] == pytest.approx((6.0 + 50.0) / 1200, rel=0.02)
+
+
+def test_detect_counts_marks_in_the_steady_state():
+    t_ns, power, start, end = run_trace()
+    marks = np.linspace(start, end, 121).astype(np.int64)
+    result = detect(t_ns, power, start, end, baseline=3.0, marks_ns=marks)
+    assert result["steady_inferences"] == pytest.approx(100, abs=1)
+    assert result["energy_j"] == pytest.approx(50.0 / result["steady_inferences"], rel=0.02)
+
+
+def test_detect_rejects_empty_windows():
+    t_ns, power, start, end = run_trace()
+    with pytest.raises(ValueError):
+        detect(t_ns, power, end, start)
+    with pytest.raises(ValueError):
+        detect(t_ns[:1], power[:1], start, end)
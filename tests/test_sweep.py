@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+import pytest
+
+from common.sweep import Sweep
+
+PARAMS = {"mode": [0, 1], "model": ["a", "b"], "batch_size": [1, 8]}
+
+
+def test_first_parameter_varies_slowest():
+    combos = Sweep(PARAMS, checkpoint=None).combos()
+    assert len(combos) == 8
+    assert [c["mode"] for c in combos] == [0, 0, 0, 0, 1, 1, 1, 1]
+    assert combos[:2] == [{"mode": 0, "model": "a", "batch_size": 1}, {"mode": 0, "model": "a", "batch_size": 8}]
+
+
+def test_checkpoint_resumes_after_interruption(tmp_path):
+    checkpoint = str(tmp_path / "sweep.json")
+    seen = []
+
+    def interrupted(combo):
+        if len(seen) == 3:
+            raise KeyboardInterrupt
+        seen.append(combo)
+
+    with pytest.raises(KeyboardInterrupt):
+        Sweep(PARAMS, checkpoint=checkpoint).run(interrupted)
+    with open(checkpoint) as f:
+        assert len(json.load(f)["done"]) == 3
+
+    resumed = Sweep(PARAMS, checkpoint=checkpoint)
+    assert len(resumed.pending()) == 5
+    rest = []
+    resumed.run(rest.append)
+    assert seen + rest == Sweep(PARAMS, checkpoint=None).combos()
+    assert Sweep(PARAMS, checkpoint=checkpoint).pending() == []
+
+
+def test_is_done_skips_stored_combos():
+    sweep = Sweep(PARAMS, checkpoint=None, is_done=lambda c: c["model"] == "a")
+    assert all(c["model"] == "b" for c in sweep.pending())
+    assert len(sweep.pending()) == 4
+
+
+def test_unreadable_checkpoint_is_ignored(tmp_path):
+    checkpoint = tmp_path / "sweep.json"
+    checkpoint.write_text("{not json")
+    assert len(Sweep(PARAMS, checkpoint=str(checkpoint)).pending()) == 8
+
+
+def test_retries_then_records_failure(tmp_path):
+    checkpoint = str(tmp_path / "sweep.json")
+    calls = {}
+
+    def flaky(combo):
+        key = Sweep.key(combo)
+        calls[key] = calls.get(key, 0) + 1
+        if combo["batch_size"] == 8 and (combo["model"] == "a" or calls[key] < 2):
+            raise RuntimeError("out of memory")
+        return combo["model"]
+
+    sweep = Sweep({"model": ["a", "b"], "batch_size": [1, 8]}, checkpoint=checkpoint, retries=2, backoff=0)
+    assert sweep.run(flaky) == ["a", "b", "b"]
+    a8, b8 = Sweep.key({"model": "a", "batch_size": 8}), Sweep.key({"model": "b", "batch_size": 8})
+    assert calls[a8] == 3 and calls[b8] == 2
+    with open(checkpoint) as f:
+        state = json.load(f)
+    assert state["failed"] == {a8: "out of memory"}
+    assert a8 not in state["done"] and b8 in state["done"]
+    # A failed combo is not done, so the next run tries it again
+    assert Sweep({"model": ["a", "b"], "batch_size": [1, 8]}, checkpoint=checkpoint).pending() == [
+        {"model": "a", "batch_size": 8}]
+
+
+def test_backoff_is_exponential_and_capped():
+    sweep = Sweep(PARAMS, checkpoint=None, backoff=5.0, max_backoff=30.0)
+    assert [sweep.delay(a) for a in range(5)] == [5.0, 10.0, 20.0, 30.0, 30.0]
+
+
+def test_on_change_hooks_and_shared_state():
+    applied = []
+    hooks = {"mode": lambda value, combo: applied.append(("mode", value)),
+             "model": lambda value, combo: applied.append(("model", value))}
+    state = {}
+    Sweep({"mode": [0], "model": ["a", "b"], "batch_size": [1, 8]}, checkpoint=None).run(lambda c: None, hooks, state)
+    assert applied == [("mode", 0), ("model", "a"), ("model", "b")]
+    assert state == {"mode": 0, "model": "b"}
+
+    # A following run with the same state does not re-apply the unchanged mode
+    applied.clear()
+    Sweep({"mode": [0, 1], "model": ["b"]}, checkpoint=None).run(lambda c: None, hooks, state)
+    assert applied == [("mode", 1)]
+
+
+def test_failure_forgets_applied_state():
+    applied = []
+    failures = [RuntimeError("board rebooted")]
+
+    def fn(combo):
+        if failures:
+            raise failures.pop()
+
+    state = {}
+    Sweep({"mode": [0], "batch_size": [1, 8]}, checkpoint=None, backoff=0).run(
+        fn, {"mode": lambda value, combo: applied.append(value)}, state)
+    # The mode is applied again on the retry, as the board's state is unknown after a failure
+    assert applied == [0, 0]
+    assert state == {"mode": 0}
+
+
+def test_run_async_awaits_hooks_and_retries():
+    applied = []
+    failures = [RuntimeError("board rebooted")]
+
+    async def set_mode(value, combo):
+        applied.append(value)
+
+    async def fn(combo):
+        await asyncio.sleep(0)
+        if failures:
+            raise failures.pop()
+        return combo["batch_size"]
+
+    state = {}
+    sweep = Sweep({"mode": [0, 1], "batch_size": [1, 8]}, checkpoint=None, backoff=0)
+    assert asyncio.run(sweep.run_async(fn, {"mode": set_mode}, state)) == [1, 8, 1, 8]
+    assert applied == [0, 0, 1]
+    assert state == {"mode": 1}
+    assert sweep.pending() == []
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from common.power_trace import window_energy
+from common.trace_store import TraceStore, decode_chunk, encode_chunk
+
+S = 10**9
+
+
+def ramp(n=1000, t0_ns=1_700_000_000 * S, period_ns=10**7):
+    t_ns = t0_ns + np.arange(n, dtype=np.int64) * period_ns + np.arange(n) % 7
+    power = (5.0 + np.sin(np.arange(n) / 50.0)).astype(np.float32)
+    return t_ns, power
+
+
+@pytest.mark.parametrize("codec", ["delta", "raw"])
+def test_chunk_round_trip(codec):
+    t_ns, power = ramp(100)
+    data, t_nbytes = encode_chunk(t_ns, power, codec)
+    t_out, p_out = decode_chunk(data, len(t_ns), t_nbytes, codec)
+    np.testing.assert_array_equal(t_out, t_ns)
+    np.testing.assert_array_equal(p_out, power)
+
+
+@pytest.mark.parametrize("codec", ["delta", "raw"])
+def test_store_round_trip_across_reopen(tmp_path, codec):
+    t_ns, power = ramp()
+    with TraceStore(str(tmp_path), codec=codec, chunk_size=64) as store:
+        store.add(t_ns, power, baseline=4.5, n_inferences=10, model="resnet18", batch_size=8, mode=0, run="a")
+        store.add(t_ns[:100], power[:100], model="mobilenet", batch_size=1, mode=0)
+    with TraceStore(str(tmp_path), codec=codec, chunk_size=64) as store:
+        runs = store.query(model="resnet18")
+        assert len(runs) == 1
+        run = runs[0]
+        assert (run["batch_size"], run["mode"], run["run"]) == (8, "0", "a")
+        assert (run["start_ns"], run["end_ns"], run["n_samples"]) == (int(t_ns[0]), int(t_ns[-1]), len(t_ns))
+        t_out, p_out = store.trace(run)
+        np.testing.assert_array_equal(t_out, t_ns)
+        np.testing.assert_array_equal(p_out, power)
+        assert len(store.query(mode=0)) == 2
+        assert store.query(model="none") == []
+
+
+def test_windowed_trace_only_decodes_covering_chunks(tmp_path):
+    t_ns, power = ramp()
+    with TraceStore(str(tmp_path), chunk_size=64) as store:
+        store.add(t_ns, power, model="m")
+        store.flush()
+        run = store.query()[0]
+        t0, t1 = int(t_ns[300]) + 5, int(t_ns[420])
+        t_out, p_out = store.trace(run, t0, t1)
+        # Whole chunks around the window, including one sample either side of it
+        assert len(t_out) < len(t_ns)
+        assert t_out[0] < t0 and t_out[-1] > t1
+        assert window_energy(t_out, p_out, t0, t1) == window_energy(t_ns, power, t0, t1)
+
+
+def test_recompute_with_other_baseline(tmp_path):
+    t_ns, power = ramp()
+    start, end = int(t_ns[100]), int(t_ns[900])
+    with TraceStore(str(tmp_path), chunk_size=128, batch_runs=1) as store:
+        store.add(t_ns, power, start_ns=start, end_ns=end, baseline=4.0, n_inferences=20, model="m")
+        stored, = store.recompute()
+        overridden, = store.recompute(baseline=5.0)
+        per_run, = store.recompute(baseline=lambda run: run["baseline"] + 1.0, rule="simpson")
+    expected = window_energy(t_ns, power, start, end, baseline=4.0, n_inferences=20)
+    assert stored["energy_j"] == pytest.approx(expected["energy_j"])
+    duration = (end - start) / 1e9
+    assert overridden["energy_j"] == pytest.approx(stored["energy_j"] - duration / 20)
+    assert per_run["baseline"] == 5.0
+    assert per_run["energy_j"] == pytest.approx(overridden["energy_j"], rel=1e-3)
+
+
+def test_unknown_filter_and_codec(tmp_path):
+    with pytest.raises(ValueError):
+        TraceStore(str(tmp_path / "a"), codec="lz4")
+    with TraceStore(str(tmp_path / "b")) as store:
+        with pytest.raises(ValueError):
+            store.query(color="red")